@@ -0,0 +1,193 @@
+# backend/admission.py
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from backend.metrics import Counter, Gauge, observe, register
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Answers started per second against the Azure quota, and the burst allowed above that
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "5"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "20"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+# Used when Azure answers 429 without a Retry-After
+UPSTREAM_BACKOFF_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_SECONDS", "10"))
+
+# Lower is served first
+PRIORITIES = {"user": 0, "guest": 1, "batch": 2}
+
+logger = logging.getLogger(__name__)
+
+admission_rejected = register(
+    Counter("chatmate_admission_rejected_total", "Answers refused with 429 because the model quota was saturated.")
+)
+admission_queue_depth = register(
+    Gauge("chatmate_admission_queue_depth", "Answers waiting for an admission token.")
+)
+upstream_throttled = register(
+    Counter("chatmate_upstream_throttled_total", "Model calls that Azure OpenAI refused with 429.")
+)
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Overloaded, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionController:
+    """
+    Token bucket in front of the model calls, shared by every request of
+    the process.
+
+    An answer takes one token; ``rate`` tokens come back per second, up to
+    ``burst``. Without a token the request waits in a queue of at most
+    ``queue_size``, logged-in users ahead of guests and batch jobs behind
+    both (an arrival at a full queue displaces the newest lower one). Whoever would wait longer than
+    ``max_wait``, or finds no room, is refused at once with ``Overloaded``
+    and a retry-after estimate, so clients get a fast 429 instead of a slow
+    timeout. ``backoff`` stops admissions for a while after Azure itself
+    answered 429.
+    """
+
+    def __init__(
+        self,
+        rate: float = ADMISSION_RATE,
+        burst: float = ADMISSION_BURST,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list[tuple] = []  # heap of (priority, seq, arrived, future)
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _refill(self, now: float):
+        if now < self._paused_until:
+            self.tokens, self._updated = 0.0, self._paused_until
+            return
+        start = max(self._updated, self._paused_until)
+        self.tokens = min(self.burst, self.tokens + (now - start) * self.rate)
+        self._updated = now
+
+    def _estimated_wait(self, now: float, position: int) -> float:
+        """Seconds until the waiter at ``position`` (0 = next) gets a token."""
+        paused = max(0.0, self._paused_until - now)
+        return paused + max(0.0, position + 1 - self.tokens) / self.rate
+
+    async def acquire(self, priority: str = "guest", namespace: str | None = None):
+        """Wait for a token, or raise ``Overloaded`` when none can come in time."""
+        if not ADMISSION_ENABLED:
+            return
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+
+        rank = PRIORITIES.get(priority, PRIORITIES["guest"])
+        position = sum(1 for entry in self._waiters if entry[0] <= rank)
+        wait = self._estimated_wait(now, position)
+        if wait > self.max_wait:
+            admission_rejected.inc()
+            raise Overloaded(wait)
+        if len(self._waiters) >= self.queue_size and not self._displace(rank, now):
+            admission_rejected.inc()
+            raise Overloaded(self._estimated_wait(now, len(self._waiters)))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (rank, next(self._seq), now, future)
+        heapq.heappush(self._waiters, entry)
+        if position < len(self._waiters) - 1:
+            self._shed(now)  # this one went ahead of lower-priority waiters
+        admission_queue_depth.set(len(self._waiters))
+        self._schedule()
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            # Users kept arriving ahead of this one
+            admission_rejected.inc()
+            raise Overloaded(self._estimated_wait(time.monotonic(), len(self._waiters))) from None
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            admission_queue_depth.set(len(self._waiters))
+        observe("admission_wait", time.monotonic() - now, namespace)
+
+    def _displace(self, rank: int, now: float) -> bool:
+        """Make room for a higher-priority request by refusing the newest lower one."""
+        victims = [entry for entry in self._waiters if entry[0] > rank]
+        if not victims:
+            return False
+        victim = max(victims, key=lambda entry: (entry[0], entry[1]))
+        self._waiters.remove(victim)
+        heapq.heapify(self._waiters)
+        self._refuse(victim[3], self._estimated_wait(now, len(self._waiters)))
+        return True
+
+    def _shed(self, now: float):
+        """Refuse waiters pushed back so far they can no longer get in within max_wait."""
+        position = 0
+        for entry in sorted(self._waiters):
+            _, _, arrived, future = entry
+            wait = self._estimated_wait(now, position)
+            if now - arrived + wait > self.max_wait:
+                self._waiters.remove(entry)
+                self._refuse(future, wait)
+            else:
+                position += 1
+        heapq.heapify(self._waiters)
+
+    def _refuse(self, future: asyncio.Future, retry_after: float):
+        if not future.done():
+            admission_rejected.inc()
+            future.set_exception(Overloaded(retry_after))
+
+    def _schedule(self):
+        if self._timer is not None or not self._waiters:
+            return
+        delay = self._estimated_wait(time.monotonic(), 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._grant)
+
+    def _grant(self):
+        self._timer = None
+        self._refill(time.monotonic())
+        while self._waiters and self.tokens >= 1:
+            future = heapq.heappop(self._waiters)[3]
+            if not future.done():
+                future.set_result(None)
+                self.tokens -= 1
+        admission_queue_depth.set(len(self._waiters))
+        self._schedule()
+
+    def backoff(self, seconds: float | None):
+        """Azure refused a call with 429: admit nothing for ``seconds``."""
+        upstream_throttled.inc()
+        seconds = UPSTREAM_BACKOFF_SECONDS if seconds is None else seconds
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            logger.warning("Azure OpenAI is throttling, pausing admissions for %.1fs", seconds)
+            self._paused_until = until
+            self.tokens = 0.0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule()
+
+
+admission = AdmissionController()
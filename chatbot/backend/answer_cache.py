@@ -0,0 +1,140 @@
+# backend/answer_cache.py
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class _Bucket:
+    """Cached (query vector, answer) pairs for one namespace version + document set."""
+
+    def __init__(self):
+        self.entries: dict[int, tuple[np.ndarray, str]] = {}
+        self._ids: list[int] = []
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None and self.entries:
+            self._ids = list(self.entries)
+            self._matrix = np.stack([self.entries[i][0] for i in self._ids])
+        return self._ids, self._matrix
+
+    def add(self, entry_id: int, vector: np.ndarray, answer: str):
+        self.entries[entry_id] = (vector, answer)
+        self._matrix = None
+
+    def remove(self, entry_id: int):
+        self.entries.pop(entry_id, None)
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    """
+    Replays a previous answer when a new question is close enough to an old one.
+
+    Entries are grouped per (namespace, namespace version, document set), so
+    any upload or delete in the namespace retires its cached answers. Lookup
+    is a single matrix-vector product over the bucket's unit-normalised query
+    embeddings. The total size of vectors + answers is kept under
+    ``max_bytes`` by evicting least recently used entries.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_bytes: int = ANSWER_CACHE_MAX_BYTES,
+    ):
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._buckets: dict[tuple, _Bucket] = {}
+        self._current_version: dict[str, int] = {}
+        self._lru: OrderedDict[int, tuple[tuple, int]] = OrderedDict()  # id -> (bucket key, size)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _drop_stale(self, namespace: str, version: int):
+        # A newer namespace version makes every older bucket unreachable
+        if self._current_version.get(namespace, version) < version:
+            for key in [k for k in self._buckets if k[0] == namespace and k[1] < version]:
+                for entry_id in list(self._buckets[key].entries):
+                    self._evict(entry_id)
+                self._buckets.pop(key, None)
+        self._current_version[namespace] = max(version, self._current_version.get(namespace, version))
+
+    def _evict(self, entry_id: int):
+        key, size = self._lru.pop(entry_id)
+        bucket = self._buckets.get(key)
+        if bucket:
+            bucket.remove(entry_id)
+            if not bucket.entries:
+                del self._buckets[key]
+        self.size_bytes -= size
+
+    def lookup(self, namespace: str, version: int, doc_set, query_vector) -> str | None:
+        key = (namespace, version, doc_set)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            ids, matrix = bucket.matrix() if bucket else ([], None)
+            if matrix is None:
+                self.misses += 1
+                return None
+            scores = matrix @ self._unit(query_vector)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = ids[best]
+            self._lru.move_to_end(entry_id)
+            self.hits += 1
+            return bucket.entries[entry_id][1]
+
+    def store(self, namespace: str, version: int, doc_set, query_vector, answer: str):
+        vector = self._unit(query_vector)
+        size = vector.nbytes + len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        key = (namespace, version, doc_set)
+        with self._lock:
+            self._drop_stale(namespace, version)
+            if self._current_version[namespace] != version:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            self._buckets.setdefault(key, _Bucket()).add(entry_id, vector, answer)
+            self._lru[entry_id] = (key, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                self._evict(next(iter(self._lru)))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._lru),
+            "size_bytes": self.size_bytes,
+        }
+
+
+def replay_stream(answer: str):
+    """Split a cached answer into whitespace-terminated pieces, like a live stream."""
+    for part in re.findall(r"\S+\s*|\s+", answer):
+        yield part
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,70 @@
+# backend/artifacts.py
+import json
+import os
+import uuid
+from backend.text_extract import extract_pages
+
+# Files derived from uploads (extracted text), kept apart from the originals
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+# Bump when extraction output changes, so stale text is not reused
+EXTRACTION_VERSION = 1
+
+
+def pages_path(content_hash: str) -> str:
+    return os.path.join(ARTIFACT_DIR, content_hash[:2], f"{content_hash}.pages-v{EXTRACTION_VERSION}.jsonl")
+
+
+def stored_pages(file_path: str, content_hash: str):
+    """
+    ``extract_pages`` through the artifact store: a PDF's extracted text is
+    written to ``pages_path`` as it streams, and read back from there when
+    the same content is ingested again (another owner, a re-ingestion).
+    Plain text is its own extraction and is not copied.
+    """
+    if os.path.splitext(file_path)[1].lower() != ".pdf":
+        yield from extract_pages(file_path)
+        return
+
+    path = pages_path(content_hash)
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                page, text = json.loads(line)
+                yield page, text
+        return
+    except FileNotFoundError:
+        pass
+
+    # Written under a temporary name and renamed once complete, so an
+    # interrupted extraction never leaves a truncated artifact behind
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for page, text in extract_pages(file_path):
+                out.write(json.dumps([page, text]) + "\n")
+                yield page, text
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove_artifacts(content_hash: str) -> int:
+    """Delete everything derived from ``content_hash``; returns the bytes freed."""
+    directory = os.path.join(ARTIFACT_DIR, content_hash[:2])
+    freed = 0
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if name.startswith(content_hash):
+            path = os.path.join(directory, name)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            freed += size
+    return freed
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Request, Form, Response, status, Depends, HTTPException
 from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from backend.database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_db
 from backend.models import User
+from backend.services import services
 from itsdangerous import URLSafeSerializer, BadSignature
 from dotenv import load_dotenv
 import hashlib
@@ -17,9 +18,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your_fallback_key")
 # Secure serializer
 serializer = URLSafeSerializer(SECRET_KEY)
 
-# Jinja templates
-templates = Jinja2Templates(directory="frontend/templates")
-
 # FastAPI router
 router = APIRouter()
 
@@ -49,14 +47,6 @@ def get_current_user(request: Request) -> int | None:
     return None
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # ---------------------- ROUTES ---------------------- #
 
 
@@ -64,8 +54,8 @@ def get_db():
 async def get_login(request: Request):
     if get_current_user(request):
         return RedirectResponse(url="/dashboard", status_code=302)
-    return templates.TemplateResponse(
-        "auth.html", {"request": request, "mode": "login"}
+    return services.templates.TemplateResponse(
+        request, "auth.html", {"request": request, "mode": "login"}
     )
 
 
@@ -75,15 +65,15 @@ async def login(
     response: Response,
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if get_current_user(request):
         return RedirectResponse(url="/dashboard", status_code=302)
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user or not verify_password(password, user.password):
-        return templates.TemplateResponse(
-            "auth.html",
+        return services.templates.TemplateResponse(
+            request, "auth.html",
             {"request": request, "mode": "login", "error": "Invalid email or password"},
             status_code=401,
         )
@@ -99,8 +89,8 @@ async def login(
 async def get_signup(request: Request):
     if get_current_user(request):
         return RedirectResponse(url="/dashboard", status_code=302)
-    return templates.TemplateResponse(
-        "auth.html", {"request": request, "mode": "signup"}
+    return services.templates.TemplateResponse(
+        request, "auth.html", {"request": request, "mode": "signup"}
     )
 
 
@@ -111,20 +101,18 @@ async def signup(
     username: str = Form(...),
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if get_current_user(request):
         return RedirectResponse(url="/dashboard", status_code=302)
 
-    existing_user = (
-        db.query(User)
-        .filter((User.username == username) | (User.email == email))
-        .first()
+    existing_user = await db.scalar(
+        select(User.id).where((User.username == username) | (User.email == email)).limit(1)
     )
 
     if existing_user:
-        return templates.TemplateResponse(
-            "auth.html",
+        return services.templates.TemplateResponse(
+            request, "auth.html",
             {
                 "request": request,
                 "mode": "signup",
@@ -135,7 +123,7 @@ async def signup(
 
     new_user = User(username=username, email=email, password=hash_password(password))
     db.add(new_user)
-    db.commit()
+    await db.commit()
 
     return RedirectResponse(url="/login", status_code=302)
 
@@ -1,144 +1,259 @@
+import asyncio
+import logging
 import os
 import re
-from typing import Optional, AsyncGenerator, List
-from openai import AsyncAzureOpenAI
-from dotenv import load_dotenv
-from backend.pinecone_utils import index
-
-load_dotenv()
-
-# Initialize Azure OpenAI client
-client = AsyncAzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_version="2024-05-01-preview",
-)
-
-embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
-chat_model = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-
-
-# 🔹 Generate embeddings for list of text chunks
-async def embed_text(chunks: List[str]) -> List[List[float]]:
-    response = await client.embeddings.create(input=chunks, model=embedding_model)
-    return [item.embedding for item in response.data]
-
-
-# 🔹 Format markdown-like output to HTML
+import time
+from typing import Optional, AsyncGenerator, AsyncIterator
+from backend.openai_client import get_client, chat_model, embedding_model
+from backend.embedding_utils import embed_text
+from backend.embedding_cache import chunk_hash, get_embedding_cache
+from backend.context_builder import assemble_context, CONTEXT_CANDIDATES
+from backend.vector_store import get_vector_store
+from backend.retrieval_cache import retrieval_cache
+from backend.lexical_index import lexical_index, reciprocal_rank_fusion
+from backend.answer_cache import answer_cache, replay_stream, ANSWER_CACHE_ENABLED
+from backend.markdown_stream import StreamingMarkdownRenderer, render_markdown
+from backend.metrics import observe, span
+from backend.admission import admission
+from backend.single_flight import StreamGroup
+from backend.document_versions import document_states, visible_matches
+
+# Retrieval tuning
+DEFAULT_TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+FILTERED_TOP_K = int(os.getenv("RAG_FILTERED_TOP_K", "10"))
+FILTERED_SCORE_CUTOFF = float(os.getenv("RAG_FILTERED_SCORE_CUTOFF", "0.75"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+
+BUSY_MESSAGE = "The assistant is busy right now. Please try again in a minute."
+
+logger = logging.getLogger(__name__)
+
+answer_streams = StreamGroup()
+
+
+# 🔹 Format markdown-like output to HTML (same renderer as the streaming path)
 def format_markdown_to_html(text: str) -> str:
     # Clean up malformed newlines or repeated segments
     text = re.sub(r"(To turn on.*?)\1+", r"\1", text, flags=re.IGNORECASE)
+    return render_markdown(text.strip())
+
+
+# 🔹 Query embedding, served from the retrieval cache when the question repeats
+async def embed_query(query: str, namespace: Optional[str] = None) -> list[float]:
+    with span("query_embedding", namespace):
+        query_vector = await retrieval_cache.get_embedding(embedding_model, query)
+        if query_vector is None:
+            embedded_query = await embed_text([query])
+            query_vector = embedded_query[0]
+            await retrieval_cache.set_embedding(embedding_model, query, query_vector)
+    return query_vector
+
+
+# 🔹 Document scope: one file by name and/or a set of document ids (from /files).
+# Scoped queries only touch the rows of those documents in the local stores and
+# use a server-side metadata filter on Pinecone.
+def document_filter(selected_file: Optional[str] = None, doc_ids: Optional[list] = None) -> Optional[dict]:
+    conditions = []
+    if selected_file:
+        conditions.append({"file": {"$eq": selected_file}})
+    if doc_ids:
+        conditions.append({"doc_id": {"$in": sorted(set(doc_ids))}})
+    if len(conditions) > 1:
+        return {"$and": conditions}
+    return conditions[0] if conditions else None
+
+
+def document_scope(selected_file: Optional[str] = None, doc_ids: Optional[list] = None):
+    """Hashable form of the scope, for cache and single-flight keys."""
+    return (selected_file, tuple(sorted(set(doc_ids)))) if doc_ids else selected_file
+
+
+# 🔹 Vector search, optionally scoped to some documents by a metadata filter.
+# Fetches a candidate pool of CONTEXT_CANDIDATES for context assembly to pick
+# from; scoped queries keep every match within FILTERED_SCORE_CUTOFF of the
+# best score (never fewer than DEFAULT_TOP_K).
+# With HYBRID_SEARCH, a BM25 search over the same namespace runs alongside and
+# the two rankings are merged by reciprocal-rank fusion, so exact part numbers
+# and error codes that dense search misses still surface.
+async def retrieve_matches(
+    query_vector: list[float],
+    namespace: str,
+    selected_file: Optional[str] = None,
+    query: Optional[str] = None,
+    doc_ids: Optional[list] = None,
+) -> list:
+    metadata_filter = document_filter(selected_file, doc_ids)
+    top_k = max(CONTEXT_CANDIDATES, FILTERED_TOP_K if metadata_filter else DEFAULT_TOP_K)
+
+    cache_key = await retrieval_cache.matches_key(
+        namespace, query_vector, metadata_filter, (top_k, HYBRID_SEARCH and bool(query))
+    )
+    matches = await retrieval_cache.get_matches(cache_key)
+    if matches is not None:
+        return matches
+
+    start = time.perf_counter()
+    lexical_task = None
+    if HYBRID_SEARCH and query:
+        # Over-fetched, so chunks hidden below still leave top_k
+        lexical_task = asyncio.create_task(
+            asyncio.to_thread(lexical_index.search, namespace, query, top_k * 2, metadata_filter)
+        )
+    with span("vector_query", namespace):
+        matches = await get_vector_store().query(
+            query_vector, top_k, namespace, filter=metadata_filter
+        )
+    lexical_matches = await lexical_task if lexical_task else []
+
+    # Chunks of document versions that aren't current, per the Document rows
+    states = await document_states(
+        {m["metadata"]["doc_id"] for m in matches + lexical_matches if "doc_id" in m["metadata"]}
+    )
+    visible = visible_matches(matches, states)
+    if len(visible) < len(matches):
+        # A replacement is in progress or just done: fetch more to make up for the hidden ones
+        with span("vector_query", namespace):
+            matches = await get_vector_store().query(
+                query_vector, top_k * 2, namespace, filter=metadata_filter
+            )
+        states.update(
+            await document_states(
+                {m["metadata"]["doc_id"] for m in matches if "doc_id" in m["metadata"]} - states.keys()
+            )
+        )
+        visible = visible_matches(matches, states)
+    matches = visible[:top_k]
 
-    # Replace bullets
-    text = re.sub(r"^\s*[-•]\s+", "- ", text, flags=re.MULTILINE)
+    if metadata_filter and matches:
+        cutoff = matches[0]["score"] * FILTERED_SCORE_CUTOFF
+        matches = [m for i, m in enumerate(matches) if i < DEFAULT_TOP_K or m["score"] >= cutoff]
 
-    # Bold: **text**
-    text = re.sub(r"\*\*(.*?)\*\*", r"<strong>\1</strong>", text)
+    if lexical_task:
+        lexical_matches = visible_matches(lexical_matches, states)[:top_k]
+        matches = reciprocal_rank_fusion(
+            [matches, lexical_matches], top_k=max(len(matches), DEFAULT_TOP_K)
+        )
 
-    # Italic: *text*
-    text = re.sub(r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)", r"<em>\1</em>", text)
+    await retrieval_cache.set_matches(cache_key, matches)
+    # Dense and lexical search together, including fusion
+    observe("retrieval", time.perf_counter() - start, namespace)
+    return matches
+
+
+# 🔹 Prompt context: MMR-diversified, overlap-free and packed to the token budget.
+# Chunk embeddings for the redundancy term come from the local embedding cache,
+# which ingestion already filled, so no vectors travel back from the store.
+async def build_context(matches: list, namespace: Optional[str] = None) -> str:
+    if not matches:
+        return ""
+    start = time.perf_counter()
+    ids, hashes = [], []
+    for m in matches:
+        text = m["metadata"].get("text")
+        if text:
+            ids.append(m["id"])
+            hashes.append(chunk_hash(text))
+    try:
+        found = await asyncio.to_thread(get_embedding_cache().get_many, embedding_model, hashes)
+        vectors = {i: found[h] for i, h in zip(ids, hashes) if h in found}
+    except Exception as e:
+        logger.warning("Embedding cache unavailable, skipping MMR: %s", e)
+        vectors = None
+    context, _ = assemble_context(matches, vectors)
+    observe("context_assembly", time.perf_counter() - start, namespace)
+    return context
 
-    # Remove markdown headings (e.g., ##, ###)
-    text = re.sub(r"#+\s*", "", text)
 
-    # Convert numbered lists like "1. Item"
-    text = re.sub(r"^(\d+)\.\s+", r"\1. ", text, flags=re.MULTILINE)
+def build_messages(query: str, context: str) -> list:
+    system_prompt = (
+        "You are an intelligent assistant. Use the context below to answer questions:\n\n"
+        f"{context}\n\n"
+        "If the answer is not in the context, reply: 'I don’t know based on the document.'"
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query},
+    ]
 
-    # Replace line breaks with <br>
-    text = text.replace("\n", "<br>")
 
-    return text.strip()
+# 🔹 Semantic answer cache scope: (namespace, namespace version, document set).
+# Taken before retrieval so an answer built from old contents is filed as old.
+async def answer_cache_scope(namespace: str, selected_file: Optional[str] = None, doc_ids: Optional[list] = None):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return (namespace, await retrieval_cache.namespace_version(namespace), document_scope(selected_file, doc_ids))
 
 
 # 🔹 Non-streaming chat (used in /guest-chat)
 async def chat_with_documents(
-    query: str, namespace: str, selected_file: Optional[str] = None
+    query: str, namespace: str, selected_file: Optional[str] = None, doc_ids: Optional[list] = None
 ) -> str:
     if not query or not query.strip():
         return "Please enter a valid question."
 
     try:
-        embedded_query = await embed_text([query])
-        query_vector = embedded_query[0]
+        query_vector = await embed_query(query, namespace)
+        cache_scope = await answer_cache_scope(namespace, selected_file, doc_ids)
+        if cache_scope:
+            cached = answer_cache.lookup(*cache_scope, query_vector)
+            if cached is not None:
+                return format_markdown_to_html(cached)
 
-        search_result = index.query(
-            vector=query_vector, top_k=5, include_metadata=True, namespace=namespace
-        )
-
-        matches = search_result.get("matches", [])
-        if selected_file:
-            matches = [m for m in matches if m["metadata"].get("file") == selected_file]
-
-        context = "\n".join(
-            m["metadata"].get("text", "") for m in matches if "text" in m["metadata"]
-        )
+        matches = await retrieve_matches(query_vector, namespace, selected_file, query, doc_ids)
+        context = await build_context(matches, namespace)
 
         if not context.strip():
             return "I couldn’t find relevant information in your documents."
 
-        system_prompt = (
-            "You are an intelligent assistant. Use the context below to answer questions:\n\n"
-            f"{context}\n\n"
-            "If the answer is not in the context, reply: 'I don’t know based on the document.'"
-        )
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query},
-        ]
+        messages = build_messages(query, context)
 
-        response = await client.chat.completions.create(
-            model=chat_model, messages=messages, temperature=0.2, max_tokens=800
-        )
+        with span("model_completion", namespace):
+            response = await get_client().chat.completions.create(
+                model=chat_model, messages=messages, temperature=0.2, max_tokens=800
+            )
 
         raw_output = response.choices[0].message.content
+        if cache_scope:
+            answer_cache.store(*cache_scope, query_vector, raw_output)
         return format_markdown_to_html(raw_output)
 
     except Exception as e:
-        print(f"[Chat Error] {e}")
+        if is_throttled(e):
+            admission.backoff(upstream_retry_after(e))
+            return BUSY_MESSAGE
+        logger.exception("Chat failed: %s", e)
         return "An error occurred while generating the answer. Please try again."
 
 
-# 🔹 Streaming chat response (used in /guest-chat/stream)
+# 🔹 Streaming chat response: raw model deltas, as they arrive
 async def stream_chat_with_documents(
-    query: str, namespace: str, selected_file: Optional[str] = None
+    query: str, namespace: str, selected_file: Optional[str] = None, doc_ids: Optional[list] = None
 ) -> AsyncGenerator[str, None]:
     if not query.strip():
         yield "Please enter a valid question."
         return
 
     try:
-        embedded_query = await embed_text([query])
-        query_vector = embedded_query[0]
-
-        search_result = index.query(
-            vector=query_vector, top_k=5, include_metadata=True, namespace=namespace
-        )
-
-        matches = search_result.get("matches", [])
-        if selected_file:
-            matches = [m for m in matches if m["metadata"].get("file") == selected_file]
-
-        context = "\n".join(
-            m["metadata"].get("text", "") for m in matches if "text" in m["metadata"]
-        )
+        query_vector = await embed_query(query, namespace)
+        cache_scope = await answer_cache_scope(namespace, selected_file, doc_ids)
+        if cache_scope:
+            cached = answer_cache.lookup(*cache_scope, query_vector)
+            if cached is not None:
+                for part in replay_stream(cached):
+                    yield part
+                return
+
+        matches = await retrieve_matches(query_vector, namespace, selected_file, query, doc_ids)
+        context = await build_context(matches, namespace)
 
         if not context.strip():
             yield "I couldn’t find relevant information in your documents."
             return
 
-        system_prompt = (
-            "You are an intelligent assistant. Use the context below to answer questions:\n\n"
-            f"{context}\n\n"
-            "If the answer is not in the context, reply: 'I don’t know based on the document.'"
-        )
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query},
-        ]
+        messages = build_messages(query, context)
 
-        response = await client.chat.completions.create(
+        started = time.perf_counter()
+        response = await get_client().chat.completions.create(
             model=chat_model,
             messages=messages,
             temperature=0.2,
@@ -146,21 +261,77 @@ async def stream_chat_with_documents(
             stream=True,
         )
 
-        buffer = ""
-
-        async for chunk in response:
-            delta = chunk.choices[0].delta.content if chunk.choices else ""
-            if delta:
-                buffer += delta
-                if " " in buffer or "\n" in buffer:
-                    parts = re.split(r"(\s+)", buffer)
-                    completed = "".join(parts[:-1])
-                    buffer = parts[-1]
-                    yield completed
-
-        if buffer.strip():
-            yield buffer
+        answer_parts = []
+        try:
+            async for chunk in response:
+                delta = chunk.choices[0].delta.content if chunk.choices else ""
+                if delta:
+                    if not answer_parts:
+                        observe("model_first_token", time.perf_counter() - started, namespace)
+                    answer_parts.append(delta)
+                    yield delta
+        finally:
+            # On cancellation (client went away) this stops generation upstream
+            await response.close()
+        observe("model_stream", time.perf_counter() - started, namespace)
+
+        if cache_scope:
+            answer_cache.store(*cache_scope, query_vector, "".join(answer_parts))
 
     except Exception as e:
-        print(f"[Streaming Chat Error] {e}")
+        if is_throttled(e):
+            admission.backoff(upstream_retry_after(e))
+            yield BUSY_MESSAGE
+            return
+        logger.exception("Streaming chat failed: %s", e)
         yield "An error occurred while generating the answer. Please try again."
+
+
+# 🔹 Azure quota exhaustion: the SDK has already retried by the time this is raised
+def is_throttled(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def upstream_retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# 🔹 Single-flight: identical questions about the same documents, asked while
+# an answer is still streaming, follow that answer instead of starting their
+# own embedding, retrieval and completion calls. Only a new answer takes an
+# admission token; raises ``Overloaded`` when none is available in time.
+async def answer_key(
+    query: str, namespace: str, selected_file: Optional[str] = None, doc_ids: Optional[list] = None
+) -> tuple:
+    normalized = " ".join(query.split()).casefold()
+    scope = document_scope(selected_file, doc_ids)
+    return (namespace, await retrieval_cache.namespace_version(namespace), scope, normalized)
+
+
+async def open_answer_stream(
+    query: str,
+    namespace: str,
+    selected_file: Optional[str] = None,
+    priority: str = "guest",
+    doc_ids: Optional[list] = None,
+):
+    return await answer_streams.join(
+        await answer_key(query, namespace, selected_file, doc_ids),
+        lambda: stream_chat_with_documents(query, namespace, selected_file, doc_ids),
+        admit=lambda: admission.acquire(priority, namespace),
+    )
+
+
+# 🔹 Model deltas rendered to HTML fragments (used by /chat/stream and /guest-chat/stream)
+async def render_html(deltas: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    renderer = StreamingMarkdownRenderer()
+    async for delta in deltas:
+        html = renderer.feed(delta)
+        if html:
+            yield html
+    yield renderer.finish()
+
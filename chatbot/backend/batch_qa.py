@@ -0,0 +1,227 @@
+# backend/batch_qa.py
+"""
+Answer many questions about one namespace in a single pass.
+
+    python -m backend.batch_qa --namespace user_7 questions.txt > answers.ndjson
+
+Questions are embedded in batched calls, retrieval runs concurrently and
+completions run BATCH_CONCURRENCY at a time; results come back in
+completion order. Served over HTTP as ``POST /chat/batch``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import AsyncGenerator, Optional
+from backend.openai_client import get_client, chat_model, embedding_model
+from backend.embedding_utils import embed_text
+from backend.retrieval_cache import retrieval_cache, normalize_query
+from backend.answer_cache import answer_cache
+from backend.admission import admission, Overloaded
+from backend.azure_openai_utils import (
+    answer_cache_scope,
+    build_context,
+    build_messages,
+    format_markdown_to_html,
+    is_throttled,
+    retrieve_matches,
+    upstream_retry_after,
+    BUSY_MESSAGE,
+)
+from backend.metrics import observe, span
+
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+BATCH_EMBED_SIZE = int(os.getenv("BATCH_EMBED_SIZE", "256"))  # questions per embedding call
+BATCH_RETRIEVAL_CONCURRENCY = int(os.getenv("BATCH_RETRIEVAL_CONCURRENCY", "16"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # completions in flight
+
+logger = logging.getLogger(__name__)
+
+
+def ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+async def embed_questions(questions: list[str], namespace: str) -> tuple[dict, float]:
+    """Embeddings by question, cached ones first, the rest in BATCH_EMBED_SIZE calls."""
+    start = time.perf_counter()
+    vectors, missing = {}, []
+    for question in questions:
+        vector = await retrieval_cache.get_embedding(embedding_model, question)
+        if vector is None:
+            missing.append(question)
+        else:
+            vectors[question] = vector
+
+    async def embed(batch):
+        for question, vector in zip(batch, await embed_text(batch)):
+            await retrieval_cache.set_embedding(embedding_model, question, vector)
+            vectors[question] = vector
+
+    batches = [missing[i : i + BATCH_EMBED_SIZE] for i in range(0, len(missing), BATCH_EMBED_SIZE)]
+    await asyncio.gather(*(embed(batch) for batch in batches))
+    seconds = time.perf_counter() - start
+    observe("query_embedding", seconds, namespace)
+    return vectors, seconds
+
+
+async def admit_batch(namespace: str):
+    # Batch answers queue behind interactive ones and wait out 429s instead of failing
+    while True:
+        try:
+            return await admission.acquire("batch", namespace)
+        except Overloaded as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def answer_batch(
+    questions: list[str],
+    namespace: str,
+    selected_file: Optional[str] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    doc_ids: Optional[list] = None,
+) -> AsyncGenerator[dict, None]:
+    """
+    Yield one result per question as its answer completes::
+
+        {"index": 3, "question": ..., "answer": <markdown>, "html": ...,
+         "shared": False, "timings": {"embedding_ms", "retrieval_ms",
+         "context_ms", "queued_ms", "completion_ms", "total_ms"}}
+
+    Questions equal after normalisation are answered once and reported
+    under every index (``shared``). Retrieval results are shared the same
+    way, and so is the prompt context of questions that retrieved the same
+    chunks. A failed question carries ``error`` instead of ``answer``.
+    """
+    started = time.perf_counter()
+    indexes: dict[str, list[int]] = {}
+    for i, question in enumerate(questions):
+        if question and question.strip():
+            indexes.setdefault(normalize_query(question), []).append(i)
+    results: asyncio.Queue = asyncio.Queue()
+
+    for i, question in enumerate(questions):
+        if not question or not question.strip():
+            yield {"index": i, "question": question, "error": "Please enter a valid question."}
+
+    unique = {key: questions[positions[0]] for key, positions in indexes.items()}
+    try:
+        vectors, embedding_seconds = await embed_questions(list(unique.values()), namespace)
+    except Exception as e:
+        logger.exception("Batch embedding failed: %s", e)
+        for key, positions in indexes.items():
+            for i in positions:
+                yield {"index": i, "question": questions[i], "error": "Embedding failed."}
+        return
+
+    retrieval_slots = asyncio.Semaphore(BATCH_RETRIEVAL_CONCURRENCY)
+    completion_slots = asyncio.Semaphore(concurrency)
+    contexts: dict[tuple, asyncio.Task] = {}  # retrieved chunk ids -> prompt context
+
+    async def answer(key: str, question: str):
+        timings = {"embedding_ms": ms(embedding_seconds)}
+        result = {"question": question}
+        try:
+            vector = vectors[question]
+            cache_scope = await answer_cache_scope(namespace, selected_file, doc_ids)
+            cached = answer_cache.lookup(*cache_scope, vector) if cache_scope else None
+            if cached is not None:
+                result["answer"] = cached
+                return
+
+            start = time.perf_counter()
+            async with retrieval_slots:
+                matches = await retrieve_matches(vector, namespace, selected_file, question, doc_ids)
+            timings["retrieval_ms"] = ms(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            chunk_ids = tuple(m["id"] for m in matches)
+            if chunk_ids not in contexts:
+                contexts[chunk_ids] = asyncio.ensure_future(build_context(matches, namespace))
+            context = await contexts[chunk_ids]
+            timings["context_ms"] = ms(time.perf_counter() - start)
+            if not context.strip():
+                result["answer"] = "I couldn’t find relevant information in your documents."
+                return
+
+            start = time.perf_counter()
+            async with completion_slots:
+                await admit_batch(namespace)
+                timings["queued_ms"] = ms(time.perf_counter() - start)
+                start = time.perf_counter()
+                with span("model_completion", namespace):
+                    response = await get_client().chat.completions.create(
+                        model=chat_model,
+                        messages=build_messages(question, context),
+                        temperature=0.2,
+                        max_tokens=800,
+                    )
+            timings["completion_ms"] = ms(time.perf_counter() - start)
+            result["answer"] = response.choices[0].message.content
+            if cache_scope:
+                answer_cache.store(*cache_scope, vector, result["answer"])
+        except Exception as e:
+            if is_throttled(e):
+                admission.backoff(upstream_retry_after(e))
+                result["error"] = BUSY_MESSAGE
+            else:
+                logger.exception("Batch answer failed: %s", e)
+                result["error"] = "An error occurred while generating the answer."
+        finally:
+            if "answer" in result:
+                result["html"] = format_markdown_to_html(result["answer"])
+            timings["total_ms"] = ms(time.perf_counter() - started)
+            results.put_nowait((key, result, timings))
+
+    tasks = [asyncio.create_task(answer(key, question)) for key, question in unique.items()]
+    try:
+        for _ in tasks:
+            key, result, timings = await results.get()
+            positions = indexes[key]
+            for i in positions:
+                yield {
+                    "index": i,
+                    **result,
+                    "question": questions[i],
+                    "shared": len(positions) > 1,
+                    "timings": timings,
+                }
+    finally:
+        # The caller stopped reading (e.g. the client disconnected)
+        for task in tasks:
+            task.cancel()
+        for task in contexts.values():
+            task.cancel()
+
+
+def read_questions(path: str) -> list[str]:
+    """A JSON list of strings, or one question per line."""
+    with open(path, encoding="utf-8") if path != "-" else sys.stdin as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+async def run(args):
+    questions = read_questions(args.questions)
+    async for result in answer_batch(questions, args.namespace, args.file, args.concurrency, args.doc_ids):
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="file with one question per line or a JSON list ('-' for stdin)")
+    parser.add_argument("--namespace", required=True, help="e.g. user_7")
+    parser.add_argument("--file", default=None, help="only search this file of the namespace")
+    parser.add_argument("--doc-id", dest="doc_ids", type=int, action="append", help="only search these documents (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# backend/chunker.py
+import os
+import re
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# One match per estimated token: up to four letters, three digits or four punctuation marks
+TOKEN_ESTIMATE_RE = re.compile(r"[^\W\d_]{1,4}|\d{1,3}|[^\s\w]{1,4}")
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*")
+UNIT_END_RE = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*")
+WORD_RE = re.compile(r"\s*\S+\s*")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Deterministic estimate of the embedding model's token count.
+
+    Letter and punctuation runs cost one token per four characters (rounded
+    up), digits one per group of three, whitespace nothing. It slightly
+    over-counts English compared with cl100k, which keeps chunks safely inside
+    the model's limit, and it does not depend on which tokenizer package is
+    installed, so chunk boundaries (and therefore chunk ids) are stable
+    everywhere.
+    """
+    return len(TOKEN_ESTIMATE_RE.findall(text))
+
+
+class _Unit:
+    __slots__ = ("offset", "text", "tokens")
+
+    def __init__(self, offset: int, text: str):
+        self.offset = offset
+        self.text = text
+        self.tokens = count_tokens(text)
+
+
+def _split_units(paragraph: str, offset: int, max_tokens: int):
+    """Split a paragraph into sentence/line units, breaking overlong ones at word boundaries."""
+    start = 0
+    pieces = []
+    for match in UNIT_END_RE.finditer(paragraph):
+        pieces.append((start, paragraph[start : match.end()]))
+        start = match.end()
+    if start < len(paragraph):
+        pieces.append((start, paragraph[start:]))
+
+    units = []
+    for piece_start, piece in pieces:
+        unit = _Unit(offset + piece_start, piece)
+        if unit.tokens <= max_tokens:
+            units.append(unit)
+            continue
+        # Pack words into max_tokens-sized units
+        group_start, group, group_tokens = piece_start, "", 0
+        for word in WORD_RE.finditer(piece):
+            tokens = count_tokens(word.group())
+            if group and group_tokens + tokens > max_tokens:
+                units.append(_Unit(offset + group_start, group))
+                group_start, group, group_tokens = piece_start + word.start(), "", 0
+            group += word.group()
+            group_tokens += tokens
+        if group:
+            units.append(_Unit(offset + group_start, group))
+    return units
+
+
+def iter_paragraphs(pages, max_tokens: int = CHUNK_TOKENS):
+    """
+    Turn a stream of ``(page, text)`` blocks into ``(page, units, tokens)``
+    paragraphs, ``tokens`` being the paragraph's token count.
+
+    Only the unfinished last paragraph of the current page is held between
+    blocks; a page change or the end of input completes it. A paragraph that
+    grows past ``max_tokens`` without a break is passed on as it arrives:
+    its finished units go out and only the last one is held, so the held
+    text stays bounded. Those pieces have ``tokens`` None after the first,
+    which reports more than ``max_tokens``.
+    """
+    tail, tail_offset, tail_page = "", 0, None
+    split = False  # part of the held paragraph has been passed on
+    doc_offset = 0
+
+    def paragraph(text, offset):
+        return _split_units(text, offset, max_tokens), None if split else count_tokens(text)
+
+    for page, text in pages:
+        if tail and page != tail_page:
+            yield tail_page, *paragraph(tail, tail_offset)
+            tail, split = "", False
+        if not tail:
+            tail_offset = doc_offset
+        tail_page = page
+        tail += text
+        doc_offset += len(text)
+
+        start = 0
+        for match in PARAGRAPH_RE.finditer(tail):
+            yield page, *paragraph(tail[start : match.end()], tail_offset + start)
+            start, split = match.end(), False
+        tail, tail_offset = tail[start:], tail_offset + start
+
+        tokens = count_tokens(tail)
+        if tokens > max_tokens:
+            units = _split_units(tail, tail_offset, max_tokens)
+            if len(units) > 1:
+                # The last unit may still continue in the next block
+                yield page, units[:-1], None if split else tokens
+                split = True
+                tail, tail_offset = tail[units[-1].offset - tail_offset :], units[-1].offset
+    if tail:
+        yield tail_page, *paragraph(tail, tail_offset)
+
+
+def _emit(page, units):
+    text = "".join(u.text for u in units)
+    stripped = text.strip()
+    if stripped:
+        return page, units[0].offset + (len(text) - len(text.lstrip())), stripped
+    return None
+
+
+def chunk_pages(pages, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+    """
+    Yield ``(page, offset, text)`` chunks of at most ``max_tokens`` tokens.
+
+    Paragraphs are kept whole when they fit in the current chunk; otherwise
+    the chunk is closed and the paragraph starts a new one, split at
+    sentence/line boundaries if it is itself too long. Chunks never span
+    pages. Consecutive chunks on a page share up to ``overlap_tokens`` of
+    trailing sentences (never all of the earlier chunk). ``offset`` is the character offset of the chunk in
+    the concatenated page text, so the output is fully deterministic.
+    """
+    current, current_tokens, current_page = [], 0, None
+
+    def overlap_tail(units):
+        # Never the whole chunk: the next one must start past this one's offset
+        tail, tokens = [], 0
+        for unit in reversed(units[1:]):
+            if tokens + unit.tokens > overlap_tokens:
+                break
+            tail.insert(0, unit)
+            tokens += unit.tokens
+        return tail, tokens
+
+    for page, units, paragraph_tokens in iter_paragraphs(pages, max_tokens):
+        if not units:
+            continue
+        if current and page != current_page:
+            if chunk := _emit(current_page, current):
+                yield chunk
+            current, current_tokens = [], 0
+        current_page = page
+
+        # The rest of a split paragraph packs unit by unit, like its start did
+        whole = paragraph_tokens is not None
+        if whole and current and current_tokens + paragraph_tokens > max_tokens:
+            if chunk := _emit(page, current):
+                yield chunk
+            current, current_tokens = overlap_tail(current)
+
+        for unit in units:
+            if current and current_tokens + unit.tokens > max_tokens:
+                if chunk := _emit(page, current):
+                    yield chunk
+                current, current_tokens = overlap_tail(current)
+                # An overlap that leaves no room for the next unit is dropped
+                if current_tokens + unit.tokens > max_tokens:
+                    current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit.tokens
+
+    if current:
+        if chunk := _emit(current_page, current):
+            yield chunk
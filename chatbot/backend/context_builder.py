@@ -0,0 +1,180 @@
+# backend/context_builder.py
+import os
+import numpy as np
+from backend.chunker import count_tokens, TOKEN_ESTIMATE_RE, UNIT_END_RE
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1100"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.85"))
+# Below this many tokens of leftover budget, no chunk is cut down to fill it
+MIN_PARTIAL_TOKENS = 48
+# Spans this close (in characters) are treated as adjacent and merged
+ADJACENT_GAP = 2
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray | None, mmr_lambda: float = MMR_LAMBDA) -> list[int]:
+    """
+    Order candidates by maximal marginal relevance.
+
+    ``relevance`` is each candidate's query relevance in [0, 1]; ``vectors``
+    holds unit-normalised embeddings (rows of zeros for unknown ones, which
+    then count as dissimilar to everything). Each pick maximises
+    ``lambda * relevance - (1 - lambda) * max similarity to earlier picks``;
+    the pairwise similarities are one matrix product and the running
+    maximum is updated with one vector operation per pick.
+    """
+    n = len(relevance)
+    if vectors is None or n < 2:
+        return list(np.argsort(-relevance, kind="stable"))
+    similarity = vectors @ vectors.T
+    max_similarity = np.zeros(n, dtype=np.float32)
+    chosen = np.zeros(n, dtype=bool)
+    order = []
+    for _ in range(n):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_similarity
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        chosen[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return order
+
+
+class _Span:
+    __slots__ = ("key", "start", "end", "text", "rank", "page", "file")
+
+    def __init__(self, key, start, text, rank, page, file):
+        self.key, self.start, self.text = key, start, text
+        self.end = start + len(text)
+        self.rank, self.page, self.file = rank, page, file
+
+
+def _span_of(match: dict, rank: int) -> _Span:
+    meta = match.get("metadata") or {}
+    offset = meta.get("offset")
+    doc = meta.get("doc_hash") or meta.get("file")
+    text = meta.get("text", "")
+    if offset is None or doc is None:
+        # Chunks without a position can only be de-duplicated by identity
+        return _Span(("id", match.get("id")), 0, text, rank, meta.get("page"), meta.get("file"))
+    return _Span(("doc", doc), int(offset), text, rank, meta.get("page"), meta.get("file"))
+
+
+def _uncovered(span: _Span, taken: list[_Span]) -> list[tuple[int, int]]:
+    """Character ranges of ``span`` not already covered by ``taken`` spans of the same document."""
+    ranges = [(span.start, span.end)]
+    for other in taken:
+        if other.key != span.key:
+            continue
+        clipped = []
+        for start, end in ranges:
+            if other.end <= start or other.start >= end:
+                clipped.append((start, end))
+                continue
+            if start < other.start:
+                clipped.append((start, other.start))
+            if other.end < end:
+                clipped.append((other.end, end))
+        ranges = clipped
+    return ranges
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Leading part of ``text`` within ``max_tokens``, cut at a sentence end when one is near."""
+    ends = [m.end() for _, m in zip(range(max_tokens), TOKEN_ESTIMATE_RE.finditer(text))]
+    if len(ends) < max_tokens:
+        return text
+    head = text[: ends[-1]]
+    sentence_ends = [m.end() for m in UNIT_END_RE.finditer(head)]
+    if sentence_ends and sentence_ends[-1] > len(head) // 2:
+        return head[: sentence_ends[-1]]
+    return head
+
+
+def _merge(spans: list[_Span]) -> list[_Span]:
+    """Merge overlapping or adjacent spans of one document into continuous text."""
+    spans = sorted(spans, key=lambda s: s.start)
+    merged = [spans[0]]
+    for span in spans[1:]:
+        last = merged[-1]
+        if span.start <= last.end + ADJACENT_GAP:
+            if span.end > last.end:
+                overlap = last.end - span.start
+                joiner = "\n" if overlap < 0 else ""
+                last.text += joiner + span.text[max(overlap, 0) :]
+                last.end = span.end
+            last.rank = min(last.rank, span.rank)
+        else:
+            merged.append(span)
+    return merged
+
+
+def assemble_context(
+    matches: list,
+    vectors: dict | None = None,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    mmr_lambda: float = MMR_LAMBDA,
+) -> tuple[str, list]:
+    """
+    Build the prompt context from a pool of retrieved matches.
+
+    Candidates are visited in MMR order (relevance from the retrieval score,
+    redundancy from ``vectors``, a ``{match id: embedding}`` map) and taken
+    while they fit in ``token_budget``; once one no longer fits, its
+    beginning fills what is left. Only the part of a chunk not already
+    covered by a chosen chunk of the same document counts against the
+    budget. Chosen chunks of one document are then merged where they
+    overlap or touch, and the blocks are emitted in order of their best
+    rank. Returns the context text and the matches that contributed.
+    """
+    matches = [m for m in matches if (m.get("metadata") or {}).get("text")]
+    if not matches:
+        return "", []
+
+    # Min-max scaled, so flat score scales (fused RRF scores) still spread over [0, 1]
+    scores = np.array([m.get("score") or 0.0 for m in matches], dtype=np.float32)
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+    matrix = None
+    if vectors:
+        dim = len(next(iter(vectors.values())))
+        matrix = np.zeros((len(matches), dim), dtype=np.float32)
+        for i, m in enumerate(matches):
+            vec = vectors.get(m["id"])
+            if vec is not None:
+                matrix[i] = vec
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+    taken: list[_Span] = []
+    used = []
+    remaining = token_budget
+    for rank, i in enumerate(mmr_order(relevance, matrix, mmr_lambda)):
+        span = _span_of(matches[i], rank)
+        if span.key[0] == "id" and any(t.key == span.key for t in taken):
+            continue
+        ranges = _uncovered(span, taken) if span.key[0] == "doc" else [(span.start, span.end)]
+        new_text = "".join(span.text[s - span.start : e - span.start] for s, e in ranges)
+        if not new_text.strip():
+            continue
+        cost = count_tokens(new_text)
+        if cost > remaining:
+            # Fill the leftover budget with the start of a chunk that does not fit whole
+            if len(ranges) > 1 or remaining < MIN_PARTIAL_TOKENS:
+                continue
+            new_text = _truncate(new_text, remaining)
+            span = _Span(span.key, ranges[0][0], new_text, rank, span.page, span.file)
+            cost = count_tokens(new_text)
+        remaining -= cost
+        taken.append(span)
+        used.append(matches[i])
+
+    blocks = []
+    by_key: dict = {}
+    for span in taken:
+        by_key.setdefault(span.key, []).append(span)
+    for spans in by_key.values():
+        blocks.extend(_merge(spans))
+    blocks.sort(key=lambda s: s.rank)
+    return "\n\n".join(block.text for block in blocks), used
@@ -2,11 +2,10 @@
 
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from backend.auth import require_login
+from backend.services import services
 
 router = APIRouter()
-templates = Jinja2Templates(directory="frontend/templates")
 
 
 @router.get("/dashboard", response_class=HTMLResponse)
@@ -14,6 +13,6 @@ async def dashboard(request: Request):
     user_id = require_login(request)
     if isinstance(user_id, RedirectResponse):
         return user_id  # redirect if not logged in
-    return templates.TemplateResponse(
-        "dashboard.html", {"request": request, "user_id": user_id}
+    return services.templates.TemplateResponse(
+        request, "dashboard.html", {"request": request, "user_id": user_id}
     )
@@ -1,5 +1,8 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import asyncio
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 import os
 
 DB_USER = os.getenv("MYSQL_USER", "root")
@@ -7,16 +10,130 @@ DB_PASSWORD = os.getenv("MYSQL_PASSWORD", "1234")
 DB_HOST = os.getenv("MYSQL_HOST", "localhost")
 DB_NAME = os.getenv("MYSQL_DB", "chatbot")
 
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+# DATABASE_URL overrides the MySQL settings (e.g. sqlite:///./chatbot.db for local runs).
+# Sync driver names are mapped to their async counterparts, see async_url().
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}",
+)
+
+# Connection pool: DB_POOL_SIZE kept open, up to DB_MAX_OVERFLOW more under load,
+# recycled after DB_POOL_RECYCLE seconds (below MySQL's wait_timeout) and
+# checked with a cheap ping before use so dropped connections are replaced.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+}
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
+_engine = None
+logger = logging.getLogger(__name__)
+
+
+def async_url(url: str) -> str:
+    """``DATABASE_URL`` with a sync driver swapped for its async one."""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def get_engine():
+    """Create the async engine (and import the DB driver) on first use."""
+    global _engine
+    if _engine is None:
+        url = async_url(DATABASE_URL)
+        options = {"pool_pre_ping": DB_POOL_PRE_PING}
+        # In-memory SQLite runs on a single static connection, there is no pool to size
+        if ":memory:" not in url and not url.endswith("://"):
+            options.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+            )
+        _engine = create_async_engine(url, **options)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+class _LazySessionmaker(async_sessionmaker):
+    def __call__(self, **kwargs):
+        get_engine()
+        return super().__call__(**kwargs)
+
+
+# ``async with SessionLocal() as db:`` outside of requests. Objects stay
+# usable after commit, since attribute refreshes cannot lazy-load here.
+SessionLocal = _LazySessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+
+def __getattr__(name):
+    # ``from backend.database import engine`` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
+
+
+async def create_tables():
+    """
+    Create missing tables, and on tables that already exist, missing
+    nullable columns and missing indexes.
+    """
+    import backend.models  # noqa: F401  (registers the tables)
+
+    def create(conn):
+        Base.metadata.create_all(conn)
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(create)
+
+
+async def ensure_tables(max_delay: float = 30):
+    """
+    create_tables() at startup, in the background: retried with backoff while
+    the database is unreachable (or another process is altering the same
+    tables), so the app can start before its database does.
+    """
+    retry = 1
+    while True:
+        try:
+            await create_tables()
+            return
+        except Exception as e:
+            logger.warning("Creating database tables failed, retrying in %ss: %s", retry, e)
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, max_delay)
+
+
+async def ping_database():
+    async with get_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def dispose_engine():
+    global _engine
+    if _engine is not None:
+        engine, _engine = _engine, None
+        await engine.dispose()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,70 @@
+# backend/document_versions.py
+from sqlalchemy import select
+from backend.database import SessionLocal
+from backend.models import Document
+
+
+def diff_chunks(old: dict, new: list[tuple]) -> tuple[dict, set, list]:
+    """
+    Plan a document replacement from its registered chunks (``old``, vector
+    id -> chunk hash) and the new version's chunks (``(vector id, chunk
+    hash, ...)`` tuples).
+
+    Returns ``(kept, upload, removed)``: old vectors whose text is still in
+    the document, mapped to the new chunk they stand for (matched by id
+    first, then by hash, so moved chunks are kept too), ids of the new
+    chunks that have to be embedded and upserted, and old vectors to delete.
+    Old vectors without a hash never match.
+    """
+    new_ids = {chunk[0] for chunk in new}
+    kept = {chunk[0]: chunk[0] for chunk in new if old.get(chunk[0]) == chunk[1]}
+    # An id the new version writes itself can't be reused for another chunk
+    reusable: dict[str, list[str]] = {}
+    for vector_id, h in old.items():
+        if h and vector_id not in kept and vector_id not in new_ids:
+            reusable.setdefault(h, []).append(vector_id)
+
+    upload = set()
+    for vector_id, h, *_ in new:
+        if vector_id in kept:
+            continue
+        if reusable.get(h):
+            kept[reusable[h].pop()] = vector_id
+        else:
+            upload.add(vector_id)
+    removed = [vector_id for vector_id in old if vector_id not in kept and vector_id not in upload]
+    return kept, upload, removed
+
+
+async def document_states(doc_ids) -> dict:
+    """Current ``(version, content hash)`` of each document, from the database."""
+    if not doc_ids:
+        return {}
+    async with SessionLocal() as db:
+        rows = await db.execute(
+            select(Document.id, Document.version, Document.content_hash).where(Document.id.in_(doc_ids))
+        )
+        return {doc_id: (version or 1, content_hash) for doc_id, version, content_hash in rows}
+
+
+def visible_matches(matches: list, states: dict) -> list:
+    """
+    Drop the chunks of versions that are not (or no longer) current.
+
+    Chunks carry the ``version`` they were written for and, once a new
+    version drops them, its content hash as ``retired_by``. With ``states``
+    read from the database (see document_states), a new version's chunks
+    stay hidden until the Document row moves to it, and the chunks it
+    dropped disappear in the same step, for every worker process at once.
+    Chunks of documents without a row are kept.
+    """
+    visible = []
+    for match in matches:
+        meta = match["metadata"]
+        state = states.get(meta.get("doc_id"))
+        if state is not None:
+            version, content_hash = state
+            if meta.get("version", 1) > version or meta.get("retired_by") == content_hash:
+                continue
+        visible.append(match)
+    return visible
@@ -1,22 +1,32 @@
 # backend/embedding_utils.py
-import os
-from openai import AzureOpenAI
-from dotenv import load_dotenv
+import asyncio
+from backend.openai_client import get_client, embedding_model
+from backend.embedding_cache import chunk_hash, get_embedding_cache
 
-load_dotenv()
-
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_version="2024-05-01-preview"
-)
-
-embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
 # Get embeddings from Azure OpenAI
 async def embed_text(chunks: list[str]) -> list[list[float]]:
-    result = client.embeddings.create(
+    result = await get_client().embeddings.create(
         input=chunks,
         model=embedding_model
     )
     return [r.embedding for r in result.data]
+
+
+# Same as embed_text, but only chunks missing from the local cache hit the API
+async def embed_text_cached(chunks: list[str]) -> list[list[float]]:
+    cache = get_embedding_cache()
+    hashes = [chunk_hash(c) for c in chunks]
+    found = await asyncio.to_thread(cache.get_many, embedding_model, hashes)
+
+    missing = {}
+    for h, chunk in zip(hashes, chunks):
+        if h not in found:
+            missing.setdefault(h, chunk)
+    if missing:
+        embeddings = await embed_text(list(missing.values()))
+        new = dict(zip(missing.keys(), embeddings))
+        await asyncio.to_thread(cache.put_many, embedding_model, new)
+        found.update(new)
+
+    return [found[h] for h in hashes]
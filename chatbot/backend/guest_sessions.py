@@ -0,0 +1,234 @@
+# backend/guest_sessions.py
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, or_, select, update
+from backend.database import SessionLocal
+from backend.models import Document, GuestSession, IngestJob
+from backend.metrics import Counter, Gauge, observe, register
+from backend.pinecone_utils import delete_namespace
+from backend.artifacts import remove_artifacts
+
+GUEST_SESSION_TTL = int(os.getenv("GUEST_SESSION_TTL_SECONDS", "7200"))  # idle time before reaping
+GUEST_MAX_BYTES = int(os.getenv("GUEST_MAX_BYTES", str(20 * 1024 * 1024)))
+GUEST_REAP_INTERVAL = float(os.getenv("GUEST_REAP_INTERVAL_SECONDS", "300"))
+GUEST_REAP_BATCH = int(os.getenv("GUEST_REAP_BATCH", "50"))
+GUEST_REAP_CONCURRENCY = int(os.getenv("GUEST_REAP_CONCURRENCY", "4"))
+# Activity is written back at most this often per session
+GUEST_TOUCH_INTERVAL = float(os.getenv("GUEST_TOUCH_INTERVAL_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+sessions_reaped = register(
+    Counter("chatmate_guest_sessions_reaped_total", "Guest sessions whose data was deleted.")
+)
+files_reclaimed = register(
+    Counter("chatmate_guest_files_reclaimed_total", "Guest upload files deleted from disk.")
+)
+bytes_reclaimed = register(
+    Counter("chatmate_guest_bytes_reclaimed_total", "Bytes of guest upload files deleted from disk.")
+)
+reap_errors = register(
+    Counter("chatmate_guest_reap_errors_total", "Guest sessions that failed to be reaped (retried later).")
+)
+sessions_active = register(
+    Gauge("chatmate_guest_sessions_active", "Guest sessions neither retired nor expired, as of the last reap.")
+)
+
+
+def namespace_of(session_id: str) -> str:
+    return f"session_{session_id}"
+
+
+class GuestSessionRegistry:
+    """
+    Guest sessions with their creation time, last activity and upload size.
+
+    A session ends when it is retired (logout, or replaced by a new upload)
+    or has been idle for GUEST_SESSION_TTL. The request path only marks it;
+    a background reaper deletes the namespace, the uploaded files and
+    extracted text no one else references and the job rows,
+    GUEST_REAP_BATCH sessions per pass.
+    """
+
+    def __init__(self):
+        self._last_touch: dict[str, float] = {}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def create(self, session_id: str, bytes_used: int = 0):
+        async with SessionLocal() as db:
+            db.add(GuestSession(id=session_id, bytes_used=bytes_used))
+            await db.commit()
+        self._last_touch[session_id] = time.monotonic()
+
+    async def touch(self, session_id: str) -> bool:
+        """Record activity; False when the session is unknown, retired or expired."""
+        now = time.monotonic()
+        last = self._last_touch.get(session_id)
+        if last is not None and now - last < GUEST_TOUCH_INTERVAL:
+            return True
+        cutoff = datetime.utcnow() - timedelta(seconds=GUEST_SESSION_TTL)
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(GuestSession)
+                .where(
+                    GuestSession.id == session_id,
+                    GuestSession.retired_at.is_(None),
+                    GuestSession.last_seen_at >= cutoff,
+                )
+                .values(last_seen_at=datetime.utcnow())
+            )
+            await db.commit()
+        if result.rowcount:
+            self._last_touch[session_id] = now
+            return True
+        self._last_touch.pop(session_id, None)
+        return False
+
+    async def retire(self, session_id: str):
+        """Hand the session's data to the reaper."""
+        self._last_touch.pop(session_id, None)
+        async with SessionLocal() as db:
+            await db.execute(
+                update(GuestSession)
+                .where(GuestSession.id == session_id, GuestSession.retired_at.is_(None))
+                .values(retired_at=datetime.utcnow())
+            )
+            await db.commit()
+        self._wake.set()
+
+    # ---------------------------------------------------------------- reaping
+
+    async def reap_once(self) -> dict:
+        """Reap one batch of ended sessions; returns what was reclaimed."""
+        start = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(seconds=GUEST_SESSION_TTL)
+        ended = or_(GuestSession.retired_at.is_not(None), GuestSession.last_seen_at < cutoff)
+        async with SessionLocal() as db:
+            session_ids = (
+                await db.scalars(
+                    select(GuestSession.id)
+                    .where(ended)
+                    .order_by(GuestSession.last_seen_at)
+                    .limit(GUEST_REAP_BATCH)
+                )
+            ).all()
+            active = await db.scalar(select(func.count()).select_from(GuestSession).where(~ended))
+        sessions_active.set(active or 0)
+
+        semaphore = asyncio.Semaphore(GUEST_REAP_CONCURRENCY)
+
+        async def reap(session_id):
+            async with semaphore:
+                try:
+                    return await self._reap_session(session_id)
+                except Exception as e:
+                    reap_errors.inc()
+                    logger.warning("Reaping guest session %s failed: %s", session_id, e)
+                    return None
+
+        results = [r for r in await asyncio.gather(*(reap(s) for s in session_ids)) if r]
+        totals = {
+            "sessions": len(results),
+            "files": sum(files for files, _ in results),
+            "bytes": sum(size for _, size in results),
+        }
+        if results:
+            observe("guest_reap", time.perf_counter() - start)
+            logger.info(
+                "Reaped %d guest sessions, %d files, %d bytes", totals["sessions"], totals["files"], totals["bytes"]
+            )
+        return totals
+
+    async def _reap_session(self, session_id: str) -> tuple[int, int] | None:
+        owner_key = namespace_of(session_id)
+        async with SessionLocal() as db:
+            jobs = (
+                await db.execute(
+                    select(IngestJob.status, IngestJob.file_path, IngestJob.content_hash).where(
+                        IngestJob.owner_key == owner_key
+                    )
+                )
+            ).all()
+            if any(status in ("queued", "running") for status, _, _ in jobs):
+                return None  # ingestion would re-add vectors; try again next pass
+
+            # Uploads are stored by content hash, so a file (and the text
+            # extracted from it) may be shared with another owner
+            paths = {path for _, path, _ in jobs}
+            hashes = {content_hash for _, _, content_hash in jobs if content_hash}
+            shared_paths, shared_hashes = set(), set()
+            if paths:
+                for path, content_hash in await db.execute(
+                    select(Document.file_path, Document.content_hash).where(
+                        or_(Document.file_path.in_(paths), Document.content_hash.in_(hashes))
+                    )
+                ):
+                    shared_paths.add(path)
+                    shared_hashes.add(content_hash)
+                for path, content_hash in await db.execute(
+                    select(IngestJob.file_path, IngestJob.content_hash).where(
+                        or_(IngestJob.file_path.in_(paths), IngestJob.content_hash.in_(hashes)),
+                        IngestJob.owner_key != owner_key,
+                    )
+                ):
+                    shared_paths.add(path)
+                    shared_hashes.add(content_hash)
+
+            await delete_namespace(owner_key)
+            files, size = await asyncio.to_thread(_remove_files, paths - shared_paths)
+            for content_hash in hashes - shared_hashes:
+                size += await asyncio.to_thread(remove_artifacts, content_hash)
+
+            await db.execute(delete(IngestJob).where(IngestJob.owner_key == owner_key))
+            await db.execute(delete(GuestSession).where(GuestSession.id == session_id))
+            await db.commit()
+
+        self._last_touch.pop(session_id, None)
+        sessions_reaped.inc()
+        files_reclaimed.inc(files)
+        bytes_reclaimed.inc(size)
+        return files, size
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), GUEST_REAP_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # Keep going while full batches come back
+                while (await self.reap_once())["sessions"] >= GUEST_REAP_BATCH:
+                    pass
+            except Exception as e:
+                logger.warning("Guest session reaping failed: %s", e)
+
+    def start(self):
+        self._wake.set()  # reap whatever expired while the app was down
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def _remove_files(paths) -> tuple[int, int]:
+    files = size = 0
+    for path in paths:
+        try:
+            file_size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        files += 1
+        size += file_size
+    return files, size
+
+
+guest_sessions = GuestSessionRegistry()
@@ -0,0 +1,242 @@
+# backend/ingest_jobs.py
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, update
+from backend.database import SessionLocal
+from backend.models import IngestJob
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# A running job is renewed every third of its lease; once the lease runs out
+# (the process died) any worker may take the job over
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "60"))
+
+TERMINAL_STATUSES = ("done", "failed")
+
+logger = logging.getLogger(__name__)
+
+
+def job_to_dict(job: IngestJob) -> dict:
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "document_id": job.document_id,
+        "status": job.status,
+        "stage": job.stage,
+        "chunks_done": job.chunks_done,
+        "chunks_total": job.chunks_total,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+async def update_job(job_id: str, **fields):
+    async with SessionLocal() as db:
+        await db.execute(update(IngestJob).where(IngestJob.id == job_id).values(**fields))
+        await db.commit()
+
+
+def claimable(now: datetime):
+    """Jobs nobody is running: queued, or running under an expired (or no) lease."""
+    return or_(
+        IngestJob.status == "queued",
+        and_(
+            IngestJob.status == "running",
+            or_(IngestJob.lease_expires_at.is_(None), IngestJob.lease_expires_at < now),
+        ),
+    )
+
+
+async def default_ingest(job: dict, on_stage, on_progress):
+    from backend.routers.ingest import ingest_document  # to avoid circular import
+
+    await ingest_document(**job, on_stage=on_stage, on_progress=on_progress)
+
+
+class IngestQueue:
+    """
+    Bounded pool of ingestion workers with round-robin fairness across owners.
+
+    Each owner (``user_{id}`` / ``session_{id}``) gets its own FIFO of job ids;
+    workers take one job from the next owner in turn, so a user who uploads
+    fifty manuals cannot starve everyone else. Job state lives in the
+    ``ingest_jobs`` table. Every app process runs a queue; a worker claims a
+    job in the database (a conditional UPDATE, under a lease it renews while
+    running) before running it, so each job runs once however many processes
+    know about it. Unclaimed jobs, including those whose lease ran out, are
+    looked up in the background every lease period, starting as soon as the
+    database answers; startup itself never waits for the database.
+    """
+
+    def __init__(
+        self, ingest_fn=default_ingest, workers: int = INGEST_WORKERS, lease_seconds: int = INGEST_LEASE_SECONDS
+    ):
+        self.ingest_fn = ingest_fn
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queues: dict[str, deque] = {}
+        self._owners: deque = deque()
+        self._queued: set = set()  # job ids waiting here, so a job is only queued once
+        self._ready = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+
+    async def create_job(
+        self, db, file_path, filename, namespace, owner_key, document_id=None, content_hash=None
+    ) -> IngestJob:
+        job = IngestJob(
+            id=str(uuid.uuid4()),
+            owner_key=owner_key,
+            namespace=namespace,
+            filename=filename,
+            file_path=file_path,
+            content_hash=content_hash,
+            document_id=document_id,
+            status="queued",
+        )
+        db.add(job)
+        await db.commit()
+        return job
+
+    async def submit(self, job_id: str, owner_key: str):
+        async with self._ready:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+            if owner_key not in self._queues:
+                self._queues[owner_key] = deque()
+                self._owners.append(owner_key)
+            self._queues[owner_key].append(job_id)
+            self._ready.notify()
+
+    async def _next_job(self) -> str:
+        async with self._ready:
+            await self._ready.wait_for(lambda: bool(self._owners))
+            owner_key = self._owners.popleft()
+            queue = self._queues[owner_key]
+            job_id = queue.popleft()
+            if queue:
+                self._owners.append(owner_key)
+            else:
+                del self._queues[owner_key]
+            self._queued.discard(job_id)
+            return job_id
+
+    def _lease(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def _claim(self, job_id: str) -> bool:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(IngestJob)
+                .where(IngestJob.id == job_id, claimable(datetime.utcnow()))
+                .values(status="running", error=None, claimed_by=self.worker_id, lease_expires_at=self._lease())
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(IngestJob)
+                    .where(IngestJob.id == job_id, IngestJob.claimed_by == self.worker_id)
+                    .values(lease_expires_at=self._lease())
+                )
+                await db.commit()
+
+    async def _run(self, job_id: str):
+        # Another process may have taken (or finished) the job already
+        if not await self._claim(job_id):
+            return
+        async with SessionLocal() as db:
+            job = await db.get(IngestJob, job_id)
+            if job is None:
+                return
+            job_info = {
+                "file_path": job.file_path,
+                "namespace": job.namespace,
+                "content_hash": job.content_hash,
+                "filename": job.filename,
+                "document_id": job.document_id,
+            }
+
+        async def on_stage(stage: str):
+            await update_job(job_id, stage=stage)
+
+        async def on_progress(done: int, total: int):
+            await update_job(job_id, chunks_done=done, chunks_total=total)
+
+        renewal = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            await self.ingest_fn(job_info, on_stage, on_progress)
+        except Exception as e:
+            logger.exception("Ingest job %s failed: %s", job_id, e)
+            await update_job(job_id, status="failed", error=str(e), lease_expires_at=None)
+        else:
+            await update_job(job_id, status="done", stage=None, lease_expires_at=None)
+        finally:
+            renewal.cancel()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._next_job()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                # e.g. the database is down; the job stays unclaimed and is picked up again
+                logger.warning("Could not run ingest job %s: %s", job_id, e)
+
+    async def requeue_unclaimed(self):
+        """Queue jobs nobody is running: new ones, and ones a dead process left behind."""
+        async with SessionLocal() as db:
+            pending = (
+                await db.execute(
+                    select(IngestJob.id, IngestJob.owner_key)
+                    .where(claimable(datetime.utcnow()))
+                    .order_by(IngestJob.created_at)
+                )
+            ).all()
+        for job_id, owner_key in pending:
+            await self.submit(job_id, owner_key)
+
+    async def _recover(self):
+        retry = 1
+        while True:
+            try:
+                await self.requeue_unclaimed()
+                delay, retry = self.lease_seconds, 1
+            except Exception as e:
+                # Database not reachable yet: retry sooner, backing off up to the lease period
+                logger.warning("Looking for unclaimed ingest jobs failed, retrying in %ss: %s", retry, e)
+                delay, retry = retry, min(retry * 2, self.lease_seconds)
+            await asyncio.sleep(delay)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+ingest_queue = IngestQueue()
+
+
+async def enqueue_file(
+    db, file_path, filename, namespace, owner_key, document_id=None, content_hash=None
+) -> IngestJob:
+    job = await ingest_queue.create_job(
+        db, file_path, filename, namespace, owner_key, document_id, content_hash
+    )
+    await ingest_queue.submit(job.id, owner_key)
+    return job
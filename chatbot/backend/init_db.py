@@ -1,5 +1,11 @@
-# init_db.py
-from database import Base, engine
-from models import User, Document
+# init_db.py  (python -m backend.init_db)
+import asyncio
+from backend.database import create_tables, dispose_engine
 
-Base.metadata.create_all(bind=engine)
+
+async def main():
+    await create_tables()
+    await dispose_engine()
+
+
+asyncio.run(main())
@@ -0,0 +1,320 @@
+# backend/lexical_index.py
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+from backend.vector_store import PARTITION_FIELDS, matches_filter, partition_values
+
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_data")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+# The log is rewritten once dead chunks outnumber live ones (and at least this many)
+LEXICAL_COMPACT_MIN_DEAD = int(os.getenv("LEXICAL_COMPACT_MIN_DEAD", "256"))
+
+# Metadata fields kept in memory for filtering; everything else stays in the log
+FILTER_FIELDS = ("file", "doc_id", "doc_hash", "page")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it of on or "
+    "the this to was what when where which who why will with you your".split()
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower-cased word tokens. Compound codes such as ``p0420``, ``12-v`` or
+    ``hunter-350`` are kept whole *and* split into their parts, so both
+    "Hunter 350" and "hunter-350" match.
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(p for p in re.split(r"[-./]", token) if p and p not in STOPWORDS)
+    return tokens
+
+
+class _Postings:
+    """Growable (doc row, term frequency) arrays for one term."""
+
+    __slots__ = ("rows", "tfs", "size")
+
+    def __init__(self):
+        self.rows = np.empty(4, dtype=np.int32)
+        self.tfs = np.empty(4, dtype=np.float32)
+        self.size = 0
+
+    def append(self, row: int, tf: int):
+        if self.size == len(self.rows):
+            self.rows = np.resize(self.rows, self.size * 2)
+            self.tfs = np.resize(self.tfs, self.size * 2)
+        self.rows[self.size] = row
+        self.tfs[self.size] = tf
+        self.size += 1
+
+
+class _NamespaceIndex:
+    """
+    BM25 index for one namespace, persisted as an append-only JSONL log.
+
+    Each added chunk is one line (id, filterable metadata, term counts, full
+    metadata); deletions are logged as tombstones. Loading replays the log.
+    Chunk text is read back from the log only for returned hits. Once
+    deleted or overwritten chunks outnumber the live ones, the log is
+    rewritten with the live chunks only and the index rebuilt from it.
+
+    Callers hold ``lock`` and call ``load`` first; the index is read from
+    disk on first use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.log_path = os.path.join(path, "log.jsonl")
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.dropped = False  # the namespace was deleted while this was in use
+        self._reset()
+
+    def _reset(self):
+        self.ids: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.lengths = np.empty(0, dtype=np.float32)
+        self.alive = np.empty(0, dtype=bool)
+        self.offsets: list[int] = []
+        self.filter_meta: list[dict] = []
+        self.partitions: dict[str, dict] = {field: {} for field in PARTITION_FIELDS}  # field -> value -> rows
+        self.postings: dict[str, _Postings] = {}
+        self.live_count = 0
+        self.total_length = 0.0
+
+    def load(self):
+        if not self.loaded:
+            if os.path.exists(self.log_path):
+                self._replay()
+            self.loaded = True
+
+    def _replay(self):
+        with open(self.log_path, "rb") as f:
+            offset = 0
+            for line in f:
+                record = json.loads(line)
+                if "delete" in record:
+                    self._remove(record["delete"])
+                else:
+                    self._add(record["id"], record["terms"], record["filter"], offset)
+                offset += len(line)
+
+    def _add(self, vector_id: str, terms: dict, filter_meta: dict, offset: int):
+        self._remove([vector_id])
+        row = len(self.ids)
+        if row == len(self.lengths):
+            capacity = max(64, row * 2)
+            self.lengths = np.resize(self.lengths, capacity)
+            self.alive = np.resize(self.alive, capacity)
+        length = float(sum(terms.values()))
+        self.ids.append(vector_id)
+        self.rows[vector_id] = row
+        self.lengths[row] = length
+        self.alive[row] = True
+        self.offsets.append(offset)
+        self.filter_meta.append(filter_meta)
+        for field, partitions in self.partitions.items():
+            if field in filter_meta:
+                partitions.setdefault(filter_meta[field], []).append(row)
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            postings.append(row, tf)
+        self.live_count += 1
+        self.total_length += length
+
+    def _remove(self, ids):
+        for vector_id in ids:
+            row = self.rows.pop(vector_id, None)
+            if row is not None and self.alive[row]:
+                self.alive[row] = False
+                self.live_count -= 1
+                self.total_length -= float(self.lengths[row])
+
+    def add(self, chunks: list[dict]):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.log_path, "ab") as f:
+            for chunk in chunks:
+                metadata = chunk.get("metadata") or {}
+                terms = dict(Counter(tokenize(metadata.get("text", ""))))
+                filter_meta = {k: metadata[k] for k in FILTER_FIELDS if k in metadata}
+                record = {"id": chunk["id"], "filter": filter_meta, "terms": terms, "metadata": metadata}
+                offset = f.tell()
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+                self._add(chunk["id"], terms, filter_meta, offset)
+
+    def update_metadata(self, updates: dict[str, dict]):
+        # Logged as a fresh add of the same chunk with the merged metadata
+        self.add(
+            [
+                {"id": vector_id, "metadata": {**self.read_metadata(self.rows[vector_id]), **fields}}
+                for vector_id, fields in updates.items()
+                if vector_id in self.rows
+            ]
+        )
+        self._maybe_compact()
+
+    def delete(self, ids: list[str]):
+        if not os.path.exists(self.path):
+            return
+        with open(self.log_path, "ab") as f:
+            f.write(json.dumps({"delete": list(ids)}).encode("utf-8") + b"\n")
+        self._remove(ids)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self.ids) - self.live_count
+        if dead >= LEXICAL_COMPACT_MIN_DEAD and dead > self.live_count:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the log with the live chunks only and rebuild the index from it."""
+        tmp_path = self.log_path + ".tmp"
+        with open(self.log_path, "rb") as src, open(tmp_path, "wb") as dst:
+            for row in np.flatnonzero(self.alive[: len(self.ids)]).tolist():
+                src.seek(self.offsets[row])
+                dst.write(src.readline())
+        os.replace(tmp_path, self.log_path)
+        self._reset()
+        self._replay()
+
+    def search(self, query: str, top_k: int, metadata_filter: dict | None = None) -> list[tuple[str, float, int]]:
+        count = len(self.ids)
+        if not count or not self.live_count:
+            return []
+        avg_length = self.total_length / self.live_count
+        scores = np.zeros(count, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            rows = postings.rows[: postings.size]
+            tfs = postings.tfs[: postings.size]
+            df = int(self.alive[rows].sum())
+            if not df:
+                continue
+            matched = True
+            idf = math.log(1 + (self.live_count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / avg_length)
+            np.add.at(scores, rows, idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+        if not matched:
+            return []
+
+        scores[~self.alive[:count]] = 0
+        partition = partition_values(metadata_filter)
+        if partition:
+            field, values = partition
+            allowed = np.zeros(count, dtype=bool)
+            for value in values:
+                allowed[self.partitions[field].get(value, [])] = True
+            scores[~allowed] = 0
+        candidates = np.flatnonzero(scores)
+        if metadata_filter:
+            candidates = np.array(
+                [r for r in candidates if matches_filter(self.filter_meta[r], metadata_filter)],
+                dtype=np.int64,
+            )
+        if not len(candidates):
+            return []
+        k = min(top_k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[r], float(scores[r]), r) for r in best]
+
+    def read_metadata(self, row: int) -> dict:
+        with open(self.log_path, "rb") as f:
+            f.seek(self.offsets[row])
+            return json.loads(f.readline())["metadata"]
+
+
+class LexicalIndex:
+    """
+    Namespace-partitioned BM25 indexes, loaded lazily from disk.
+
+    Each namespace has its own lock, so one namespace's writes, compaction
+    or first load don't hold up queries on the others.
+    """
+
+    def __init__(self, root: str = LEXICAL_INDEX_DIR):
+        self.root = root
+        self._namespaces: dict[str, _NamespaceIndex] = {}
+        self._lock = threading.Lock()  # guards _namespaces only
+
+    def _entry(self, namespace: str) -> _NamespaceIndex:
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                ns = self._namespaces[namespace] = _NamespaceIndex(os.path.join(self.root, namespace))
+            return ns
+
+    @contextmanager
+    def _namespace(self, namespace: str):
+        while True:
+            ns = self._entry(namespace)
+            with ns.lock:
+                if ns.dropped:
+                    continue
+                ns.load()
+                yield ns
+                return
+
+    def add(self, namespace: str, chunks: list[dict]):
+        with self._namespace(namespace) as ns:
+            ns.add(chunks)
+
+    def delete(self, namespace: str, ids: list[str]):
+        with self._namespace(namespace) as ns:
+            ns.delete(ids)
+
+    def update_metadata(self, namespace: str, updates: dict[str, dict]):
+        with self._namespace(namespace) as ns:
+            ns.update_metadata(updates)
+
+    def delete_namespace(self, namespace: str):
+        ns = self._entry(namespace)
+        with ns.lock:
+            shutil.rmtree(ns.path, ignore_errors=True)
+            # Callers waiting for this index start over with a new, empty one
+            ns.dropped = True
+            with self._lock:
+                if self._namespaces.get(namespace) is ns:
+                    del self._namespaces[namespace]
+
+    def search(self, namespace: str, query: str, top_k: int, metadata_filter: dict | None = None) -> list[dict]:
+        with self._namespace(namespace) as ns:
+            hits = ns.search(query, top_k, metadata_filter)
+            return [
+                {"id": vector_id, "score": score, "metadata": ns.read_metadata(row)}
+                for vector_id, score, row in hits
+            ]
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], top_k: int, k: int = RRF_K) -> list[dict]:
+    """Merge ranked match lists by RRF; ``score`` becomes the fused score."""
+    fused: dict[str, float] = {}
+    first_seen: dict[str, dict] = {}
+    for results in result_lists:
+        for rank, match in enumerate(results):
+            fused[match["id"]] = fused.get(match["id"], 0.0) + 1.0 / (k + rank + 1)
+            first_seen.setdefault(match["id"], match)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [{**first_seen[i], "score": fused[i]} for i in ranked]
+
+
+lexical_index = LexicalIndex()
@@ -0,0 +1,558 @@
+# backend/local_vector_store.py
+import asyncio
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from backend.vector_store import VectorStore, matches_filter, partition_values
+
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "vector_data")
+LOCAL_VECTOR_QUANTIZATION = os.getenv("LOCAL_VECTOR_QUANTIZATION", "int8")  # none | float16 | int8
+LOCAL_VECTOR_MAX_SEGMENTS = int(os.getenv("LOCAL_VECTOR_MAX_SEGMENTS", "8"))
+IVF_MIN_ROWS = int(os.getenv("LOCAL_VECTOR_IVF_MIN_ROWS", "20000"))
+IVF_NPROBE = int(os.getenv("LOCAL_VECTOR_IVF_NPROBE", "16"))
+RERANK_FACTOR = int(os.getenv("LOCAL_VECTOR_RERANK_FACTOR", "8"))
+
+# Metadata fields kept only on disk (loaded for results, never for filtering)
+LARGE_FIELDS = ("text",)
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10, sample: int = 50000, seed: int = 0):
+    """Spherical k-means (Lloyd) on a sample; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = np.bincount(assign, minlength=k) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _unit_rows(sums)
+    return centroids
+
+
+class _Segment:
+    """
+    Immutable on-disk batch of vectors.
+
+    Files: ``vectors.npy`` (float32, memory-mapped, used for exact re-scoring),
+    ``codes.npy`` (+ ``scales.npy`` for int8) for the coarse scan, ``meta.jsonl``
+    with ``offsets.npy`` for random access, optional ``centroids.npy`` /
+    ``lists.npy`` for the IVF index (rows are stored grouped by cluster, so each
+    inverted list is a contiguous slice), and ``deleted.log`` with the rows that
+    were deleted or overwritten since the segment was written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+
+        centroids_path = os.path.join(path, "centroids.npy")
+        if os.path.exists(centroids_path):
+            self.centroids = np.load(centroids_path)
+            self.lists = np.load(os.path.join(path, "lists.npy"))  # cluster start offsets
+        else:
+            self.centroids = self.lists = None
+
+        self.ids: list[str] = []
+        self.filter_meta: list[dict] = []
+        with open(os.path.join(path, "meta.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.filter_meta.append(
+                    {k: v for k, v in record["metadata"].items() if k not in LARGE_FIELDS}
+                )
+
+        self._partitions: dict[str, dict] = {}  # field -> value -> rows, built on first use
+        self.readers = 0  # queries holding this segment
+        self.retired = False  # merged away; its files go once the last reader is done
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        deleted_path = os.path.join(path, "deleted.log")
+        if os.path.exists(deleted_path):
+            with open(deleted_path, "r") as f:
+                rows = [int(line) for line in f if line.strip()]
+            self.alive[rows] = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def write(cls, path, ids, vectors, metadata, quantization, build_ivf, block_rows=65536):
+        """
+        Write a segment; ``vectors`` (float32, owned by the caller) is normalised in place.
+
+        Files are written to ``<path>.tmp`` and the directory renamed when
+        complete, so a crash never leaves a half-written segment behind.
+        """
+        final_path, path = path, path + ".tmp"
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        np.divide(vectors, norms, out=vectors)
+        del norms
+
+        order = centroids = lists = None
+        if build_ivf:
+            nlist = int(min(4096, max(16, np.sqrt(len(vectors)))))
+            centroids = _kmeans(vectors, nlist)
+            assign = np.empty(len(vectors), dtype=np.int64)
+            for start in range(0, len(vectors), block_rows):
+                block = vectors[start : start + block_rows]
+                assign[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            ids = [ids[i] for i in order]
+            metadata = [metadata[i] for i in order]
+            lists = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+            del assign
+
+        # Stream rows (in IVF order) into the memory-mapped files block by block
+        rows, dim = vectors.shape
+        code_dtype = {"int8": np.int8, "float16": np.float16}.get(quantization, np.float32)
+        out = np.lib.format.open_memmap(os.path.join(path, "vectors.npy"), "w+", np.float32, (rows, dim))
+        codes = np.lib.format.open_memmap(os.path.join(path, "codes.npy"), "w+", code_dtype, (rows, dim))
+        scales = np.empty(rows, dtype=np.float32) if quantization == "int8" else None
+        for start in range(0, rows, block_rows):
+            stop = min(start + block_rows, rows)
+            block = vectors[order[start:stop]] if order is not None else vectors[start:stop]
+            out[start:stop] = block
+            if scales is not None:
+                block_scales = np.abs(block).max(axis=1) / 127.0
+                block_scales[block_scales == 0] = 1.0
+                scales[start:stop] = block_scales
+                codes[start:stop] = np.round(block / block_scales[:, None])
+            else:
+                codes[start:stop] = block
+        out.flush()
+        codes.flush()
+        del out, codes
+        if scales is not None:
+            np.save(os.path.join(path, "scales.npy"), scales)
+        if centroids is not None:
+            np.save(os.path.join(path, "centroids.npy"), centroids)
+            np.save(os.path.join(path, "lists.npy"), lists)
+
+        offsets = np.empty(len(ids), dtype=np.int64)
+        with open(os.path.join(path, "meta.jsonl"), "wb") as f:
+            for i, (vector_id, meta) in enumerate(zip(ids, metadata)):
+                offsets[i] = f.tell()
+                f.write(json.dumps({"id": vector_id, "metadata": meta}).encode("utf-8") + b"\n")
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        os.rename(path, final_path)
+        return cls(final_path)
+
+    def mark_deleted(self, rows: list[int]):
+        if not rows:
+            return
+        self.alive[rows] = False
+        with open(os.path.join(self.path, "deleted.log"), "a") as f:
+            f.write("".join(f"{row}\n" for row in rows))
+
+    def partition_rows(self, field: str, values: list) -> np.ndarray:
+        """Rows whose ``field`` is one of ``values`` (dead rows included)."""
+        index = self._partitions.get(field)
+        if index is None:
+            grouped: dict = {}
+            for row, meta in enumerate(self.filter_meta):
+                if field in meta:
+                    grouped.setdefault(meta[field], []).append(row)
+            index = {value: np.array(rows, dtype=np.int64) for value, rows in grouped.items()}
+            self._partitions[field] = index
+        parts = [index[value] for value in values if value in index]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def coarse_scores(self, rows, query: np.ndarray) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = codes.astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def candidate_rows(self, query: np.ndarray, nprobe: int):
+        """Rows to scan: all of them, or the nprobe closest IVF lists."""
+        if self.centroids is None:
+            return None
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate(
+            [np.arange(self.lists[c], self.lists[c + 1]) for c in probe]
+        )
+
+    def read_all_metadata(self) -> list[dict]:
+        with open(os.path.join(self.path, "meta.jsonl"), "r", encoding="utf-8") as f:
+            return [json.loads(line)["metadata"] for line in f]
+
+    def read_metadata(self, row: int) -> dict:
+        with open(os.path.join(self.path, "meta.jsonl"), "rb") as f:
+            f.seek(int(self.offsets[row]))
+            return json.loads(f.readline())["metadata"]
+
+
+class _Namespace:
+    """
+    One tenant namespace: a directory of segments plus an id -> location map.
+
+    The manifest lists the live segments. Directories it doesn't list were
+    left by a crash (written but never committed, or merged away but not yet
+    removed) and are cleaned up on load; sequence numbers continue past them.
+    A segment is committed to the manifest before the rows it overwrites are
+    marked deleted, so rows a crash left alive twice are resolved on load in
+    favour of the later segment.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.segments: list[_Segment] = []
+        self.locations: dict[str, tuple[_Segment, int]] = {}
+        self.next_seq = 0
+        self.compacting = False
+
+        manifest_path = os.path.join(path, "manifest.json")
+        names = []
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            self.next_seq = manifest["next_seq"]
+            names = manifest["segments"]
+        if os.path.isdir(path):
+            for entry in os.listdir(path):
+                if not entry.startswith("seg_"):
+                    continue
+                seq = entry[len("seg_") :].removesuffix(".tmp")
+                if seq.isdigit():
+                    self.next_seq = max(self.next_seq, int(seq))
+                if entry not in names:
+                    shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+        displaced = []
+        for name in names:
+            displaced += self._attach(_Segment(os.path.join(path, name)))
+        self.mark_dead(displaced)
+
+    def _attach(self, segment: _Segment) -> list[tuple[_Segment, int]]:
+        """Add a segment; returns the older rows its ids overwrite."""
+        self.segments.append(segment)
+        displaced = []
+        for row, vector_id in enumerate(segment.ids):
+            if segment.alive[row]:
+                if vector_id in self.locations:
+                    displaced.append(self.locations[vector_id])
+                self.locations[vector_id] = (segment, row)
+        return displaced
+
+    def commit(self, segment: _Segment):
+        displaced = self._attach(segment)
+        self.save_manifest()
+        self.mark_dead(displaced)
+
+    def new_segment_path(self) -> str:
+        self.next_seq += 1
+        return os.path.join(self.path, f"seg_{self.next_seq:08d}")
+
+    def save_manifest(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"next_seq": self.next_seq, "segments": [s.name for s in self.segments]}, f)
+        os.replace(tmp, os.path.join(self.path, "manifest.json"))
+
+    def remove_ids(self, ids):
+        self.mark_dead([self.locations.pop(vector_id) for vector_id in ids if vector_id in self.locations])
+
+    def mark_dead(self, locations):
+        by_segment: dict[int, tuple[_Segment, list[int]]] = {}
+        for segment, row in locations:
+            by_segment.setdefault(id(segment), (segment, []))[1].append(row)
+        for segment, rows in by_segment.values():
+            segment.mark_deleted(rows)
+
+    def should_compact(self) -> bool:
+        """Claims the compaction when there are too many segments and none is running."""
+        if len(self.segments) > LOCAL_VECTOR_MAX_SEGMENTS and not self.compacting:
+            self.compacting = True
+            return True
+        return False
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Self-hosted, persistent vector store with Pinecone's upsert/query/delete semantics.
+
+    Each namespace is its own directory of immutable segments (log-structured:
+    every upsert batch is written as a new segment and older rows for the same
+    id are marked deleted). When a namespace has more than
+    ``LOCAL_VECTOR_MAX_SEGMENTS`` segments the smallest are merged, and merged
+    segments with at least ``IVF_MIN_ROWS`` rows get an IVF index. Queries scan
+    quantized codes (the nprobe closest IVF lists for indexed segments, the
+    rows of the selected documents for filters on ``PARTITION_FIELDS``, every
+    row otherwise), then re-score the best ``top_k * RERANK_FACTOR`` candidates
+    exactly against the memory-mapped float32 vectors.
+    """
+
+    def __init__(
+        self,
+        root: str = LOCAL_VECTOR_DIR,
+        quantization: str = LOCAL_VECTOR_QUANTIZATION,
+        nprobe: int = IVF_NPROBE,
+        max_workers: int = 8,
+    ):
+        self.root = root
+        self.quantization = quantization
+        self.nprobe = nprobe
+        self._namespaces: dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="local-vectors")
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            ns = self._namespaces[namespace] = _Namespace(os.path.join(self.root, namespace))
+        return ns
+
+    # ---------------------- WRITES ---------------------- #
+
+    def upsert_sync(self, vectors: list[dict], namespace: str):
+        if not vectors:
+            return
+        # Last write wins for ids repeated within one batch
+        latest = {v["id"]: v for v in vectors}
+        ids = list(latest)
+        values = np.asarray([latest[i]["values"] for i in ids], dtype=np.float32)
+        metadata = [dict(latest[i].get("metadata") or {}) for i in ids]
+
+        with self._lock:
+            ns = self._namespace(namespace)
+            os.makedirs(ns.path, exist_ok=True)
+            segment = _Segment.write(
+                ns.new_segment_path(), ids, values, metadata, self.quantization, build_ivf=False
+            )
+            ns.commit(segment)
+            should_compact = ns.should_compact()
+        if should_compact:
+            self.compact_sync(namespace)
+
+    def compact_sync(self, namespace: str, full: bool = False):
+        """
+        Merge segments, building IVF lists when the result is large enough.
+
+        By default the smallest segments are merged until half of
+        ``LOCAL_VECTOR_MAX_SEGMENTS`` remain (size-tiered, so rows are
+        rewritten O(log n) times); ``full=True`` merges everything.
+        """
+        with self._lock:
+            ns = self._namespace(namespace)
+            ns.compacting = True
+            if full:
+                sources = list(ns.segments)
+            else:
+                keep = LOCAL_VECTOR_MAX_SEGMENTS // 2
+                by_size = sorted(ns.segments, key=lambda s: int(s.alive.sum()))
+                sources = by_size[: max(2, len(by_size) - keep)]
+            snapshot = [(s, np.flatnonzero(s.alive)) for s in sources]
+            merged_path = ns.new_segment_path()
+
+        try:
+            # Heavy lifting happens outside the lock; queries keep using the old segments
+            ids, metadata, vectors, origins = [], [], [], []
+            for segment, rows in snapshot:
+                if not len(rows):
+                    continue
+                segment_meta = segment.read_all_metadata()
+                for row in rows.tolist():
+                    ids.append(segment.ids[row])
+                    metadata.append(segment_meta[row])
+                    origins.append((segment, row))
+                vectors.append(np.asarray(segment.vectors[rows]))
+            merged = None
+            if ids:
+                merged_vectors = np.concatenate(vectors)
+                vectors.clear()
+                merged = _Segment.write(
+                    merged_path,
+                    ids,
+                    merged_vectors,
+                    metadata,
+                    self.quantization,
+                    build_ivf=len(ids) >= IVF_MIN_ROWS,
+                )
+
+            with self._lock:
+                # Rows deleted or overwritten while merging stay dead in the merged segment
+                if merged is not None:
+                    origin_of = dict(zip(ids, origins))
+                    dead = []
+                    for row, vector_id in enumerate(merged.ids):
+                        if ns.locations.get(vector_id) == origin_of[vector_id]:
+                            ns.locations[vector_id] = (merged, row)
+                        else:
+                            dead.append(row)
+                    merged.mark_deleted(dead)
+                ns.segments = [s for s in ns.segments if s not in sources]
+                if merged is not None:
+                    ns.segments.insert(0, merged)
+                ns.save_manifest()
+                # Queries still running on the old segments remove them when done
+                for segment in sources:
+                    segment.retired = True
+                unread = [s for s in sources if not s.readers]
+            for segment in unread:
+                shutil.rmtree(segment.path, ignore_errors=True)
+        finally:
+            ns.compacting = False
+
+    def update_metadata_sync(self, updates: dict[str, dict], namespace: str):
+        with self._lock:
+            ns = self._namespace(namespace)
+            rows = {vector_id: ns.locations[vector_id] for vector_id in updates if vector_id in ns.locations}
+            if not rows:
+                return
+            sources = list({id(segment): segment for segment, _ in rows.values()}.values())
+            self._acquire(sources)
+            path = ns.new_segment_path()
+
+        # Segments are immutable: the updated rows are rewritten as a new one, outside the lock
+        try:
+            values = np.asarray([segment.vectors[row] for segment, row in rows.values()], dtype=np.float32)
+            metadata = [
+                {**segment.read_metadata(row), **updates[vector_id]} for vector_id, (segment, row) in rows.items()
+            ]
+        finally:
+            self._release(sources)
+        segment = _Segment.write(path, list(rows), values, metadata, self.quantization, build_ivf=False)
+
+        with self._lock:
+            # Rows deleted or overwritten meanwhile keep their newer state
+            segment.mark_deleted(
+                [row for row, vector_id in enumerate(segment.ids) if ns.locations.get(vector_id) != rows[vector_id]]
+            )
+            ns.commit(segment)
+            should_compact = ns.should_compact()
+        if should_compact:
+            self.compact_sync(namespace)
+
+    def delete_sync(self, ids: list[str], namespace: str):
+        with self._lock:
+            self._namespace(namespace).remove_ids(ids)
+
+    def delete_namespace_sync(self, namespace: str):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+            shutil.rmtree(os.path.join(self.root, namespace), ignore_errors=True)
+
+    # ---------------------- QUERIES ---------------------- #
+
+    def query_sync(self, vector, top_k, namespace, filter=None, include_values=False):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            if not os.path.exists(os.path.join(self.root, namespace)) and namespace not in self._namespaces:
+                return []
+            segments = list(self._namespace(namespace).segments)
+            self._acquire(segments)
+        try:
+            return self._query_segments(segments, query, top_k, filter, include_values)
+        finally:
+            self._release(segments)
+
+    def _acquire(self, segments):
+        # Called under the lock: compaction keeps these segments' files until released
+        for segment in segments:
+            segment.readers += 1
+
+    def _release(self, segments):
+        with self._lock:
+            for segment in segments:
+                segment.readers -= 1
+            unread = [s for s in segments if s.retired and not s.readers]
+        for segment in unread:
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def _query_segments(self, segments, query, top_k, filter, include_values):
+        # Coarse pass over quantized codes
+        pool = top_k * RERANK_FACTOR
+        candidates = []  # (coarse score, segment, row)
+        partition = partition_values(filter)
+        for segment in segments:
+            if partition:
+                # Scoped to some documents: scan only their rows
+                rows = segment.partition_rows(*partition)
+                if not len(rows):
+                    continue
+            else:
+                # Filtered queries scan every row, so a selective filter can't starve the IVF probe
+                rows = None if filter else segment.candidate_rows(query, self.nprobe)
+            scores = segment.coarse_scores(rows, query)
+            rows = np.arange(len(segment)) if rows is None else rows
+            keep = segment.alive[rows]
+            if filter:
+                keep &= np.fromiter(
+                    (matches_filter(segment.filter_meta[r], filter) for r in rows),
+                    dtype=bool,
+                    count=len(rows),
+                )
+            rows, scores = rows[keep], scores[keep]
+            if len(rows) > pool:
+                best = np.argpartition(-scores, pool - 1)[:pool]
+                rows, scores = rows[best], scores[best]
+            candidates.extend(zip(scores.tolist(), [segment] * len(rows), rows.tolist()))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        candidates = candidates[:pool]
+
+        # Exact re-scoring against the float32 vectors
+        exact = [
+            (float(np.asarray(segment.vectors[row]) @ query), segment, row)
+            for _, segment, row in candidates
+        ]
+        exact.sort(key=lambda c: c[0], reverse=True)
+
+        results = []
+        for score, segment, row in exact[:top_k]:
+            match = {"id": segment.ids[row], "score": score, "metadata": segment.read_metadata(row)}
+            if include_values:
+                match["values"] = np.asarray(segment.vectors[row]).tolist()
+            results.append(match)
+        return results
+
+    # ---------------------- ASYNC INTERFACE ---------------------- #
+
+    async def upsert(self, vectors, namespace):
+        await self._run(self.upsert_sync, vectors, namespace)
+
+    async def query(self, vector, top_k, namespace, filter=None, include_values=False):
+        return await self._run(self.query_sync, vector, top_k, namespace, filter, include_values)
+
+    async def delete(self, ids, namespace):
+        await self._run(self.delete_sync, ids, namespace)
+
+    async def update_metadata(self, updates, namespace):
+        await self._run(self.update_metadata_sync, updates, namespace)
+
+    async def delete_namespace(self, namespace):
+        await self._run(self.delete_namespace_sync, namespace)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
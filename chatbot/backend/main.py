@@ -1,27 +1,128 @@
+import asyncio
+import importlib
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from backend import dashboard
 from backend.routers import guest
 
 from backend import auth  # ✅ Needed for auth.router
-from backend.routers import chat, ingest, files
+from backend.routers import chat, ingest, files, uploads
+from backend.ingest_jobs import ingest_queue
+from backend.guest_sessions import guest_sessions
+from backend.services import services, WARM_UP_ON_STARTUP
+from backend.database import ensure_tables, ping_database, dispose_engine
+from backend.openai_client import get_client, close_client
+from backend.vector_store import get_vector_store, close_vector_store
+from backend.embedding_cache import get_embedding_cache
+from backend.retrieval_cache import retrieval_cache
+from backend.text_extract import shutdown_executor
+from backend.metrics import RequestContextMiddleware, RequestIdFilter, render_metrics
 
-app = FastAPI()
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s",
+)
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
+# One INFO line per outgoing HTTP call is noise at the default level
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
-templates = Jinja2Templates(directory="frontend/templates")
+
+# 🔹 Warm-up hooks: create each client before the first request needs it
+@services.on_warm_up("database")
+async def warm_database():
+    await ping_database()
+
+
+@services.on_warm_up("openai")
+async def warm_openai():
+    # The SDK import is the slow part; keep it off the event loop
+    await asyncio.to_thread(importlib.import_module, "openai")
+    get_client()
+
+
+@services.on_warm_up("vector_store")
+def warm_vector_store():
+    get_vector_store()
+
+
+@services.on_warm_up("embedding_cache")
+def warm_embedding_cache():
+    get_embedding_cache()
+
+
+@services.on_warm_up("templates")
+def warm_templates():
+    for name in ("index.html", "auth.html", "dashboard.html", "guest_chat.html"):
+        services.templates.get_template(name)
+
+
+# Closed in reverse registration order
+services.on_close(dispose_engine)
+services.on_close(shutdown_executor)
+services.on_close(close_client)
+services.on_close(close_vector_store)
+services.on_close(retrieval_cache.close)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Missing tables, columns and indexes are added without holding up
+    # startup; the background loops that scan them start once they exist
+    async def start_background():
+        await ensure_tables()
+        ingest_queue.start()
+        guest_sessions.start()
+
+    background = asyncio.create_task(start_background())
+    if WARM_UP_ON_STARTUP:
+        services.start_warm_up()
+    yield
+    background.cancel()
+    await asyncio.gather(background, return_exceptions=True)
+    await guest_sessions.stop()
+    await ingest_queue.stop()
+    await services.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestContextMiddleware)
+
+# Mount static files
+app.mount("/static", StaticFiles(directory="frontend/static", check_dir=False), name="static")
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(chat.router)
 app.include_router(ingest.router)
+app.include_router(uploads.router)
 app.include_router(files.router)
 app.include_router(dashboard.router)
 app.include_router(guest.router)
 
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return services.templates.TemplateResponse(request, "index.html", {"request": request})
+
+
+# Liveness: the process is up and serving
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+# Readiness: every warm-up hook succeeded (503 until then, so load balancers wait)
+@app.get("/ready")
+async def ready():
+    state = services.readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+# Prometheus scrape endpoint: per-stage latency histograms
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,251 @@
+# backend/markdown_stream.py
+import re
+
+HEADING_RE = re.compile(r"\s*(#{1,6})\s+")
+BULLET_RE = re.compile(r"\s*[-*•]\s+")
+ORDERED_RE = re.compile(r"\s*\d{1,3}[.)]\s+")
+# Line starts that might still turn into one of the prefixes above
+PARTIAL_PREFIX_RE = re.compile(r"\s*(#{1,6}|[-*•]|\d{1,3}[.)]?|`{1,2})?")
+FENCE = "```"
+URL_RE = re.compile(r"https?://[^\s<>\"'(){}\[\]]+")
+URL_SCHEMES = ("http://", "https://")
+
+ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}
+
+
+def escape_html(text: str) -> str:
+    return "".join(ESCAPES.get(c, c) for c in text)
+
+
+class StreamingMarkdownRenderer:
+    """
+    Markdown-to-HTML renderer fed one model delta at a time.
+
+    ``feed()`` returns the HTML for whatever became unambiguous; ``finish()``
+    returns the rest. Fragments are only ever appended, never revised, and
+    the concatenated output is the same however the text was split into
+    deltas, so a streamed answer renders exactly like the same answer
+    rendered in one go.
+
+    Supported: paragraphs (single newlines become ``<br>``), ``#`` headings,
+    ``-``/``*`` and numbered lists, fenced code blocks, ``**bold**``,
+    ``*italic*``, ``inline code`` and bare http(s) links. Everything else is
+    escaped text.
+    """
+
+    def __init__(self):
+        self._line = ""  # unprocessed text of the current line
+        self._kind = None  # block kind of the current line once known
+        self._list = None  # "ul" / "ol" while a list is open
+        self._paragraph = False
+        self._code_block = False
+        self._tags: list[str] = []  # open inline tags, innermost last
+        self._reopen: list[str] = []  # open tags not yet re-emitted after an outer one closed
+        self._prev = " "  # last consumed character of the current line
+
+    def feed(self, delta: str) -> str:
+        out = []
+        *complete, partial = delta.split("\n")
+        for line in complete:
+            self._line += line
+            out.append(self._process(final=True))
+        self._line += partial
+        if self._line:
+            out.append(self._process(final=False))
+        return "".join(out)
+
+    def finish(self) -> str:
+        out = []
+        if self._line or self._kind:
+            out.append(self._process(final=True))
+        out.append(self._close_blocks())
+        if self._code_block:
+            out.append("</code></pre>")
+            self._code_block = False
+        return "".join(out)
+
+    def render(self, text: str) -> str:
+        return self.feed(text) + self.finish()
+
+    # ---------------------------------------------------------------- blocks
+
+    def _process(self, final: bool) -> str:
+        """Consume the current line; ``final`` means its newline has arrived."""
+        if self._code_block:
+            return self._code_line(final)
+
+        out = []
+        if self._kind is None:
+            kind = self._classify(final)
+            if kind is None:
+                return ""
+            out.append(self._open_line(kind))
+        out.append(self._inline(final))
+        if final:
+            out.append(self._close_line())
+        return "".join(out)
+
+    def _classify(self, final: bool):
+        line = self._line
+        if line.lstrip().startswith(FENCE):
+            return "fence" if final else None
+        if not line.strip():
+            return "blank" if final else None
+        for kind, pattern in (("heading", HEADING_RE), ("ul", BULLET_RE), ("ol", ORDERED_RE)):
+            match = pattern.match(line)
+            if match:
+                # Spaces after the marker belong to it; wait for the first real character
+                if not final and not line[match.end() :].strip():
+                    return None
+                self._line = line[match.end() :]
+                return kind
+        if not final and PARTIAL_PREFIX_RE.fullmatch(line):
+            return None
+        self._line = line.lstrip()
+        return "text"
+
+    def _open_line(self, kind: str) -> str:
+        self._kind = kind
+        out = []
+        if kind != "text" and self._paragraph:
+            out.append("</p>")
+            self._paragraph = False
+        if kind in ("ul", "ol"):
+            if self._list != kind:
+                out.append(self._close_list())
+                out.append(f"<{kind}>")
+                self._list = kind
+            out.append("<li>")
+        elif kind != "blank":
+            # Blank lines keep a list open so loosely spaced items stay together
+            out.append(self._close_list())
+        if kind == "heading":
+            out.append('<div class="heading">')
+        elif kind == "text":
+            out.append("<br>" if self._paragraph else "<p>")
+            self._paragraph = True
+        elif kind == "fence":
+            self._line = ""
+            self._code_block = True
+            out.append("<pre><code>")
+        return "".join(out)
+
+    def _close_line(self) -> str:
+        out = [self._close_inline()]
+        if self._kind in ("ul", "ol"):
+            out.append("</li>")
+        elif self._kind == "heading":
+            out.append("</div>")
+        self._kind = None
+        self._line = ""
+        self._prev = " "
+        return "".join(out)
+
+    def _close_list(self) -> str:
+        if self._list:
+            tag, self._list = self._list, None
+            return f"</{tag}>"
+        return ""
+
+    def _close_blocks(self) -> str:
+        out = []
+        if self._paragraph:
+            out.append("</p>")
+            self._paragraph = False
+        out.append(self._close_list())
+        return "".join(out)
+
+    def _code_line(self, final: bool) -> str:
+        line, started = self._line, self._kind == "code"
+        self._kind = None if final else "code"
+        if not started and line.strip() == FENCE and final:
+            self._code_block = False
+            self._line = ""
+            return "</code></pre>"
+        # A line that may still become the closing fence waits for its newline
+        if not started and not final and FENCE.startswith(line.strip()):
+            self._kind = None
+            return ""
+        self._line = ""
+        return escape_html(line) + ("\n" if final else "")
+
+    # ---------------------------------------------------------------- inline
+
+    def _inline(self, final: bool) -> str:
+        text = self._line
+        out = []
+        i = 0
+        while i < len(text):
+            c = text[i]
+            if c == "`":
+                out.append(self._toggle("code"))
+                i += 1
+            elif "code" in self._tags:
+                out.append(self._text(ESCAPES.get(c, c)))
+                i += 1
+            elif c == "*":
+                run = 2 if text.startswith("**", i) else 1
+                # A marker at the end of a delta may still grow into "**" or need its neighbour
+                if not final and i + run >= len(text):
+                    break
+                after = text[i + run] if i + run < len(text) else " "
+                before = text[i - 1] if i else self._prev
+                tag = "strong" if run == 2 else "em"
+                if (tag in self._tags and not before.isspace()) or (tag not in self._tags and not after.isspace()):
+                    out.append(self._toggle(tag))
+                else:
+                    out.append(self._text("*" * run))
+                i += run
+            elif c == "h" and not (text[i - 1] if i else self._prev).isalnum():
+                match = URL_RE.match(text, i)
+                rest = text[i:]
+                if match and (match.end() < len(text) or final):
+                    url = escape_html(match.group())
+                    out.append(self._text(f'<a href="{url}" target="_blank" rel="noopener">{url}</a>'))
+                    i = match.end()
+                elif not final and (match or any(s.startswith(rest) for s in URL_SCHEMES)):
+                    break
+                else:
+                    out.append(self._text(c))
+                    i += 1
+            else:
+                out.append(self._text(ESCAPES.get(c, c)))
+                i += 1
+        if i:
+            self._prev = text[i - 1]
+        self._line = text[i:]
+        return "".join(out)
+
+    def _text(self, html: str) -> str:
+        """``html`` preceded by the tags waiting to be reopened."""
+        if not self._reopen:
+            return html
+        opened = "".join(f"<{t}>" for t in self._reopen)
+        self._reopen = []
+        return opened + html
+
+    def _toggle(self, tag: str) -> str:
+        if tag not in self._tags:
+            opened = self._text(f"<{tag}>")
+            self._tags.append(tag)
+            return opened
+        i = self._tags.index(tag)
+        del self._tags[i]
+        if tag in self._reopen:
+            # Closed before anything was written inside it again
+            self._reopen.remove(tag)
+            return ""
+        # Tags opened inside it are closed first and reopened once text follows,
+        # so the HTML stays nested
+        inner = [t for t in self._tags[i:] if t not in self._reopen]
+        self._reopen = self._tags[i:]
+        return "".join(f"</{t}>" for t in reversed(inner)) + f"</{tag}>"
+
+    def _close_inline(self) -> str:
+        out = "".join(f"</{t}>" for t in reversed(self._tags) if t not in self._reopen)
+        self._tags, self._reopen = [], []
+        return out
+
+
+def render_markdown(text: str) -> str:
+    return StreamingMarkdownRenderer().render(text)
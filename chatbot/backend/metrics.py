@@ -0,0 +1,233 @@
+# backend/metrics.py
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# When on, a request sent with "X-Debug-Timing: 1" gets its stage timings back
+DEBUG_TIMING_HEADERS = os.getenv("DEBUG_TIMING_HEADERS", "false").lower() == "true"
+
+# Histogram upper bounds in seconds, from cache hits to whole-document ingestion
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_ID_RE = re.compile(r"[\w.:-]{1,64}")
+
+logger = logging.getLogger(__name__)
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+# (stage, seconds) of the current request, collected only when debug timing is on
+_request_timings: ContextVar[list | None] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """
+    Prometheus histogram with labels, exported in the text exposition format.
+
+    ``observe`` is a bisect and two additions under a lock, so it is cheap
+    enough for per-request use; buckets are cumulated only when scraped.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, buckets=STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(float(b) for b in buckets)
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            label_text = ",".join(f'{k}="{v}"' for k, v in zip(self.labelnames, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic Prometheus counter without labels."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def collect(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}",
+        ]
+
+
+class Gauge(Counter):
+    """Prometheus gauge without labels; ``set`` replaces the value."""
+
+    def set(self, value: float):
+        self.value = value
+
+    def collect(self) -> list[str]:
+        lines = super().collect()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+_registry: list = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in _registry for line in metric.collect()) + "\n"
+
+
+stage_seconds = register(
+    Histogram(
+        "chatmate_stage_seconds",
+        "Time spent in each stage of the ingestion and answer pipelines.",
+        ("stage", "namespace"),
+    )
+)
+
+
+def namespace_label(namespace: str | None) -> str:
+    """``user`` / ``session`` rather than the namespace itself, to keep label cardinality bounded."""
+    if not namespace:
+        return "none"
+    kind = namespace.split("_", 1)[0]
+    return kind if kind in ("user", "session") else "other"
+
+
+def current_request_id() -> str | None:
+    return _request_id.get()
+
+
+def request_timings() -> list | None:
+    return _request_timings.get()
+
+
+# 🔹 Timing spans: one histogram observation per stage, plus a debug log line
+# carrying the request id and namespace when DEBUG logging is on.
+def observe(stage: str, seconds: float, namespace: str | None = None):
+    if not METRICS_ENABLED:
+        return
+    stage_seconds.observe(seconds, stage, namespace_label(namespace))
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("stage=%s seconds=%.6f namespace=%s", stage, seconds, namespace)
+
+
+@contextmanager
+def span(stage: str, namespace: str | None = None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, namespace)
+
+
+class Stopwatch:
+    """Accumulates the time spent producing the items of an iterator."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def iterate(self, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.seconds += time.perf_counter() - start
+                return
+            self.seconds += time.perf_counter() - start
+            yield item
+
+
+def server_timing(timings: list) -> str:
+    """``Server-Timing`` header value, one entry per stage (repeats summed)."""
+    totals: dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds ``request_id`` to log records ("-" outside of requests)."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or "-"
+        return True
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware giving every HTTP request an id (``X-Request-ID``, taken
+    from the client when it sent a sane one) that spans and log lines pick
+    up. With DEBUG_TIMING_HEADERS on, requests carrying ``X-Debug-Timing``
+    also get a ``Server-Timing`` header with the stages finished before the
+    response started; streamed answers report theirs in a final SSE event.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or ())
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        if not REQUEST_ID_RE.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        timings = [] if DEBUG_TIMING_HEADERS and b"x-debug-timing" in headers else None
+        id_token = _request_id.set(request_id)
+        timings_token = _request_timings.set(timings)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                extra = [(b"x-request-id", request_id.encode())]
+                if timings:
+                    extra.append((b"server-timing", server_timing(timings).encode()))
+                message = {**message, "headers": list(message.get("headers") or ()) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _request_id.reset(id_token)
+            _request_timings.reset(timings_token)
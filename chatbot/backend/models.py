@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from backend.database import Base 
 
@@ -19,6 +20,70 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(255), nullable=False)
     file_path = Column(String(255), nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of the upload
+    size_bytes = Column(BigInteger, nullable=True)  # counted against the owner's quota
+    version = Column(Integer, nullable=True)  # bumped by each replacement; None means 1
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="documents")
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
+
+    # /files lists by owner; uploads check (owner, hash) for duplicates
+    __table_args__ = (Index("ix_documents_owner_id_content_hash", "owner_id", "content_hash"),)
+
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    vector_id = Column(String(96), nullable=False)
+    chunk_hash = Column(String(64), nullable=True)  # sha256 of the chunk text, diffed on replacement
+
+    document = relationship("Document", back_populates="chunks")
+
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String(36), primary_key=True)
+    owner_key = Column(String(64), nullable=False)  # user_{id} / session_{id}
+    namespace = Column(String(64), nullable=False)
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(255), nullable=False)
+    content_hash = Column(String(64), nullable=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String(16), nullable=False, default="queued", index=True)
+    stage = Column(String(32), nullable=True)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    chunks_total = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    claimed_by = Column(String(64), nullable=True)  # worker process running the job
+    lease_expires_at = Column(DateTime, nullable=True)  # renewed while it runs
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # /ingest-jobs lists an owner's most recent jobs
+    __table_args__ = (Index("ix_ingest_jobs_owner_key_created_at", "owner_key", "created_at"),)
+
+
+class GuestSession(Base):
+    __tablename__ = "guest_sessions"
+
+    id = Column(String(36), primary_key=True)  # the guest_session cookie
+    bytes_used = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    retired_at = Column(DateTime, nullable=True, index=True)  # logged out or replaced, awaiting reaping
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)  # declared up front, reserved against the quota
+    received = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
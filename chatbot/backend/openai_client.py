@@ -0,0 +1,56 @@
+# backend/openai_client.py
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection / retry tuning
+OPENAI_TIMEOUT = float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("AZURE_OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-05-01-preview")
+
+embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+chat_model = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+
+_client = None
+
+
+def get_client():
+    """
+    The shared ``AsyncAzureOpenAI`` client, created on first use.
+
+    The ``openai`` and ``httpx`` packages are imported here rather than at
+    module load, so importing the app neither pays for them nor needs
+    credentials. One pooled HTTP connection serves every embedding and chat
+    call, and the SDK retries 429/5xx/connection errors with backoff.
+    """
+    global _client
+    if _client is None:
+        import httpx
+        from openai import AsyncAzureOpenAI
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_CONNECTIONS // 2,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        )
+        _client = AsyncAzureOpenAI(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_version=OPENAI_API_VERSION,
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+    return _client
+
+
+async def close_client():
+    """Close the pooled connections; the next get_client() starts a new pool."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -1,57 +1,197 @@
+import asyncio
+import hashlib
 import os
-import uuid
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pinecone import Pinecone, ServerlessSpec
-from backend.embedding_utils import embed_text
+from backend.embedding_utils import embed_text_cached
+from backend.embedding_cache import chunk_hash
+from backend.artifacts import stored_pages
+from backend.chunker import chunk_pages, count_tokens
+from backend.retrieval_cache import retrieval_cache
+from backend.vector_store import get_vector_store
+from backend.lexical_index import lexical_index
+from backend.metrics import Stopwatch, observe, span
 
-# Setup Pinecone client
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.getenv("PINECONE_INDEX"))
+# Ingestion tuning
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "8000"))
+EMBED_BATCH_MAX_INPUTS = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "256"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+DELETE_BATCH_SIZE = 1000  # Pinecone's limit on ids per delete call
 
 
-# Split text into chunks
-def read_and_split_text(file_path, chunk_size=1000, chunk_overlap=100):
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        text = f.read()
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, chunk_overlap=chunk_overlap
-    )
-    return splitter.split_text(text)
+# sha256 of a file, read in blocks
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
 
 
-# Store embeddings in Pinecone
-async def embed_and_store(file_path: str, namespace: str):
-    chunks = read_and_split_text(file_path)
-    embeddings = await embed_text(chunks)
+# Deterministic vector id: re-ingesting the same document overwrites in place.
+# A user's Documents share one namespace, so their ids carry the document id:
+# two Documents never write (or delete) the same vector, even with equal text.
+def chunk_vector_id(doc_hash: str, offset: int, document_id: int | None = None) -> str:
+    if document_id is None:
+        return f"{doc_hash[:32]}-{offset}"
+    return f"{document_id}-{doc_hash[:32]}-{offset}"
+
+
+# Group (page, offset, chunk) triples into embedding requests under the token budget
+def batch_by_tokens(
+    chunks,
+    max_tokens: int = EMBED_BATCH_TOKENS,
+    max_inputs: int = EMBED_BATCH_MAX_INPUTS,
+):
+    batch, batch_tokens = [], 0
+    for item in chunks:
+        tokens = count_tokens(item[-1])
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
 
-    pinecone_vectors = [
-        {"id": str(uuid.uuid4()), "values": emb, "metadata": {"text": chunk}}
-        for chunk, emb in zip(chunks, embeddings)
+# (vector id, chunk hash, page, offset) of every chunk, in order, without embedding
+# anything. Extraction comes from the artifact store, so this is cheap after the first pass.
+def document_chunks(
+    file_path: str, doc_hash: str, document_id: int | None = None
+) -> list[tuple[str, str, int, int]]:
+    return [
+        (chunk_vector_id(doc_hash, offset, document_id), chunk_hash(chunk), page, offset)
+        for page, offset, chunk in chunk_pages(stored_pages(file_path, doc_hash))
     ]
-    index.upsert(vectors=pinecone_vectors, namespace=namespace)
 
 
-# Delete vectors from a specific file within a namespace
-def delete_namespace_file(file_path: str, namespace: str):
-    chunks = read_and_split_text(file_path)
+# Store embeddings in Pinecone
+async def embed_and_store(
+    file_path: str,
+    namespace: str,
+    doc_hash: str | None = None,
+    filename: str | None = None,
+    document_id: int | None = None,
+    on_progress=None,
+    on_upserted=None,
+    version: int | None = None,
+    only_ids: set[str] | None = None,
+):
+    """
+    Extract, chunk, embed and upsert ``file_path`` into ``namespace``.
+
+    Every vector carries the chunk text plus ``file``, ``doc_hash``, ``page``,
+    ``offset`` and (for stored Documents) ``doc_id`` and ``version`` metadata,
+    so queries can be filtered to one document server-side.
+
+    Vector ids derive from ``document_id``, ``doc_hash`` (the file's sha256)
+    and each chunk's offset, so upserts are idempotent. Extracted text comes from the
+    artifact store and embeddings from the local cache whenever the same
+    content was processed before.
+    ``on_progress(done, seen)`` is awaited after each batch is upserted, with
+    ``seen`` the number of chunks produced so far, and ``on_upserted(vectors)``
+    is awaited with each upserted batch. With ``only_ids``, every other chunk
+    is skipped (already stored by an earlier version of the document).
+    """
+    if doc_hash is None:
+        doc_hash = await asyncio.to_thread(file_hash, file_path)
+    base_metadata = {"file": filename or os.path.basename(file_path), "doc_hash": doc_hash}
+    if document_id is not None:
+        base_metadata["doc_id"] = document_id
+    if version is not None:
+        base_metadata["version"] = version
+
+    # Extraction and chunking run off the event loop, one batch at a time
+    # Stopwatches split the time spent producing batches into extraction and chunking
+    extraction, production = Stopwatch(), Stopwatch()
+    chunks = chunk_pages(extraction.iterate(stored_pages(file_path, doc_hash)))
+    if only_ids is not None:
+        chunks = (c for c in chunks if chunk_vector_id(doc_hash, c[1], document_id) in only_ids)
+    batches = production.iterate(batch_by_tokens(chunks))
+    store = get_vector_store()
+    semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+    tasks = set()
+    done = seen = 0
+
+    # Each batch is embedded and upserted under the concurrency limit, so only
+    # in-flight batches are held in memory and upserts can't pile up behind embeddings.
+    async def embed_batch(batch):
+        try:
+            await store_batch(batch)
+        finally:
+            semaphore.release()
+
+    async def store_batch(batch):
+        nonlocal done
+        with span("embedding_batch", namespace):
+            embeddings = await embed_text_cached([chunk for _, _, chunk in batch])
+
+        pinecone_vectors = [
+            {
+                "id": chunk_vector_id(doc_hash, offset, document_id),
+                "values": emb,
+                "metadata": {**base_metadata, "page": page, "offset": offset, "text": chunk},
+            }
+            for (page, offset, chunk), emb in zip(batch, embeddings)
+        ]
+        with span("upsert", namespace):
+            for start in range(0, len(pinecone_vectors), UPSERT_BATCH_SIZE):
+                await store.upsert(
+                    pinecone_vectors[start : start + UPSERT_BATCH_SIZE], namespace
+                )
+        await asyncio.to_thread(lexical_index.add, namespace, pinecone_vectors)
+        await retrieval_cache.invalidate_namespace(namespace)
+        if on_upserted:
+            await on_upserted(pinecone_vectors)
+
+        done += len(batch)
+        if on_progress:
+            await on_progress(done, seen)
+
+    try:
+        while batch := await asyncio.to_thread(next, batches, None):
+            seen += len(batch)
+            await semaphore.acquire()
+            tasks.add(asyncio.create_task(embed_batch(batch)))
+            # Surface failures early instead of after the whole document
+            for finished in [t for t in tasks if t.done()]:
+                tasks.discard(finished)
+                finished.result()
+        while tasks:
+            finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in finished:
+                tasks.discard(task)
+                task.result()
+        observe("extraction", extraction.seconds, namespace)
+        observe("chunking", production.seconds - extraction.seconds, namespace)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
 
-    # Query top_k with dummy vector to retrieve potential matches
-    dummy_vector = [0.0] * 1536  # Ensure this matches your embedding dimension
-    response = index.query(
-        namespace=namespace, top_k=100, include_metadata=True, vector=dummy_vector
-    )
+# Delete vectors by id, in as few calls as Pinecone allows
+async def delete_vectors(ids: list[str], namespace: str):
+    store = get_vector_store()
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        await store.delete(ids[start : start + DELETE_BATCH_SIZE], namespace)
+    await asyncio.to_thread(lexical_index.delete, namespace, ids)
+    await retrieval_cache.invalidate_namespace(namespace)
 
-    ids_to_delete = []
-    for match in response.get("matches", []):
-        if match["metadata"].get("text") in chunks:
-            ids_to_delete.append(match["id"])
 
-    if ids_to_delete:
-        index.delete(ids=ids_to_delete, namespace=namespace)
+# Set metadata fields of stored vectors, e.g. chunks a new document version kept
+async def update_metadata(updates: dict[str, dict], namespace: str):
+    if not updates:
+        return
+    await get_vector_store().update_metadata(updates, namespace)
+    await asyncio.to_thread(lexical_index.update_metadata, namespace, updates)
+    await retrieval_cache.invalidate_namespace(namespace)
 
 
-def delete_namespace(namespace: str):
+async def delete_namespace(namespace: str):
     """
     Delete all vectors in a namespace (e.g. for guest session or full user reset).
     """
-    index.delete(delete_all=True, namespace=namespace)
+    await get_vector_store().delete_namespace(namespace)
+    await asyncio.to_thread(lexical_index.delete_namespace, namespace)
+    await retrieval_cache.invalidate_namespace(namespace)
@@ -0,0 +1,175 @@
+# backend/retrieval_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+CACHE_BACKEND = os.getenv("RETRIEVAL_CACHE_BACKEND", "memory")  # memory | redis
+CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+RETRIEVAL_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry TTL.
+
+    Its methods are coroutines, like RedisCache's, so the two are
+    interchangeable; nothing in them waits.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+        self._counters: dict[str, int] = {}  # never evicted
+        self._lock = threading.Lock()
+
+    async def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value, ttl: int | None = None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    async def counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    async def close(self):
+        pass
+
+
+class RedisCache:
+    """Shared cache across workers, on the asyncio Redis client; values are stored as JSON."""
+
+    def __init__(self, url: str = REDIS_URL):
+        try:
+            import redis.asyncio as redis  # optional dependency, only needed for the shared backend
+        except ImportError as e:
+            raise RuntimeError(
+                "RETRIEVAL_CACHE_BACKEND=redis needs the redis package: pip install 'redis>=4.2'"
+            ) from e
+
+        self._redis = redis.Redis.from_url(url)
+
+    async def get(self, key: str):
+        raw = await self._redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value, ttl: int | None = None):
+        await self._redis.set(key, json.dumps(value), ex=ttl)
+
+    async def counter(self, key: str) -> int:
+        return int(await self._redis.get(key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(key)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = {"embedding": 0, "retrieval": 0}
+        self.misses = {"embedding": 0, "retrieval": 0}
+
+    def record(self, level: str, hit: bool):
+        (self.hits if hit else self.misses)[level] += 1
+
+    def snapshot(self) -> dict:
+        stats = {}
+        for level in self.hits:
+            total = self.hits[level] + self.misses[level]
+            stats[level] = {
+                "hits": self.hits[level],
+                "misses": self.misses[level],
+                "hit_rate": self.hits[level] / total if total else 0.0,
+            }
+        return stats
+
+
+def normalize_query(query: str) -> str:
+    """Collapse case, whitespace and trailing punctuation so trivial re-wordings share a key."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def vector_digest(vector: list[float]) -> str:
+    # Round-trip through float32 so equal embeddings hash equally
+    return hashlib.sha256(array("f", vector).tobytes()).hexdigest()
+
+
+class RetrievalCache:
+    """
+    Two-level cache in front of the RAG retrieval path.
+
+    Level 1 maps normalised query text to its embedding. Level 2 maps
+    (namespace, namespace version, query vector, filter, top_k) to the
+    retrieved matches. Every write to a namespace bumps its version, which
+    makes all level-2 entries for it unreachable; they then age out of the LRU.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or (RedisCache() if CACHE_BACKEND == "redis" else MemoryCache())
+        self.stats = CacheStats()
+
+    async def namespace_version(self, namespace: str) -> int:
+        return await self.backend.counter(f"nsver:{namespace}")
+
+    async def invalidate_namespace(self, namespace: str):
+        await self.backend.incr(f"nsver:{namespace}")
+
+    async def get_embedding(self, model: str, query: str):
+        vector = await self.backend.get(f"qemb:{_digest(model, normalize_query(query))}")
+        self.stats.record("embedding", vector is not None)
+        return vector
+
+    async def set_embedding(self, model: str, query: str, vector: list[float]):
+        await self.backend.set(f"qemb:{_digest(model, normalize_query(query))}", vector, EMBEDDING_TTL)
+
+    async def matches_key(self, namespace, vector, metadata_filter, top_k) -> str:
+        # Taken before querying, so results of a query that races with a
+        # namespace write are stored under the old (already stale) version
+        version = await self.namespace_version(namespace)
+        return "qres:" + _digest(namespace, version, vector_digest(vector), metadata_filter, top_k)
+
+    async def get_matches(self, key: str):
+        matches = await self.backend.get(key)
+        self.stats.record("retrieval", matches is not None)
+        return matches
+
+    async def set_matches(self, key: str, matches: list[dict]):
+        await self.backend.set(key, matches, RETRIEVAL_TTL)
+
+    async def close(self):
+        await self.backend.close()
+
+
+retrieval_cache = RetrievalCache()
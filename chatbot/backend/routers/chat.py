@@ -1,7 +1,13 @@
+import json
 from fastapi import APIRouter, Request, Form
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from backend.auth import get_current_user
-from backend.azure_openai_utils import stream_chat_with_documents
+from backend.azure_openai_utils import open_answer_stream, render_html
+from backend.admission import Overloaded
+from backend.retrieval_cache import retrieval_cache
+from backend.answer_cache import answer_cache
+from backend.sse import sse_response
+from backend.batch_qa import answer_batch, BATCH_MAX_QUESTIONS
 
 router = APIRouter()
 
@@ -10,7 +16,8 @@ router = APIRouter()
 async def chat_stream(
     request: Request,
     query: str = Form(...),
-    selected_file: str = Form(None)
+    selected_file: str = Form(None),
+    doc_ids: list[int] = Form(None),
 ):
     user_id = get_current_user(request)
     session_id = request.cookies.get("session_id")
@@ -26,13 +33,71 @@ async def chat_stream(
             content={"error": "Missing session or user authentication."}
         )
 
+    # Shares an identical answer in flight, or waits its turn for the model quota
     try:
-        # Streaming response from RAG (OpenAI + Pinecone)
-        async def generator():
-            async for chunk in stream_chat_with_documents(query, namespace, selected_file):
-                yield chunk
+        answer = await open_answer_stream(
+            query, namespace, selected_file, "user" if user_id else "guest", doc_ids
+        )
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    # Streaming response from RAG, rendered to HTML and sent as Server-Sent Events
+    return sse_response(request, render_html(answer.follow()))
+
+
+# 🔹 Many questions at once, answered as NDJSON lines in completion order
+@router.post("/chat/batch")
+async def chat_batch(request: Request):
+    user_id = get_current_user(request)
+    session_id = request.cookies.get("session_id")
+
+    if user_id:
+        namespace = f"user_{user_id}"
+    elif session_id:
+        namespace = f"session_{session_id}"
+    else:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Missing session or user authentication."}
+        )
+
+    try:
+        body = await request.json()
+        questions = body["questions"]
+        selected_file = body.get("selected_file")
+        doc_ids = body.get("doc_ids")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JSONResponse(
+            status_code=400,
+            content={"error": 'Expected a JSON body like {"questions": ["..."]}.'}
+        )
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        return JSONResponse(status_code=400, content={"error": "questions must be a list of strings."})
+    if doc_ids is not None and (
+        not isinstance(doc_ids, list) or not all(type(d) is int for d in doc_ids)
+    ):
+        return JSONResponse(status_code=400, content={"error": "doc_ids must be a list of document ids."})
+    if not questions or len(questions) > BATCH_MAX_QUESTIONS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"Send between 1 and {BATCH_MAX_QUESTIONS} questions."}
+        )
+
+    async def lines():
+        async for result in answer_batch(questions, namespace, selected_file, doc_ids=doc_ids):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Too many questions right now. Please try again shortly.", "retry_after": int(e.retry_after_header)},
+        headers={"Retry-After": e.retry_after_header},
+    )
 
-        return StreamingResponse(generator(), media_type="text/plain")
 
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+@router.get("/cache-stats")
+async def cache_stats():
+    return {**retrieval_cache.stats.snapshot(), "answer": answer_cache.stats()}
@@ -1,34 +1,51 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from backend.database import SessionLocal
-from backend.models import Document
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_db
+from backend.models import Document, DocumentChunk
 from backend.auth import get_current_user
-from backend.pinecone_utils import delete_namespace_file
+from backend.pinecone_utils import delete_vectors
+from backend.routers.ingest import document_busy
+from backend.services import services
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/files")
-def list_files(request: Request, db: Session = Depends(get_db)):
+async def list_files(request: Request, db: AsyncSession = Depends(get_db)):
     user_id = get_current_user(request)
     if not user_id:
         return {"files": []}
-    docs = db.query(Document).filter_by(owner_id=user_id).all()
-    return {"files": [{"id": d.id, "name": d.filename} for d in docs]}
+    rows = await db.execute(
+        select(Document.id, Document.filename, Document.version).where(Document.owner_id == user_id)
+    )
+    return {
+        "files": [
+            {"id": doc_id, "name": filename, "version": version or 1}
+            for doc_id, filename, version in rows
+        ]
+    }
 
 @router.get("/delete-file/{doc_id}")
-def delete_file(doc_id: int, request: Request, db: Session = Depends(get_db)):
+async def delete_file(doc_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     user_id = get_current_user(request)
-    doc = db.query(Document).filter_by(id=doc_id, owner_id=user_id).first()
+    doc = await db.scalar(
+        select(Document).where(Document.id == doc_id, Document.owner_id == user_id)
+    )
+    # A running job would go on writing vectors for the document after it is gone
+    if doc and await document_busy(db, doc.id):
+        return services.templates.TemplateResponse(
+            request, "dashboard.html",
+            {"request": request, "user_id": user_id, "error": "This document is still being processed."},
+            status_code=409,
+        )
     if doc:
-        delete_namespace_file(doc.file_path, f"user_{user_id}")
-        db.delete(doc)
-        db.commit()
+        vector_ids = (
+            await db.scalars(
+                select(DocumentChunk.vector_id).where(DocumentChunk.document_id == doc.id)
+            )
+        ).all()
+        await delete_vectors(vector_ids, f"user_{user_id}")
+        await db.delete(doc)
+        await db.commit()
     return RedirectResponse(url="/dashboard", status_code=302)
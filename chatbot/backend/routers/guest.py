@@ -1,30 +1,40 @@
-from fastapi import APIRouter, Request, UploadFile, File
-from fastapi.responses import RedirectResponse, HTMLResponse, StreamingResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse
 from uuid import uuid4
-from fastapi.templating import Jinja2Templates
 from backend.routers.ingest import process_file
-from backend.pinecone_utils import index
-from backend.azure_openai_utils import stream_chat_with_documents
-import os
+from backend.guest_sessions import guest_sessions, GUEST_MAX_BYTES
+from backend.uploads import UploadError, megabytes, receive_form_file
+from backend.azure_openai_utils import open_answer_stream, render_html
+from backend.admission import Overloaded
+from backend.routers.chat import overloaded_response
+from backend.sse import sse_response
+from backend.services import services
 
 router = APIRouter()
-templates = Jinja2Templates(directory="frontend/templates")
 
 
 @router.post("/upload-guest")
-async def upload_guest(request: Request, file: UploadFile = File(...)):
-    session_id = request.cookies.get("guest_session")
-    if not session_id:
-        session_id = str(uuid4())
-
-    # 🧹 Clean up any previous guest session data
-    await delete_guest_data(session_id)
-
-    # 📥 Ingest new document (stored in Pinecone with guest namespace)
-    await process_file(file, session_id=session_id)
+async def upload_guest(request: Request):
+    message = f"Guest uploads are limited to {megabytes(GUEST_MAX_BYTES)}. Log in for larger documents."
+    try:
+        filename, file_path, content_hash, size = await receive_form_file(request, GUEST_MAX_BYTES, message)
+    except UploadError as e:
+        return services.templates.TemplateResponse(
+            request, "index.html", {"request": request, "error": str(e)}, status_code=e.status_code
+        )
+
+    # 🧹 A new upload starts a new session; the old one's data is reaped in the background
+    old_session_id = request.cookies.get("guest_session")
+    if old_session_id:
+        await guest_sessions.retire(old_session_id)
+    session_id = str(uuid4())
+    await guest_sessions.create(session_id, bytes_used=size)
+
+    # 📥 Queue new document for ingestion (stored in Pinecone with guest namespace)
+    job_id = await process_file(filename, file_path, content_hash, size, session_id=session_id)
 
     # 🍪 Set session cookie and redirect to chat
-    response = RedirectResponse(url="/guest-chat", status_code=302)
+    response = RedirectResponse(url=f"/guest-chat?job={job_id}", status_code=302)
     response.set_cookie("guest_session", session_id, httponly=True)
     return response
 
@@ -34,7 +44,12 @@ async def guest_chat_page(request: Request):
     session_id = request.cookies.get("guest_session")
     if not session_id:
         return RedirectResponse("/", status_code=302)
-    return templates.TemplateResponse("guest_chat.html", {"request": request})
+    if not await guest_sessions.touch(session_id):
+        # Expired or reaped: start over with a new upload
+        response = RedirectResponse("/", status_code=302)
+        response.delete_cookie("guest_session")
+        return response
+    return services.templates.TemplateResponse(request, "guest_chat.html", {"request": request})
 
 
 @router.post("/guest-chat/stream")
@@ -43,31 +58,24 @@ async def guest_chat_stream(request: Request):
     query = form.get("query", "").strip()
     session_id = request.cookies.get("guest_session")
     if not session_id:
-        return StreamingResponse(iter(["Session not found."]), media_type="text/plain")
+        return JSONResponse(status_code=400, content={"error": "Session not found."})
+    if not await guest_sessions.touch(session_id):
+        return JSONResponse(status_code=410, content={"error": "Session expired."})
 
     namespace = f"session_{session_id}"
-
-    async def event_generator():
-        async for chunk in stream_chat_with_documents(query, namespace=namespace):
-            yield chunk
-
-    return StreamingResponse(event_generator(), media_type="text/plain")
+    try:
+        answer = await open_answer_stream(query, namespace, priority="guest")
+    except Overloaded as e:
+        return overloaded_response(e)
+    return sse_response(request, render_html(answer.follow()))
 
 
 @router.get("/guest-logout")
 async def guest_logout(request: Request):
     session_id = request.cookies.get("guest_session")
     if session_id:
-        await delete_guest_data(session_id)
+        await guest_sessions.retire(session_id)
     response = RedirectResponse(url="/")
     response.delete_cookie("guest_session")
     return response
 
-
-# Utility: Delete namespace from Pinecone
-async def delete_guest_data(session_id: str):
-    namespace = f"session_{session_id}"
-    try:
-        index.delete(delete_all=True, namespace=namespace)
-    except Exception as e:
-        print(f"⚠️ Error deleting guest data for {namespace}: {e}")
@@ -1,88 +1,359 @@
 # backend/routers/ingest.py
 
-import os, uuid, shutil
-import fitz  # PyMuPDF
-from fastapi import APIRouter, UploadFile, File, Request, Depends
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from backend.models import Document
-from backend.database import get_db
+import json, asyncio, os
+import aiofiles.os
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models import Document, DocumentChunk, IngestJob
+from backend.database import get_db, SessionLocal
 from backend.auth import get_current_user
-from backend.pinecone_utils import embed_and_store
+from backend.pinecone_utils import embed_and_store, delete_vectors, document_chunks, file_hash, update_metadata
+from backend.embedding_cache import chunk_hash
+from backend.document_versions import diff_chunks
+from backend.retrieval_cache import retrieval_cache
+from backend.ingest_jobs import enqueue_file, job_to_dict, TERMINAL_STATUSES
+from backend.metrics import span
+from backend.services import services
+from backend.uploads import MAX_UPLOAD_BYTES, UploadError, megabytes, receive_form_file, user_upload_limit
 
-UPLOAD_DIR = "uploads"
 router = APIRouter()
 
-def pdf_to_text(file_path):
-    text = ""
-    with fitz.open(file_path) as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
-
-@router.post("/upload")
-async def upload_file(
-    request: Request,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+# Extraction + embedding, run by the ingestion workers.
+# Pages are extracted, chunked and embedded as a stream (see text_extract).
+# A Document that already has chunks is diffed against them first, so only
+# new or changed chunks are embedded and upserted and only removed ones are
+# deleted; kept chunks are left as they are. A new version (another content
+# hash) stays hidden from queries until it is complete, then replaces the old
+# one in a single swap of its Document row (see document_versions).
+async def ingest_document(
+    file_path,
+    namespace,
+    content_hash=None,
+    filename=None,
+    document_id=None,
+    on_stage=None,
+    on_progress=None,
 ):
-    user_id = get_current_user(request)
-    session_id = request.cookies.get("session_id")
+    if document_id is None:
+        if on_stage:
+            await on_stage("embedding")
+        await embed_and_store(
+            file_path, namespace, content_hash, filename=filename, on_progress=on_progress
+        )
+        return
 
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    filename = f"{uuid.uuid4()}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    async with SessionLocal() as db:
+        doc = await db.get(Document, document_id)
+    if doc is None:
+        return  # deleted while queued
+    if content_hash is None:
+        content_hash = await asyncio.to_thread(file_hash, file_path)
+    replacing = doc.content_hash != content_hash
+    version = (doc.version or 1) + (1 if replacing else 0)
 
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    upload, removed = None, []
+    old = await registered_chunks(document_id)
+    if old:
+        if on_stage:
+            await on_stage("diffing")
+        new = await asyncio.to_thread(document_chunks, file_path, content_hash, document_id)
+        _, upload, removed = diff_chunks(old, new)
 
-    # Convert PDF to .txt temporarily
-    txt_path = file_path.replace(".pdf", ".txt")
-    with open(txt_path, "w", encoding="utf-8") as f:
-        f.write(pdf_to_text(file_path))
+    # Chunk registry: lets /delete-file and the next replacement find these vectors
+    written = []
 
-    # Determine namespace
+    async def on_upserted(vectors):
+        written.extend(v["id"] for v in vectors)
+        chunks = [(v["id"], chunk_hash(v["metadata"]["text"])) for v in vectors]
+        await register_chunks(document_id, chunks, old)
+
+    try:
+        if on_stage:
+            await on_stage("embedding")
+        await embed_and_store(
+            file_path,
+            namespace,
+            content_hash,
+            filename=filename,
+            document_id=document_id,
+            on_progress=on_progress,
+            on_upserted=on_upserted,
+            version=version,
+            only_ids=upload,
+        )
+        if replacing:
+            # Only the dropped chunks are marked; they hide once the swap makes this version current
+            await update_metadata({vector_id: {"retired_by": content_hash} for vector_id in removed}, namespace)
+            await swap_version(document_id, file_path, content_hash, version, removed)
+    except Exception:
+        if replacing:
+            # Drop the half-written version while it is still hidden
+            fresh = [vector_id for vector_id in written if vector_id not in old]
+            await delete_vectors(fresh, namespace)
+            await unregister_chunks(document_id, fresh)
+        raise
+
+    if replacing:
+        await retrieval_cache.invalidate_namespace(namespace)
+    if removed:
+        await delete_vectors(removed, namespace)
+        if not replacing:
+            await unregister_chunks(document_id, removed)
+
+
+# The new version becomes the document's in one transaction
+async def swap_version(document_id, file_path, content_hash, version, removed):
+    size = await asyncio.to_thread(os.path.getsize, file_path)
+    async with SessionLocal() as db:
+        await db.execute(
+            update(Document)
+            .where(Document.id == document_id)
+            .values(file_path=file_path, content_hash=content_hash, size_bytes=size, version=version)
+        )
+        if removed:
+            await db.execute(
+                delete(DocumentChunk).where(
+                    DocumentChunk.document_id == document_id,
+                    DocumentChunk.vector_id.in_(removed),
+                )
+            )
+        await db.commit()
+
+
+async def registered_chunks(document_id) -> dict:
+    async with SessionLocal() as db:
+        rows = await db.execute(
+            select(DocumentChunk.vector_id, DocumentChunk.chunk_hash).where(
+                DocumentChunk.document_id == document_id
+            )
+        )
+        return dict(rows.all())
+
+
+async def unregister_chunks(document_id, vector_ids):
+    if not vector_ids:
+        return
+    async with SessionLocal() as db:
+        await db.execute(
+            delete(DocumentChunk).where(
+                DocumentChunk.document_id == document_id,
+                DocumentChunk.vector_id.in_(vector_ids),
+            )
+        )
+        await db.commit()
+
+
+async def register_chunks(document_id, chunks, registered=None):
+    """Record ``(vector id, chunk hash)`` pairs; ``registered`` maps ids already on file to their hash."""
+    registered = registered or {}
+    new = [(vector_id, h) for vector_id, h in chunks if vector_id not in registered]
+    # Same id with other text: the chunker or extraction changed since
+    changed = [(vector_id, h) for vector_id, h in chunks if registered.get(vector_id, h) != h]
+    if not new and not changed:
+        return
+    async with SessionLocal() as db:
+        db.add_all(
+            DocumentChunk(document_id=document_id, vector_id=vector_id, chunk_hash=h)
+            for vector_id, h in new
+        )
+        for vector_id, h in changed:
+            await db.execute(
+                update(DocumentChunk)
+                .where(DocumentChunk.document_id == document_id, DocumentChunk.vector_id == vector_id)
+                .values(chunk_hash=h)
+            )
+        await db.commit()
+
+
+# Record the Document and queue ingestion of a stored upload.
+# Returns None when the user already has this exact file.
+async def queue_upload(db, filename, file_path, content_hash, size, namespace, user_id=None):
+    document_id = None
     if user_id:
-        namespace = f"user_{user_id}"
-        db_doc = Document(filename=file.filename, file_path=file_path, owner_id=user_id)
+        existing = await db.scalar(
+            select(Document.id)
+            .where(Document.owner_id == user_id, Document.content_hash == content_hash)
+            .limit(1)
+        )
+        if existing:
+            await discard_upload(db, file_path)
+            return None
+        db_doc = Document(
+            filename=filename,
+            file_path=file_path,
+            content_hash=content_hash,
+            size_bytes=size,
+            owner_id=user_id,
+        )
         db.add(db_doc)
-        db.commit()
+        await db.commit()
+        document_id = db_doc.id
+
+    return await enqueue_file(db, file_path, filename, namespace, namespace, document_id, content_hash)
+
+
+# An upload that won't be ingested. Uploads are stored by content hash and
+# name, so the file stays when a document or job already uses that path.
+async def discard_upload(db, file_path):
+    in_use = await db.scalar(
+        select(Document.id).where(Document.file_path == file_path).limit(1)
+    ) or await db.scalar(select(IngestJob.id).where(IngestJob.file_path == file_path).limit(1))
+    if in_use:
+        return
+    try:
+        await aiofiles.os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+@router.post("/upload")
+async def upload_file(request: Request, db: AsyncSession = Depends(get_db)):
+    user_id = get_current_user(request)
+    session_id = request.cookies.get("session_id")
+
+    # Determine namespace
+    namespace = f"user_{user_id}" if user_id else f"session_{session_id}"
+
+    # Stream the body to disk, within the per-file limit and the user's quota
+    if user_id:
+        limit, message = await user_upload_limit(db, user_id)
     else:
-        namespace = f"session_{session_id}"
+        limit, message = MAX_UPLOAD_BYTES, f"Uploads are limited to {megabytes(MAX_UPLOAD_BYTES)}."
+    try:
+        with span("upload_write", namespace):
+            filename, file_path, content_hash, size = await receive_form_file(request, limit, message)
+    except UploadError as e:
+        return services.templates.TemplateResponse(
+            request, "dashboard.html",
+            {"request": request, "user_id": user_id, "error": str(e)},
+            status_code=e.status_code,
+        )
 
-    # Ingest into Pinecone
-    await embed_and_store(txt_path, namespace)
+    # Ingest into Pinecone in the background
+    job = await queue_upload(db, filename, file_path, content_hash, size, namespace, user_id)
+    if job is None:
+        return RedirectResponse(url="/dashboard", status_code=302)
 
-    return RedirectResponse(url="/dashboard", status_code=302)
+    return RedirectResponse(url=f"/dashboard?job={job.id}", status_code=302)
 
 
-# Reusable function for guest.py or anywhere
-async def process_file(uploaded_file, session_id=None, user_id=None):
-    from backend.pinecone_utils import embed_and_store  # to avoid circular import
-    from backend.models import Document
-    from backend.database import SessionLocal
+# Replace a document with a new revision. Only chunks that changed are
+# re-embedded; queries keep seeing the old version until the new one is in.
+@router.post("/documents/{doc_id}/replace")
+async def replace_document(doc_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    user_id = get_current_user(request)
+    if not user_id:
+        return JSONResponse(status_code=401, content={"error": "Please log in."})
+    doc = await db.scalar(select(Document).where(Document.id == doc_id, Document.owner_id == user_id))
+    if not doc:
+        return JSONResponse(status_code=404, content={"error": "Document not found."})
+    if await document_busy(db, doc_id):
+        return JSONResponse(status_code=409, content={"error": "This document is still being processed."})
+
+    namespace = f"user_{user_id}"
+    limit, message = await user_upload_limit(db, user_id, freed=doc.size_bytes or 0)
+    try:
+        with span("upload_write", namespace):
+            _, file_path, content_hash, _ = await receive_form_file(request, limit, message)
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
 
-    db = SessionLocal()
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    if content_hash == doc.content_hash:
+        await discard_upload(db, file_path)
+        return {"document_id": doc.id, "version": doc.version or 1, "job": None}
+    # Same rule as /upload: one Document per file content and user
+    duplicate = await db.scalar(
+        select(Document.id)
+        .where(Document.owner_id == user_id, Document.content_hash == content_hash, Document.id != doc.id)
+        .limit(1)
+    )
+    if duplicate:
+        await discard_upload(db, file_path)
+        return JSONResponse(status_code=409, content={"error": "You already have this file as another document."})
+    # Checked again: another replacement may have been queued during the upload
+    if await document_busy(db, doc_id):
+        await discard_upload(db, file_path)
+        return JSONResponse(status_code=409, content={"error": "This document is still being processed."})
+    job = await enqueue_file(db, file_path, doc.filename, namespace, namespace, doc.id, content_hash)
+    return JSONResponse(
+        status_code=202,
+        content={"document_id": doc.id, "version": (doc.version or 1) + 1, "job": job_to_dict(job)},
+    )
 
-    filename = f"{uuid.uuid4()}_{uploaded_file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
 
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(uploaded_file.file, f)
+async def document_busy(db, doc_id) -> bool:
+    job_id = await db.scalar(
+        select(IngestJob.id)
+        .where(IngestJob.document_id == doc_id, IngestJob.status.in_(("queued", "running")))
+        .limit(1)
+    )
+    return job_id is not None
+
+
+# Reusable function for guest.py or anywhere
+async def process_file(filename, file_path, content_hash, size, session_id=None, user_id=None):
+    namespace = f"user_{user_id}" if user_id else f"session_{session_id}"
+    async with SessionLocal() as db:
+        job = await queue_upload(db, filename, file_path, content_hash, size, namespace, user_id)
+        return job.id if job else None
 
-    txt_path = file_path.replace(".pdf", ".txt")
-    with open(txt_path, "w", encoding="utf-8") as f:
-        f.write(pdf_to_text(file_path))
 
+def request_owner_key(request: Request) -> str | None:
+    user_id = get_current_user(request)
     if user_id:
-        namespace = f"user_{user_id}"
-        db_doc = Document(filename=uploaded_file.filename, file_path=file_path, owner_id=user_id)
-        db.add(db_doc)
-        db.commit()
-    else:
-        namespace = f"session_{session_id}"
+        return f"user_{user_id}"
+    session_id = request.cookies.get("guest_session") or request.cookies.get("session_id")
+    return f"session_{session_id}" if session_id else None
+
+
+@router.get("/ingest-jobs")
+async def list_jobs(request: Request, db: AsyncSession = Depends(get_db)):
+    owner_key = request_owner_key(request)
+    if not owner_key:
+        return {"jobs": []}
+    jobs = await db.scalars(
+        select(IngestJob)
+        .where(IngestJob.owner_key == owner_key)
+        .order_by(IngestJob.created_at.desc())
+        .limit(20)
+    )
+    return {"jobs": [job_to_dict(j) for j in jobs]}
+
+
+@router.get("/ingest-jobs/{job_id}")
+async def job_status(job_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    job = await db.scalar(
+        select(IngestJob).where(IngestJob.id == job_id, IngestJob.owner_key == request_owner_key(request))
+    )
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "Job not found."})
+    return job_to_dict(job)
+
+
+@router.get("/ingest-jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    owner_key = request_owner_key(request)
+
+    # Server-sent events: one message per state change until the job finishes
+    async def event_generator():
+        last = None
+        while not await request.is_disconnected():
+            async with SessionLocal() as db:
+                job = await db.scalar(
+                    select(IngestJob).where(IngestJob.id == job_id, IngestJob.owner_key == owner_key)
+                )
+                state = job_to_dict(job) if job else None
+
+            if state is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found.'})}\n\n"
+                return
+            if state != last:
+                yield f"data: {json.dumps(state)}\n\n"
+                last = state
+            if state["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(0.5)
 
-    await embed_and_store(txt_path, namespace)
-    db.close()
-    return namespace
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
@@ -0,0 +1,121 @@
+# backend/routers/uploads.py
+from datetime import datetime
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
+from backend.models import UploadSession
+from backend.database import get_db
+from backend.auth import get_current_user
+from backend.metrics import span
+from backend.routers.ingest import queue_upload
+from backend.uploads import UploadError, resumable_uploads, upload_session_to_dict, user_upload_limit
+
+router = APIRouter()
+
+# Resumable uploads for logged-in users:
+#   POST   /uploads              filename, size  -> {id, offset: 0, chunk_size}
+#   PUT    /uploads/{id}?offset= raw bytes        -> {offset, ...}, plus job_id once complete
+#   GET    /uploads/{id}                         -> where to resume after a dropped connection
+#   DELETE /uploads/{id}                         -> abandon
+# Bytes that arrived before a dropped connection are kept.
+
+
+async def owned_upload(db, upload_id: str, user_id) -> UploadSession | None:
+    return await db.scalar(
+        select(UploadSession).where(UploadSession.id == upload_id, UploadSession.user_id == user_id)
+    )
+
+
+@router.post("/uploads")
+async def create_upload(request: Request, db: AsyncSession = Depends(get_db)):
+    user_id = get_current_user(request)
+    if not user_id:
+        return JSONResponse(status_code=401, content={"error": "Login required."})
+    form = await request.form()
+    size = str(form.get("size", ""))
+    if not size.isdigit() or int(size) == 0 or not form.get("filename"):
+        return JSONResponse(status_code=400, content={"error": "filename and a non-zero size are required."})
+
+    await resumable_uploads.expire(db)
+    limit, message = await user_upload_limit(db, user_id)
+    if int(size) > limit:
+        return JSONResponse(status_code=413, content={"error": message})
+
+    session = await resumable_uploads.create(db, user_id, str(form["filename"]), int(size))
+    return JSONResponse(status_code=201, content=upload_session_to_dict(session))
+
+
+@router.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    session = await owned_upload(db, upload_id, get_current_user(request))
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Upload not found."})
+    return upload_session_to_dict(session)
+
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request, db: AsyncSession = Depends(get_db)):
+    user_id = get_current_user(request)
+    async with resumable_uploads.lock(upload_id):
+        session = await owned_upload(db, upload_id, user_id)
+        if not session:
+            resumable_uploads.forget(upload_id)
+            return JSONResponse(status_code=404, content={"error": "Upload not found."})
+        if offset != session.received:
+            # e.g. a retried chunk that had arrived after all: continue from here
+            return JSONResponse(
+                status_code=409, content={"error": "Offset mismatch.", **upload_session_to_dict(session)}
+            )
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > session.size - offset:
+            return JSONResponse(
+                status_code=413, content={"error": "Chunk goes past the declared upload size."}
+            )
+
+        namespace = f"user_{user_id}"
+        writer = await resumable_uploads.writer(session)
+        error = None
+        try:
+            with span("upload_write", namespace):
+                async for chunk in request.stream():
+                    await writer.write(chunk)
+        except ClientDisconnect:
+            pass
+        except UploadError as e:
+            error = e
+        finally:
+            await writer.close()
+            session.received = writer.size
+            session.updated_at = datetime.utcnow()
+            await db.commit()
+
+        if error is not None:
+            resumable_uploads.suspend(session, writer)
+            return JSONResponse(
+                status_code=error.status_code, content={"error": str(error), **upload_session_to_dict(session)}
+            )
+        if session.received < session.size:
+            resumable_uploads.suspend(session, writer)
+            return upload_session_to_dict(session)
+
+        # Complete: store under the content hash and ingest like a form upload
+        file_path, content_hash = await writer.commit(session.filename)
+        resumable_uploads.forget(upload_id)
+        filename, size = session.filename, session.size
+        await db.delete(session)
+        await db.commit()
+        job = await queue_upload(db, filename, file_path, content_hash, size, namespace, user_id)
+        return {"offset": size, "size": size, "job_id": job.id if job else None, "duplicate": job is None}
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    async with resumable_uploads.lock(upload_id):
+        session = await owned_upload(db, upload_id, get_current_user(request))
+        if not session:
+            resumable_uploads.forget(upload_id)
+            return JSONResponse(status_code=404, content={"error": "Upload not found."})
+        await resumable_uploads.discard(db, session)
+    return {"deleted": upload_id}
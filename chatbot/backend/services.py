@@ -0,0 +1,100 @@
+# backend/services.py
+import asyncio
+import logging
+import os
+import time
+
+TEMPLATES_DIR = os.getenv("TEMPLATES_DIR", "frontend/templates")
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    """
+    Process-wide resources, created on first use and torn down by the app lifespan.
+
+    Heavy clients live behind their own lazy getters (``get_client``,
+    ``get_engine``, ``get_vector_store``); this container owns the shared
+    template environment, the warm-up hooks that create those clients ahead
+    of the first request, and the readiness state reported by ``/ready``.
+    """
+
+    def __init__(self):
+        self._templates = None
+        self._hooks: list[tuple[str, object]] = []
+        self._close_hooks: list[object] = []
+        self._warm_up_task: asyncio.Task | None = None
+        self.checks: dict[str, dict] = {}
+        self.ready = False
+
+    @property
+    def templates(self):
+        if self._templates is None:
+            from fastapi.templating import Jinja2Templates
+
+            self._templates = Jinja2Templates(directory=TEMPLATES_DIR)
+        return self._templates
+
+    def on_warm_up(self, name: str):
+        """Register a sync or async callable that readies one dependency."""
+
+        def register(fn):
+            self._hooks.append((name, fn))
+            return fn
+
+        return register
+
+    def on_close(self, fn):
+        """Register a sync or async callable run at shutdown, in reverse order."""
+        self._close_hooks.append(fn)
+        return fn
+
+    async def warm_up(self) -> bool:
+        """Run every hook (sync ones in a thread) and record the outcome per hook."""
+
+        async def run(name, fn):
+            start = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    await fn()
+                else:
+                    await asyncio.to_thread(fn)
+                check = {"ok": True}
+            except Exception as e:
+                logger.warning("Warm-up of %s failed: %s", name, e)
+                check = {"ok": False, "error": str(e)}
+            check["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self.checks[name] = check
+
+        await asyncio.gather(*(run(name, fn) for name, fn in self._hooks))
+        self.ready = all(c["ok"] for c in self.checks.values())
+        return self.ready
+
+    def start_warm_up(self):
+        """Warm up in the background so the worker accepts connections immediately."""
+        if self._warm_up_task is None or self._warm_up_task.done():
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+        return self._warm_up_task
+
+    def readiness(self) -> dict:
+        # A failed warm-up is retried on the next readiness probe
+        if not self.ready and self._hooks and (self._warm_up_task is None or self._warm_up_task.done()):
+            self.start_warm_up()
+        return {"ready": self.ready, "checks": self.checks}
+
+    async def close(self):
+        if self._warm_up_task and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+        for fn in reversed(self._close_hooks):
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    await fn()
+                else:
+                    fn()
+            except Exception as e:
+                logger.exception("Shutdown hook failed: %s", e)
+        self.ready = False
+
+
+services = Services()
@@ -0,0 +1,107 @@
+# backend/single_flight.py
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Hashable
+from backend.metrics import Counter, register
+
+logger = logging.getLogger(__name__)
+
+coalesced_streams = register(
+    Counter("chatmate_coalesced_streams_total", "Requests served by an identical stream already in flight.")
+)
+
+
+class Flight:
+    """One upstream stream, buffered so followers can join late and replay it."""
+
+    def __init__(self, group: "StreamGroup", key: Hashable):
+        self.group = group
+        self.key = key
+        self.parts: list = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    async def _run(self, source: AsyncIterator):
+        try:
+            async for part in source:
+                self.parts.append(part)
+                self._notify()
+        except Exception as e:
+            logger.exception("Shared stream failed: %s", e)
+            self.error = e
+        finally:
+            self.done = True
+            self.group._finished(self)
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator:
+        """Every part from the start, then live ones until the source ends."""
+        index = 0
+        try:
+            while True:
+                while index < len(self.parts):
+                    yield self.parts[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self._leave()
+
+    def _leave(self):
+        self.subscribers -= 1
+        # The last follower went away: stop the upstream call too
+        if self.subscribers <= 0 and self.task is not None and not self.task.done():
+            self.group._finished(self)  # no one may join a cancelled flight
+            self.task.cancel()
+
+
+class StreamGroup:
+    """
+    Single-flight for async streams: while a stream for a key is running,
+    ``join`` with the same key follows it instead of starting another one.
+    Finished streams are forgotten at once, so nothing is cached here.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, Flight] = {}
+
+    def running(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def join(
+        self,
+        key: Hashable,
+        start: Callable[[], AsyncIterator],
+        admit: Callable[[], Awaitable] | None = None,
+    ) -> Flight:
+        """
+        The running flight for ``key``, or a new one from ``start()``.
+        ``admit`` is awaited only before starting a new flight, and may raise
+        to refuse it.
+        """
+        flight = self._flights.get(key)
+        if flight is None and admit is not None:
+            await admit()
+            flight = self._flights.get(key)  # started by someone else meanwhile
+        if flight is None:
+            flight = Flight(self, key)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(flight._run(start()))
+        else:
+            coalesced_streams.inc()
+        flight.subscribers += 1
+        return flight
+
+    def _finished(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
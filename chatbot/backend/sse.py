@@ -0,0 +1,129 @@
+# backend/sse.py
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from backend.metrics import request_timings
+
+# Coalescing: a burst of fragments goes out as one event after this many ms or bytes
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "50"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "1024"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_DISCONNECT_POLL_SECONDS = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+# Cancelled producers finishing their cleanup (the event loop only holds weak references)
+_cancelled_producers: set[asyncio.Task] = set()
+
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def sse_html_events(
+    request: Request,
+    fragments: AsyncIterator[str],
+    coalesce_ms: float | None = None,
+    coalesce_bytes: int | None = None,
+    heartbeat_seconds: float | None = None,
+) -> AsyncIterator[str]:
+    """
+    Relay HTML fragments as ``data: {"html": ...}`` events, then ``event: done``.
+
+    The source runs in its own task. The first fragment is sent at once;
+    after that, fragments arriving within ``coalesce_ms`` of the first unsent
+    one (or until ``coalesce_bytes`` pile up) go out as a single event, and
+    ``coalesce_ms=0`` sends each fragment as it comes. A ``: ping`` comment keeps idle connections open
+    through proxies. When the client goes away the source task is
+    cancelled, which closes the upstream model stream instead of letting it
+    run to completion.
+    """
+    coalesce_ms = SSE_COALESCE_MS if coalesce_ms is None else coalesce_ms
+    coalesce_bytes = SSE_COALESCE_BYTES if coalesce_bytes is None else coalesce_bytes
+    heartbeat_seconds = SSE_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for fragment in fragments:
+                if fragment:
+                    queue.put_nowait(fragment)
+        except Exception as e:
+            logger.exception("Answer stream failed: %s", e)
+            queue.put_nowait(e)
+        queue.put_nowait(_DONE)
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(produce())
+    pending, pending_bytes, flush_at = [], 0, None
+    sent_html = False
+    last_sent = last_poll = loop.time()
+    try:
+        while True:
+            now = loop.time()
+            deadlines = [last_sent + heartbeat_seconds, last_poll + SSE_DISCONNECT_POLL_SECONDS]
+            if flush_at is not None:
+                deadlines.append(flush_at)
+            try:
+                item = await asyncio.wait_for(queue.get(), max(0.0, min(deadlines) - now))
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is _DONE or isinstance(item, Exception):
+                if pending:
+                    yield sse_event({"html": "".join(pending)})
+                if isinstance(item, Exception):
+                    yield sse_event({"error": "An error occurred while generating the answer."}, "error")
+                timings = request_timings()
+                if timings is not None:
+                    # Debug timing: the stages of a streamed answer end after the headers went out
+                    stages = [{"stage": stage, "ms": round(seconds * 1000, 1)} for stage, seconds in timings]
+                    yield sse_event({"timings": stages}, "timing")
+                yield sse_event({}, "done")
+                return
+
+            if item is not None:
+                pending.append(item)
+                pending_bytes += len(item)
+                if flush_at is None:
+                    # The first fragment goes out at once; only later ones wait to coalesce
+                    flush_at = loop.time() + (coalesce_ms / 1000 if sent_html else 0)
+
+            now = loop.time()
+            if pending and (pending_bytes >= coalesce_bytes or now >= flush_at):
+                yield sse_event({"html": "".join(pending)})
+                pending, pending_bytes, flush_at = [], 0, None
+                last_sent, sent_html = now, True
+            elif now - last_sent >= heartbeat_seconds:
+                yield ": ping\n\n"
+                last_sent = now
+
+            if now - last_poll >= SSE_DISCONNECT_POLL_SECONDS:
+                last_poll = now
+                if await request.is_disconnected():
+                    return
+    finally:
+        # Still producing means the client went away: stop the model call too.
+        # The task is not awaited here, since cancelling this generator again
+        # would be forwarded to it and cut its cleanup (closing the upstream
+        # connection) short.
+        if not producer.done():
+            producer.cancel()
+            _cancelled_producers.add(producer)
+            producer.add_done_callback(_cancelled_producers.discard)
+            logger.info("Client disconnected, cancelled the upstream stream")
+
+
+def sse_response(request: Request, fragments: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        sse_html_events(request, fragments),
+        media_type="text/event-stream",
+        # Stop nginx & co. from buffering the stream back into one response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,77 @@
+# backend/text_extract.py
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+TEXT_BLOCK_SIZE = 64 * 1024
+
+_executor = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> list[str]:
+    import fitz  # PyMuPDF, only loaded for PDFs
+
+    with fitz.open(file_path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def iter_pdf_pages(file_path: str, pages_per_task: int = PDF_PAGES_PER_TASK):
+    """
+    Yield ``(page_number, text)`` for every page of a PDF, in order.
+
+    Page ranges are extracted in a process pool, with at most two ranges per
+    worker in flight, so only a bounded window of pages is held in memory.
+    """
+    import fitz
+
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+
+    if page_count <= pages_per_task:
+        for i, text in enumerate(_extract_page_range(file_path, 0, page_count)):
+            yield i + 1, text
+        return
+
+    executor = get_executor()
+    ranges = deque(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    pending = deque()
+    while ranges or pending:
+        while ranges and len(pending) < PDF_WORKERS * 2:
+            start, stop = ranges.popleft()
+            pending.append((start, executor.submit(_extract_page_range, file_path, start, stop)))
+        start, future = pending.popleft()
+        for offset, text in enumerate(future.result()):
+            yield start + offset + 1, text
+
+
+def iter_text_file(file_path: str, block_size: int = TEXT_BLOCK_SIZE):
+    """Yield ``(1, text)`` blocks of a plain-text file; text files have one page."""
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        while block := f.read(block_size):
+            yield 1, block
+
+
+def extract_pages(file_path: str):
+    """Pick the extractor by file type and yield page-tagged text in order."""
+    if os.path.splitext(file_path)[1].lower() == ".pdf":
+        return iter_pdf_pages(file_path)
+    return iter_text_file(file_path)
@@ -0,0 +1,299 @@
+# backend/uploads.py
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import aiofiles
+import aiofiles.os
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import delete, func, select
+from backend.models import Document, UploadSession
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # bytes per disk write
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+USER_QUOTA_BYTES = int(os.getenv("USER_QUOTA_BYTES", str(500 * 1024 * 1024)))
+# Resumable uploads: the part size suggested to clients, and how long an idle one is kept
+RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "86400"))
+
+# Boundaries and part headers of a one-file form, on top of the file itself
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f}".removesuffix(".0") + " MB"
+
+
+def clean_filename(filename: str | None) -> str:
+    """The last path component of a client-supplied name, never empty."""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    return name[:200] or "upload"
+
+
+def part_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f".{upload_id}.part")
+
+
+class UploadWriter:
+    """
+    Writes an upload to a ``.part`` file in UPLOAD_DIR in UPLOAD_CHUNK_SIZE
+    blocks, hashing and counting the bytes on the way, so the file is read
+    exactly once. ``commit`` moves it to its content-addressed path.
+    """
+
+    def __init__(self, limit: int, message: str, path: str | None = None, digest=None, size: int = 0):
+        self.limit = limit
+        self.message = message  # error shown when the limit is exceeded
+        self.path = path or part_path(str(uuid.uuid4()))
+        self.digest = digest or hashlib.sha256()
+        self.size = size
+        self._buffer = bytearray()
+        self._file = None
+
+    async def open(self):
+        await aiofiles.os.makedirs(UPLOAD_DIR, exist_ok=True)
+        self._file = await aiofiles.open(self.path, "ab")
+        return self
+
+    async def write(self, data: bytes):
+        if self.size + len(self._buffer) + len(data) > self.limit:
+            raise UploadError(self.message, 413)
+        self._buffer += data
+        if len(self._buffer) >= UPLOAD_CHUNK_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if self._buffer:
+            block, self._buffer = bytes(self._buffer), bytearray()
+            self.digest.update(block)
+            await self._file.write(block)
+            self.size += len(block)
+
+    async def close(self):
+        if self._file is not None:
+            await self.flush()
+            await self._file.close()
+            self._file = None
+
+    async def commit(self, filename: str) -> tuple[str, str]:
+        """Close and store under the content hash; identical uploads share one file."""
+        await self.close()
+        content_hash = self.digest.hexdigest()
+        file_path = os.path.join(UPLOAD_DIR, f"{content_hash[:16]}_{filename}")
+        if await aiofiles.os.path.exists(file_path):
+            await aiofiles.os.remove(self.path)
+        else:
+            await aiofiles.os.replace(self.path, file_path)
+        return file_path, content_hash
+
+    async def discard(self):
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        try:
+            await aiofiles.os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def receive_form_file(request, limit: int, message: str, field: str = "file") -> tuple[str, str, str, int]:
+    """
+    Stream the ``field`` file of a multipart/form-data request to disk.
+
+    The body is parsed as it arrives instead of being spooled to a temporary
+    file first. A Content-Length above ``limit`` is refused before anything
+    is read; otherwise the upload is cut off as soon as it passes ``limit``.
+    Returns ``(filename, file_path, content_hash, size)``.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit + FORM_OVERHEAD:
+        raise UploadError(message, 413)
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise UploadError("Expected a multipart/form-data upload.")
+
+    # The parser's callbacks are synchronous: collect events, then write them out
+    events = []
+    header = {"field": b"", "value": b""}
+    part_headers = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        part_headers[header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        events.append(("part", part_headers.pop(b"content-disposition", b"")))
+        part_headers.clear()
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    parser = MultipartParser(
+        params[b"boundary"],
+        {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+        },
+    )
+    writer = filename = None
+    receiving = False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, value in events:
+                if kind == "part":
+                    _, options = parse_options_header(value)
+                    receiving = (
+                        writer is None and options.get(b"name") == field.encode() and b"filename" in options
+                    )
+                    if receiving:
+                        filename = clean_filename(options[b"filename"].decode("utf-8", "replace"))
+                        writer = await UploadWriter(limit, message).open()
+                elif receiving:
+                    await writer.write(value)
+            events.clear()
+        parser.finalize()
+        if writer is None:
+            raise UploadError("No file was uploaded.")
+        file_path, content_hash = await writer.commit(filename)
+        return filename, file_path, content_hash, writer.size
+    except BaseException:
+        if writer is not None:
+            await writer.discard()
+        raise
+
+
+# 🔹 Quotas: stored documents plus the declared size of unfinished resumable uploads
+async def user_bytes_used(db, user_id: int) -> int:
+    stored = await db.scalar(
+        select(func.coalesce(func.sum(Document.size_bytes), 0)).where(Document.owner_id == user_id)
+    )
+    reserved = await db.scalar(
+        select(func.coalesce(func.sum(UploadSession.size), 0)).where(UploadSession.user_id == user_id)
+    )
+    return int(stored) + int(reserved)
+
+
+async def user_upload_limit(db, user_id: int, freed: int = 0) -> tuple[int, str]:
+    """
+    The largest upload the user may start now, and the error shown past it.
+    ``freed`` bytes are about to be released (the document being replaced).
+    """
+    remaining = max(0, USER_QUOTA_BYTES - await user_bytes_used(db, user_id) + freed)
+    if remaining < MAX_UPLOAD_BYTES:
+        return remaining, (
+            f"This upload would exceed your {megabytes(USER_QUOTA_BYTES)} storage quota "
+            f"({megabytes(remaining)} left). Delete some documents first."
+        )
+    return MAX_UPLOAD_BYTES, f"Uploads are limited to {megabytes(MAX_UPLOAD_BYTES)}."
+
+
+def upload_session_to_dict(session: UploadSession) -> dict:
+    return {
+        "id": session.id,
+        "filename": session.filename,
+        "size": session.size,
+        "offset": session.received,
+        "chunk_size": RESUMABLE_CHUNK_SIZE,
+    }
+
+
+def _hash_prefix(path: str, length: int):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while length > 0 and (block := f.read(min(UPLOAD_CHUNK_SIZE, length))):
+            digest.update(block)
+            length -= len(block)
+    return digest
+
+
+class ResumableUploads:
+    """
+    Per-process state of chunked uploads: one lock per upload, so chunks of
+    the same upload are appended one at a time, and the running sha256 of
+    each ``.part`` file, so every byte is hashed once. When a chunk lands on
+    a worker without that state (another worker, or after a restart) the
+    received prefix is hashed again from disk.
+    """
+
+    def __init__(self):
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._digests: dict[str, tuple[int, object]] = {}
+
+    def lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    async def writer(self, session: UploadSession) -> UploadWriter:
+        path = part_path(session.id)
+        received, digest = self._digests.pop(session.id, (None, None))
+        if received != session.received:
+            digest = await asyncio.to_thread(_hash_prefix, path, session.received)
+        # Drop bytes of an interrupted write that were never recorded
+        await asyncio.to_thread(os.truncate, path, session.received)
+        message = f"The upload is larger than the declared {session.size} bytes."
+        return await UploadWriter(session.size, message, path, digest, session.received).open()
+
+    def suspend(self, session: UploadSession, writer: UploadWriter):
+        self._digests[session.id] = (writer.size, writer.digest)
+
+    def forget(self, upload_id: str):
+        self._digests.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+
+    async def create(self, db, user_id: int, filename: str, size: int) -> UploadSession:
+        session = UploadSession(
+            id=str(uuid.uuid4()), user_id=user_id, filename=clean_filename(filename), size=size, received=0
+        )
+        await aiofiles.os.makedirs(UPLOAD_DIR, exist_ok=True)
+        async with aiofiles.open(part_path(session.id), "wb"):
+            pass
+        db.add(session)
+        await db.commit()
+        return session
+
+    async def discard(self, db, session: UploadSession):
+        self.forget(session.id)
+        try:
+            await aiofiles.os.remove(part_path(session.id))
+        except FileNotFoundError:
+            pass
+        await db.delete(session)
+        await db.commit()
+
+    async def expire(self, db, limit: int = 100):
+        """Delete uploads idle for UPLOAD_SESSION_TTL along with their partial files."""
+        cutoff = datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_TTL)
+        upload_ids = (
+            await db.scalars(select(UploadSession.id).where(UploadSession.updated_at < cutoff).limit(limit))
+        ).all()
+        if not upload_ids:
+            return
+        for upload_id in upload_ids:
+            self.forget(upload_id)
+            try:
+                await aiofiles.os.remove(part_path(upload_id))
+            except FileNotFoundError:
+                pass
+        await db.execute(delete(UploadSession).where(UploadSession.id.in_(upload_ids)))
+        await db.commit()
+
+
+resumable_uploads = ResumableUploads()
@@ -0,0 +1,374 @@
+# backend/vector_store.py
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")  # pinecone | local | memory
+VECTOR_STORE_THREADS = int(os.getenv("VECTOR_STORE_THREADS", "16"))
+
+# Metadata fields the local stores keep a value -> rows index for, so a query
+# scoped to a few documents scores only their rows
+PARTITION_FIELDS = ("doc_id", "file")
+
+
+class VectorStore(ABC):
+    """
+    Async vector-store interface used by ingestion and retrieval.
+
+    Vectors are dicts with ``id``, ``values`` and ``metadata``; ``query``
+    returns a list of ``{"id", "score", "metadata"}`` dicts (plus ``values``
+    when ``include_values`` is set), best match first. Filters use the
+    Pinecone metadata filter syntax. A store missing any of the abstract
+    methods can't be instantiated.
+    """
+
+    @abstractmethod
+    async def upsert(self, vectors: list[dict], namespace: str):
+        ...
+
+    @abstractmethod
+    async def query(
+        self,
+        vector: list[float],
+        top_k: int,
+        namespace: str,
+        filter: dict | None = None,
+        include_values: bool = False,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def delete(self, ids: list[str], namespace: str):
+        ...
+
+    @abstractmethod
+    async def update_metadata(self, updates: dict[str, dict], namespace: str):
+        """Set the given metadata fields (``{id: {field: value}}``) of stored vectors."""
+
+    @abstractmethod
+    async def delete_namespace(self, namespace: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+# ---------------------- FILTERS ---------------------- #
+
+
+def matches_filter(metadata: dict, metadata_filter: dict | None) -> bool:
+    """Evaluate the subset of Pinecone's filter language we use against one metadata dict."""
+    if not metadata_filter:
+        return True
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, f) for f in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, f) for f in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+            if op == "$gt" and not (value is not None and value > expected):
+                return False
+            if op == "$gte" and not (value is not None and value >= expected):
+                return False
+            if op == "$lt" and not (value is not None and value < expected):
+                return False
+            if op == "$lte" and not (value is not None and value <= expected):
+                return False
+    return True
+
+
+def partition_values(metadata_filter: dict | None) -> tuple[str, list] | None:
+    """
+    ``(field, values)`` when the filter restricts a partition field to listed
+    values (``$eq`` / ``$in``, at the top level or inside ``$and``), else None.
+    Rows outside those partitions can never match the filter.
+    """
+    if not metadata_filter:
+        return None
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            for sub_filter in condition:
+                found = partition_values(sub_filter)
+                if found:
+                    return found
+            continue
+        if key not in PARTITION_FIELDS:
+            continue
+        if not isinstance(condition, dict):
+            return key, [condition]
+        if "$eq" in condition:
+            return key, [condition["$eq"]]
+        if "$in" in condition:
+            return key, list(condition["$in"])
+    return None
+
+
+# ---------------------- IN-MEMORY ---------------------- #
+
+
+class _Namespace:
+    def __init__(self, dim: int):
+        self.ids: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.metadata: list[dict] = []
+        self.vectors = np.empty((0, dim), dtype=np.float32)  # unit-normalised, capacity-padded
+        self.partitions: dict[str, dict] = {field: {} for field in PARTITION_FIELDS}  # field -> value -> rows
+
+    def _index(self, row: int, metadata: dict):
+        for field, partitions in self.partitions.items():
+            if field in metadata:
+                partitions.setdefault(metadata[field], set()).add(row)
+
+    def _unindex(self, row: int, metadata: dict):
+        for field, partitions in self.partitions.items():
+            rows = partitions.get(metadata.get(field))
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del partitions[metadata[field]]
+
+    def partition_rows(self, field: str, values: list) -> np.ndarray:
+        partitions = self.partitions[field]
+        rows = [row for value in values for row in partitions.get(value, ())]
+        return np.array(sorted(set(rows)), dtype=np.int64)
+
+    def upsert(self, vector_id: str, values: np.ndarray, metadata: dict):
+        row = self.rows.get(vector_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self.vectors):
+                grown = np.empty((max(64, row * 2), self.vectors.shape[1]), dtype=np.float32)
+                grown[:row] = self.vectors[:row]
+                self.vectors = grown
+            self.ids.append(vector_id)
+            self.metadata.append(metadata)
+            self.rows[vector_id] = row
+        else:
+            self._unindex(row, self.metadata[row])
+            self.metadata[row] = metadata
+        self._index(row, metadata)
+        self.vectors[row] = values
+
+    def update_metadata(self, vector_id: str, fields: dict):
+        row = self.rows.get(vector_id)
+        if row is None:
+            return
+        self._unindex(row, self.metadata[row])
+        self.metadata[row] = {**self.metadata[row], **fields}
+        self._index(row, self.metadata[row])
+
+    def delete(self, vector_id: str):
+        row = self.rows.pop(vector_id, None)
+        if row is None:
+            return
+        self._unindex(row, self.metadata[row])
+        last = len(self.ids) - 1
+        if row != last:
+            # Move the last row into the hole
+            self._unindex(last, self.metadata[last])
+            self._index(row, self.metadata[last])
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.metadata[row] = self.metadata[last]
+            self.vectors[row] = self.vectors[last]
+            self.rows[moved] = row
+        self.ids.pop()
+        self.metadata.pop()
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    Pure NumPy cosine-similarity store for tests and local development.
+
+    Queries are exact: one matrix-vector product per namespace, with
+    metadata filters applied as a row mask before ranking. A filter on
+    ``PARTITION_FIELDS`` (e.g. ``{"doc_id": {"$in": [...]}}``) scores only the
+    rows of those documents.
+    """
+
+    def __init__(self):
+        self._namespaces: dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(values) -> np.ndarray:
+        vec = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    async def upsert(self, vectors: list[dict], namespace: str):
+        with self._lock:
+            for v in vectors:
+                values = self._unit(v["values"])
+                ns = self._namespaces.get(namespace)
+                if ns is None:
+                    ns = self._namespaces[namespace] = _Namespace(len(values))
+                ns.upsert(v["id"], values, dict(v.get("metadata") or {}))
+
+    async def query(self, vector, top_k, namespace, filter=None, include_values=False):
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None or not ns.ids:
+                return []
+            partition = partition_values(filter)
+            if partition:
+                rows = ns.partition_rows(*partition)
+                if not len(rows):
+                    return []
+                scores = ns.vectors[rows] @ self._unit(vector)
+            else:
+                rows = np.arange(len(ns.ids))
+                scores = ns.vectors[: len(rows)] @ self._unit(vector)
+            if filter:
+                mask = np.fromiter(
+                    (matches_filter(ns.metadata[r], filter) for r in rows), dtype=bool, count=len(rows)
+                )
+                scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top:
+                if scores[i] == -np.inf:
+                    break
+                row = rows[i]
+                match = {"id": ns.ids[row], "score": float(scores[i]), "metadata": dict(ns.metadata[row])}
+                if include_values:
+                    match["values"] = ns.vectors[row].tolist()
+                results.append(match)
+            return results
+
+    async def delete(self, ids, namespace):
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns:
+                for vector_id in ids:
+                    ns.delete(vector_id)
+
+    async def update_metadata(self, updates, namespace):
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns:
+                for vector_id, fields in updates.items():
+                    ns.update_metadata(vector_id, fields)
+
+    async def delete_namespace(self, namespace):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+
+
+# ---------------------- PINECONE ---------------------- #
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    Pinecone index behind the async interface.
+
+    The Pinecone client is synchronous, so every call runs on a dedicated
+    thread pool sized to the client's connection pool, keeping vector I/O
+    off the event loop.
+    """
+
+    def __init__(self, api_key: str | None = None, index_name: str | None = None):
+        from pinecone import Pinecone
+
+        pc = Pinecone(api_key=api_key or os.getenv("PINECONE_API_KEY"))
+        self.index = pc.Index(index_name or os.getenv("PINECONE_INDEX"), pool_threads=VECTOR_STORE_THREADS)
+        self._executor = ThreadPoolExecutor(
+            max_workers=VECTOR_STORE_THREADS, thread_name_prefix="pinecone"
+        )
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def upsert(self, vectors, namespace):
+        await self._run(self.index.upsert, vectors=vectors, namespace=namespace)
+
+    async def query(self, vector, top_k, namespace, filter=None, include_values=False):
+        result = await self._run(
+            self.index.query,
+            vector=vector,
+            top_k=top_k,
+            namespace=namespace,
+            filter=filter,
+            include_metadata=True,
+            include_values=include_values,
+        )
+        matches = []
+        for m in result.get("matches", []):
+            match = {"id": m["id"], "score": m["score"], "metadata": dict(m["metadata"] or {})}
+            if include_values:
+                match["values"] = list(m["values"])
+            matches.append(match)
+        return matches
+
+    async def delete(self, ids, namespace):
+        await self._run(self.index.delete, ids=ids, namespace=namespace)
+
+    async def update_metadata(self, updates, namespace):
+        # Pinecone updates one vector per call; they run in parallel on the pool
+        await asyncio.gather(
+            *(
+                self._run(self.index.update, id=vector_id, set_metadata=fields, namespace=namespace)
+                for vector_id, fields in updates.items()
+            )
+        )
+
+    async def delete_namespace(self, namespace):
+        await self._run(self.index.delete, delete_all=True, namespace=namespace)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    global _store
+    if _store is None:
+        # Warm-up creates the store on a worker thread while requests may arrive
+        with _store_lock:
+            if _store is None:
+                if VECTOR_STORE == "memory":
+                    _store = InMemoryVectorStore()
+                elif VECTOR_STORE == "local":
+                    from backend.local_vector_store import LocalVectorStore
+
+                    _store = LocalVectorStore()
+                else:
+                    _store = PineconeVectorStore()
+    return _store
+
+
+def set_vector_store(store: VectorStore):
+    """Swap the process-wide store (tests, benchmarks, alternative backends)."""
+    global _store
+    _store = store
+
+
+async def close_vector_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
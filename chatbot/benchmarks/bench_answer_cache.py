@@ -0,0 +1,83 @@
+# benchmarks/bench_answer_cache.py
+"""
+Semantic answer cache replay vs. a (fake) streaming chat model.
+
+    python -m benchmarks.bench_answer_cache --entries 5000 --tokens 300
+
+Fills one cache bucket with ``--entries`` random answers, then compares the
+time to first piece and total time of streaming a fresh answer from a fake
+model (first-token latency + per-token interval) with looking up and
+replaying a near-duplicate question from the cache.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from backend.answer_cache import SemanticAnswerCache, replay_stream
+
+
+async def fake_model_stream(tokens: int, first_token_latency: float, token_interval: float):
+    await asyncio.sleep(first_token_latency)
+    for i in range(tokens):
+        yield f"word{i} "
+        await asyncio.sleep(token_interval)
+
+
+async def timed(stream):
+    start = time.perf_counter()
+    first = None
+    async for _ in stream:
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+async def replayed(cache, query_vector):
+    answer = cache.lookup("user_1", 0, None, query_vector)
+    for part in replay_stream(answer):
+        yield part
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--first-token-latency", type=float, default=0.6)
+    parser.add_argument("--token-interval", type=float, default=0.015)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    cache = SemanticAnswerCache(threshold=0.95)
+    vectors = rng.standard_normal((args.entries, args.dim), dtype=np.float32)
+    answer = " ".join(f"word{i}" for i in range(args.tokens))
+    for vec in vectors:
+        cache.store("user_1", 0, None, vec, answer)
+
+    # A slightly perturbed copy of a cached question (cosine ~0.99)
+    probe = vectors[args.entries // 2] + 0.1 * rng.standard_normal(args.dim, dtype=np.float32)
+    cache.lookup("user_1", 0, None, probe)  # build the bucket matrix once
+
+    async def run():
+        model, replay = [], []
+        for _ in range(args.runs):
+            model.append(
+                await timed(fake_model_stream(args.tokens, args.first_token_latency, args.token_interval))
+            )
+            replay.append(await timed(replayed(cache, probe)))
+        return model, replay
+
+    model, replay = asyncio.run(run())
+    print(f"cache: {cache.stats()['entries']} entries, {cache.size_bytes / 1e6:.1f} MB")
+    for label, results in (("model", model), ("cache replay", replay)):
+        ttfb = statistics.median(r[0] for r in results) * 1000
+        total = statistics.median(r[1] for r in results) * 1000
+        print(f"{label:<13} first piece {ttfb:9.2f} ms   full answer {total:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
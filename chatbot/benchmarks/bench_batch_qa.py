@@ -0,0 +1,81 @@
+# benchmarks/bench_batch_qa.py
+"""
+A batch of questions about one manual, against a local fake Azure OpenAI.
+
+    python -m benchmarks.bench_batch_qa --questions 100 --distinct 60
+
+Answers ``--questions`` questions (``--distinct`` of them different, the
+rest repeats with other casing) once as a loop of ``chat_with_documents``
+calls, one question at a time as the chat page would send them, and once
+through ``backend.batch_qa.answer_batch``. Reports upstream embedding /
+chat requests and wall time. Every run uses fresh questions, so neither
+starts with warm caches.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.bench_coalescing import configure_env
+from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+
+
+def make_questions(args, run: str) -> list[str]:
+    distinct = [f"What does warning light {i} mean ({run})?" for i in range(args.distinct)]
+    repeats = [distinct[i % args.distinct].upper() for i in range(args.questions - args.distinct)]
+    return distinct + repeats
+
+
+async def run(args, fake: FakeOpenAIConfig, workdir: str):
+    from backend.azure_openai_utils import chat_with_documents
+    from backend.batch_qa import answer_batch
+    from backend.pinecone_utils import embed_and_store
+
+    path = os.path.join(workdir, "manual.txt")
+    with open(path, "w") as f:
+        f.writelines(f"Warning light {i} means check system {i}.\n" for i in range(200))
+    await embed_and_store(path, "user_1", filename="manual.txt")
+
+    async def sequential(questions):
+        for question in questions:
+            await chat_with_documents(question, "user_1")
+
+    async def batch(questions):
+        async for _ in answer_batch(questions, "user_1", concurrency=args.concurrency):
+            pass
+
+    for label, answer in (("sequential", sequential), ("batch", batch)):
+        questions = make_questions(args, label)
+        embeds, chats = fake.embed_requests, fake.chat_requests
+        start = time.perf_counter()
+        await answer(questions)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:10s} upstream embeddings={fake.embed_requests - embeds:4d} "
+            f"chat={fake.chat_requests - chats:4d}  wall={elapsed:6.2f} s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(args.port, workdir)
+        config = FakeOpenAIConfig(
+            embed_latency=0.1, chat_first_token_latency=0.3, chat_token_interval=0.005, chat_tokens=100
+        )
+        fake = start_fake_openai(config, args.port)
+        try:
+            asyncio.run(run(args, config, workdir))
+        finally:
+            fake.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_chat_during_upload.py
+"""
+Chat latency while uploads are embedding, against a local fake Azure OpenAI.
+
+    python -m benchmarks.bench_chat_during_upload --chats 20 --uploads 8
+
+Runs the same concurrent chat workload three times: idle, alongside uploads
+going through the shared async client (``backend.embedding_utils``), and
+alongside uploads using the old synchronous ``AzureOpenAI`` client. With the
+async client, chat latency should stay close to the idle baseline.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+
+
+def configure_env(port: int):
+    os.environ["AZURE_OPENAI_ENDPOINT"] = f"http://127.0.0.1:{port}"
+    os.environ["AZURE_OPENAI_API_KEY"] = "fake-key"
+    os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"] = "fake-chat"
+    os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"] = "fake-embedding"
+
+
+async def one_chat(client, chat_model) -> float:
+    start = time.perf_counter()
+    response = await client.chat.completions.create(
+        model=chat_model,
+        messages=[{"role": "user", "content": "How do I turn on the headlights?"}],
+        stream=True,
+    )
+    async for _ in response:
+        pass
+    return time.perf_counter() - start
+
+
+async def run(chats: int, uploads: int, upload_mode: str) -> list[float]:
+    from backend.openai_client import get_client, chat_model, embedding_model
+    from backend.embedding_utils import embed_text
+
+    chunks = [f"chunk {i} of the vehicle manual" for i in range(16)]
+
+    async def async_upload():
+        await embed_text(chunks)
+
+    async def blocking_upload():
+        from openai import AzureOpenAI
+
+        sync_client = AzureOpenAI(
+            api_key=os.environ["AZURE_OPENAI_API_KEY"],
+            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+            api_version="2024-05-01-preview",
+        )
+        sync_client.embeddings.create(input=chunks, model=embedding_model)
+
+    upload = {"async": async_upload, "blocking": blocking_upload}.get(upload_mode)
+    chat_tasks = [asyncio.create_task(one_chat(get_client(), chat_model)) for _ in range(chats)]
+
+    # Let the chats get their requests in flight, then start uploading
+    await asyncio.sleep(0.05)
+    if upload:
+        await asyncio.gather(*(upload() for _ in range(uploads)))
+    return list(await asyncio.gather(*chat_tasks))
+
+
+def report(label: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(
+        f"{label:<22} p50={statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p95={p95 * 1000:7.1f} ms  max={latencies[-1] * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--embed-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    configure_env(args.port)
+    server = start_fake_openai(FakeOpenAIConfig(embed_latency=args.embed_latency), args.port)
+
+    # One event loop for all runs: the shared HTTP pool is bound to it
+    async def run_all():
+        for mode in ("idle", "async", "blocking"):
+            latencies = await run(args.chats, args.uploads, mode)
+            report(f"chat ({mode} uploads)", latencies)
+
+    try:
+        asyncio.run(run_all())
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
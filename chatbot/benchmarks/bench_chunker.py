@@ -0,0 +1,84 @@
+# benchmarks/bench_chunker.py
+"""
+Chunking throughput and memory: backend.chunker vs. LangChain's splitter.
+
+    python -m benchmarks.bench_chunker [files ...]
+
+Defaults to every distinct document in ``uploads/``. Text is extracted once
+up front so only chunking is timed. The LangChain baseline reproduces the
+old ``read_and_split_text`` (whole document in one string, 1000/100
+characters); it is skipped if langchain is not installed. Import time of
+each chunker is measured in a fresh interpreter.
+"""
+import glob
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from backend.chunker import chunk_pages
+from backend.pinecone_utils import file_hash
+from backend.text_extract import extract_pages, shutdown_executor
+
+
+def import_time(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return float(out.stdout.strip()) if out.returncode == 0 else float("nan")
+
+
+def langchain_chunks(pages):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    text = "".join(t for _, t in pages)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    return splitter.split_text(text)
+
+
+def native_chunks(pages):
+    return list(chunk_pages(iter(pages)))
+
+
+def measure(fn, pages):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = fn(pages)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(chunks), elapsed, peak
+
+
+def main(paths):
+    try:
+        import langchain  # noqa: F401
+
+        chunkers = {"langchain": langchain_chunks, "native": native_chunks}
+    except ImportError:
+        chunkers = {"native": native_chunks}
+
+    print("import time: " + ", ".join(
+        f"{name} {import_time(module):.3f}s"
+        for name, module in (("langchain", "langchain.text_splitter"), ("native", "backend.chunker"))
+        if name in chunkers
+    ))
+
+    seen = set()
+    for path in paths:
+        digest = file_hash(path)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        pages = list(extract_pages(path))
+        size_mb = sum(len(t) for _, t in pages) / 1e6
+        for name, fn in chunkers.items():
+            count, elapsed, peak = measure(fn, pages)
+            print(
+                f"{path[-40:]:<40} {name:<9} {count:>5} chunks  "
+                f"{size_mb / elapsed:7.2f} MB/s  peak {peak / 1024:8.0f} KB"
+            )
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob("uploads/*")))
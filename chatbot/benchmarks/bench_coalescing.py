@@ -0,0 +1,137 @@
+# benchmarks/bench_coalescing.py
+"""
+Single-flight answers and admission control, against a local fake Azure OpenAI.
+
+    python -m benchmarks.bench_coalescing --askers 50 --spread 0.5
+
+* coalescing: ``--askers`` clients ask the same question about the same
+  manual, arriving within ``--spread`` seconds, once with every request
+  making its own calls (``stream_chat_with_documents``) and once through
+  ``open_answer_stream``. Reports upstream embedding / chat requests and
+  answer latency.
+* admission: a burst of ``--burst-requests`` arrivals, half from logged-in
+  users, against a token bucket of ``--rate`` per second. Reports how many
+  of each class got in and how quickly the rest were refused.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+
+QUESTION = "How do I turn on the headlights?"
+
+
+def configure_env(port: int, workdir: str):
+    os.environ.update(
+        {
+            "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{port}",
+            "AZURE_OPENAI_API_KEY": "fake-key",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "fake-chat",
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "fake-embedding",
+            "VECTOR_STORE": "memory",
+            "EMBEDDING_CACHE_PATH": f"{workdir}/embeddings.sqlite3",
+            "LEXICAL_INDEX_DIR": f"{workdir}/lexical",
+            "ANSWER_CACHE_ENABLED": "false",
+            "ADMISSION_ENABLED": "false",
+        }
+    )
+
+
+async def bench_coalescing(args, fake: FakeOpenAIConfig, workdir: str):
+    from backend.azure_openai_utils import open_answer_stream, stream_chat_with_documents
+    from backend.pinecone_utils import embed_and_store
+
+    path = os.path.join(workdir, "manual.txt")
+    with open(path, "w") as f:
+        f.write("To turn on the headlights, rotate the light switch to AUTO.\n" * 20)
+    await embed_and_store(path, "user_1", filename="manual.txt")
+
+    async def direct(question):
+        async for _ in stream_chat_with_documents(question, "user_1"):
+            pass
+
+    async def shared(question):
+        answer = await open_answer_stream(question, "user_1")
+        async for _ in answer.follow():
+            pass
+
+    for round_number, (label, ask) in enumerate((("independent", direct), ("single-flight", shared))):
+        question = f"{QUESTION} ({round_number})"  # every round starts with cold caches
+        embeds, chats = fake.embed_requests, fake.chat_requests
+
+        async def one(delay):
+            await asyncio.sleep(delay)
+            start = time.perf_counter()
+            await ask(question)
+            return time.perf_counter() - start
+
+        latencies = await asyncio.gather(
+            *(one(random.uniform(0, args.spread)) for _ in range(args.askers))
+        )
+        print(
+            f"{label:13s} upstream embeddings={fake.embed_requests - embeds:3d} "
+            f"chat={fake.chat_requests - chats:3d}  "
+            f"latency p50={statistics.median(latencies) * 1000:.0f} ms max={max(latencies) * 1000:.0f} ms"
+        )
+
+
+async def bench_admission(args):
+    import backend.admission as admission_module
+    from backend.admission import AdmissionController, Overloaded
+
+    admission_module.ADMISSION_ENABLED = True
+    controller = AdmissionController(
+        rate=args.rate, burst=args.rate, queue_size=args.queue_size, max_wait=args.max_wait
+    )
+    outcomes = {"user": [], "guest": []}
+
+    async def arrive(priority):
+        start = time.perf_counter()
+        try:
+            await controller.acquire(priority)
+            outcomes[priority].append(("admitted", time.perf_counter() - start))
+        except Overloaded:
+            outcomes[priority].append(("refused", time.perf_counter() - start))
+
+    await asyncio.gather(*(arrive("user" if i % 2 else "guest") for i in range(args.burst_requests)))
+    for priority, results in outcomes.items():
+        admitted = [t for outcome, t in results if outcome == "admitted"]
+        refused = [t for outcome, t in results if outcome == "refused"]
+        print(
+            f"{priority:5s} admitted {len(admitted):3d}/{len(results)} "
+            f"(max wait {max(admitted, default=0):.2f} s), "
+            f"refused {len(refused):3d} (max time to 429 {max(refused, default=0) * 1000:.1f} ms)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8910)
+    parser.add_argument("--askers", type=int, default=50)
+    parser.add_argument("--spread", type=float, default=0.5)
+    parser.add_argument("--burst-requests", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=5)
+    parser.add_argument("--queue-size", type=int, default=40)
+    parser.add_argument("--max-wait", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(args.port, workdir)
+        config = FakeOpenAIConfig(
+            embed_latency=0.1, chat_first_token_latency=0.3, chat_token_interval=0.01, chat_tokens=100
+        )
+        fake = start_fake_openai(config, args.port)
+        try:
+            asyncio.run(bench_coalescing(args, config, workdir))
+            asyncio.run(bench_admission(args))
+        finally:
+            fake.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/bench_context_assembly.py
+"""
+Prompt tokens and answer coverage: top-k join vs. budgeted MMR assembly.
+
+    python -m benchmarks.bench_context_assembly --questions 300 [--files a.pdf b.txt]
+
+Chunks the sample documents in ``uploads/`` (or ``--files``) with the app's
+chunker and indexes them twice: dense, using a local hashed TF-IDF
+embedding so no API is needed, and BM25 via the app's lexical index. Each
+question is a sentence from the corpus with some of its words dropped;
+retrieval fuses both rankings with RRF, as the app does.
+
+* ``candidate pool``: every fused candidate, the ceiling for coverage.
+* ``top-5 join``: the previous behaviour, the five best chunks joined.
+* ``assembled``: a pool of CONTEXT_CANDIDATES chunks passed through
+  ``assemble_context`` at each token budget.
+
+Coverage is the share of questions whose source sentence appears verbatim in
+the context; tokens use the chunker's estimate.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from backend.chunker import chunk_pages, count_tokens
+from backend.context_builder import assemble_context, CONTEXT_CANDIDATES
+from backend.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from backend.text_extract import extract_pages
+
+DIM = 4096
+SENTENCE_RE = re.compile(r"[^.!?\n]{40,200}[.!?]")
+
+
+def hashed_tfidf(texts: list[str], idf: dict[str, float]) -> np.ndarray:
+    matrix = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            matrix[row, zlib.crc32(token.encode()) % DIM] += idf.get(token, 1.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def load_corpus(files: list[str]) -> list[dict]:
+    chunks, seen = [], set()
+    for path in files:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        name = os.path.basename(path)
+        for page, offset, text in chunk_pages(extract_pages(path)):
+            chunks.append(
+                {
+                    "id": f"{digest[:16]}-{offset}",
+                    "metadata": {"file": name, "doc_hash": digest, "page": page, "offset": offset, "text": text},
+                }
+            )
+    return chunks
+
+
+def make_questions(chunks: list[dict], count: int, rng: random.Random) -> list[str]:
+    sentences = sorted({s.strip() for c in chunks for s in SENTENCE_RE.findall(c["metadata"]["text"])})
+    sentences = [s for s in sentences if len(s.split()) >= 8]
+    return rng.sample(sentences, min(count, len(sentences)))
+
+
+def to_query(sentence: str, rng: random.Random) -> str:
+    words = sentence.split()
+    return " ".join(w for w in words if rng.random() < 0.6) or sentence
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", nargs="*")
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--budgets", type=int, nargs="*", default=[800, 1100, 1400])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    files = args.files or sorted(
+        p for p in glob.glob("uploads/*") if p.lower().endswith((".pdf", ".txt"))
+    )
+    rng = random.Random(args.seed)
+    chunks = load_corpus(files)
+    texts = [c["metadata"]["text"] for c in chunks]
+    print(f"{len(chunks)} chunks from {len(files)} files")
+
+    df: dict[str, int] = {}
+    for text in texts:
+        for token in set(tokenize(text)):
+            df[token] = df.get(token, 0) + 1
+    idf = {t: float(np.log(1 + len(texts) / n)) for t, n in df.items()}
+    matrix = hashed_tfidf(texts, idf)
+    vectors = {c["id"]: matrix[i] for i, c in enumerate(chunks)}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        lexical = LexicalIndex(workdir)
+        lexical.add("bench", chunks)
+
+        results = {"candidate pool": [], "top-5 join": []}
+        results.update({f"assembled {b}": [] for b in args.budgets})
+        timings = []
+        for sentence in make_questions(chunks, args.questions, rng):
+            query = to_query(sentence, rng)
+            scores = matrix @ hashed_tfidf([query], idf)[0]
+            best = np.argsort(-scores)[:CONTEXT_CANDIDATES]
+            dense = [{**chunks[i], "score": float(scores[i])} for i in best]
+            pool = reciprocal_rank_fusion(
+                [dense, lexical.search("bench", query, CONTEXT_CANDIDATES)], top_k=CONTEXT_CANDIDATES
+            )
+            target = normalize(sentence)
+
+            everything = "\n".join(m["metadata"]["text"] for m in pool)
+            results["candidate pool"].append((count_tokens(everything), target in normalize(everything)))
+            baseline = "\n".join(m["metadata"]["text"] for m in pool[:5])
+            results["top-5 join"].append((count_tokens(baseline), target in normalize(baseline)))
+            for budget in args.budgets:
+                start = time.perf_counter()
+                context, _ = assemble_context(pool, vectors, token_budget=budget)
+                timings.append(time.perf_counter() - start)
+                results[f"assembled {budget}"].append((count_tokens(context), target in normalize(context)))
+
+    for label, rows in results.items():
+        tokens = [t for t, _ in rows]
+        coverage = sum(hit for _, hit in rows) / len(rows)
+        print(
+            f"{label:<16} prompt tokens mean={statistics.mean(tokens):7.1f}  "
+            f"p95={sorted(tokens)[int(len(tokens) * 0.95) - 1]:5d}  coverage={coverage:6.1%}"
+        )
+    print(f"assembly time p50={statistics.median(timings) * 1000:.2f} ms  max={max(timings) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
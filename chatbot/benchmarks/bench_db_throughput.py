@@ -0,0 +1,174 @@
+# benchmarks/bench_db_throughput.py
+"""
+Database-bound routes under concurrency: POST /login and GET /files.
+
+    python -m benchmarks.bench_db_throughput --requests 2000 --concurrency 1 16 64
+
+Serves the app with uvicorn in a separate process on a SQLite file seeded
+with ``--users`` accounts of ``--docs`` documents each, then drives each
+route at every concurrency level and reports throughput and latency. A
+probe hits ``/health`` every 20 ms meanwhile; its latency shows how long
+the event loop stays blocked while database calls are in flight.
+"""
+import argparse
+import asyncio
+import hashlib
+import http.cookiejar
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def cookieless_jar() -> http.cookiejar.CookieJar:
+    # A logged-in client would be redirected from /login without a query
+    return http.cookiejar.CookieJar(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+
+def app_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        {
+            "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+            "VECTOR_STORE": "memory",
+            "EMBEDDING_CACHE_PATH": f"{workdir}/embeddings.sqlite3",
+            "LEXICAL_INDEX_DIR": f"{workdir}/lexical",
+            "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:9",
+            "AZURE_OPENAI_API_KEY": "placeholder",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "chat",
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "embedding",
+            "WARM_UP_ON_STARTUP": "false",
+        }
+    )
+    return env
+
+
+def seed(workdir: str, users: int, docs: int):
+    subprocess.run([sys.executable, "-m", "backend.init_db"], env=app_env(workdir), check=True)
+    password = hashlib.sha256(b"password").hexdigest()
+    with sqlite3.connect(f"{workdir}/bench.db") as conn:
+        conn.executemany(
+            "INSERT INTO users (id, username, email, password) VALUES (?, ?, ?, ?)",
+            [(i, f"user{i}", f"user{i}@example.com", password) for i in range(1, users + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO documents (filename, file_path, content_hash, owner_id) VALUES (?, ?, ?, ?)",
+            [
+                (f"manual{d}.pdf", f"uploads/manual{d}.pdf", f"{u:032x}{d:032x}", u)
+                for u in range(1, users + 1)
+                for d in range(docs)
+            ],
+        )
+
+
+async def wait_until_up(base: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(300):
+            try:
+                await client.get(f"{base}/health")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    raise SystemExit("app did not start")
+
+
+async def drive(base: str, make_request, total: int, concurrency: int) -> dict:
+    latencies, probe = [], []
+    remaining = total
+    done = asyncio.Event()
+
+    async def worker(client):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await make_request(client)
+            if response.status_code >= 400 and response.status_code != 401:
+                raise SystemExit(f"unexpected {response.status_code}: {response.text[:200]}")
+            latencies.append(time.perf_counter() - start)
+
+    async def health_probe(client):
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get(f"{base}/health")
+            probe.append(time.perf_counter() - start)
+            await asyncio.sleep(0.02)
+
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60, cookies=cookieless_jar()) as client:
+        probe_task = asyncio.create_task(health_probe(client))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    latencies.sort()
+    probe.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "health_p95": probe[max(int(len(probe) * 0.95) - 1, 0)] * 1000 if probe else float("nan"),
+    }
+
+
+async def run(args, base: str):
+    await wait_until_up(base)
+
+    async def login(client):
+        user = random.randint(1, args.users)
+        data = {"email": f"user{user}@example.com", "password": "password"}
+        return await client.post("/login", data=data, follow_redirects=False)
+
+    # One session cookie per user, taken from a real login
+    sessions = []
+    async with httpx.AsyncClient(base_url=base, cookies=cookieless_jar()) as client:
+        for user in range(1, min(args.users, 50) + 1):
+            data = {"email": f"user{user}@example.com", "password": "password"}
+            response = await client.post("/login", data=data, follow_redirects=False)
+            sessions.append(response.cookies["session"])
+
+    async def list_files(client):
+        return await client.get("/files", headers={"Cookie": f"session={random.choice(sessions)}"})
+
+    for label, make_request in (("POST /login", login), ("GET /files", list_files)):
+        for concurrency in args.concurrency:
+            result = await drive(base, make_request, args.requests, concurrency)
+            print(
+                f"{label:<12} c={concurrency:<3} {result['rps']:7.0f} req/s  "
+                f"p50={result['p50']:7.1f} ms  p95={result['p95']:7.1f} ms  "
+                f"/health p95={result['health_p95']:6.1f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8907)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 16, 64])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seed(workdir, args.users, args.docs)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=app_env(workdir),
+        )
+        try:
+            asyncio.run(run(args, f"http://127.0.0.1:{args.port}"))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# benchmarks/bench_hybrid_retrieval.py
+"""
+Retrieval quality and latency: dense vs. BM25 vs. hybrid (RRF).
+
+    python -m benchmarks.bench_hybrid_retrieval [--embeddings fake|azure] [--queries 200]
+
+Chunks every distinct document in ``uploads/`` with the ingestion chunker. Each
+query is built from the three rarest tokens of a sampled chunk (part
+numbers, codes, model names), and that chunk is the relevant answer; recall@5
+and MRR are reported for each retriever. ``--embeddings fake`` uses a local
+hashed character-trigram embedding so the benchmark runs offline; ``azure``
+embeds with the configured deployment. BM25 latency is then measured on the
+same chunks replicated to ``--scale`` rows.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import math
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from backend.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from backend.pinecone_utils import file_hash, split_pages
+from backend.text_extract import extract_pages, shutdown_executor
+from backend.vector_store import InMemoryVectorStore
+
+
+def load_chunks():
+    chunks, seen = [], set()
+    for path in sorted(glob.glob("uploads/*")):
+        digest = file_hash(path)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        for page, offset, text in split_pages(extract_pages(path)):
+            chunks.append({"id": f"{digest[:12]}-{offset}", "metadata": {"text": text, "page": page}})
+    return chunks
+
+
+def trigram_embedding(text: str, dim: int = 512) -> np.ndarray:
+    vec = np.zeros(dim, dtype=np.float32)
+    text = f"  {text.lower()}  "
+    for i in range(len(text) - 2):
+        vec[int.from_bytes(hashlib.md5(text[i : i + 3].encode()).digest()[:4], "little") % dim] += 1
+    return vec
+
+
+async def embed_all(texts, mode):
+    if mode == "fake":
+        return [trigram_embedding(t) for t in texts]
+    from backend.embedding_utils import embed_text
+
+    vectors = []
+    for start in range(0, len(texts), 64):
+        vectors.extend(await embed_text(texts[start : start + 64]))
+    return vectors
+
+
+def make_queries(chunks, count, rng):
+    df = {}
+    for chunk in chunks:
+        for token in set(tokenize(chunk["metadata"]["text"])):
+            df[token] = df.get(token, 0) + 1
+    queries = []
+    for chunk in rng.sample(chunks, min(count, len(chunks))):
+        tokens = sorted(set(tokenize(chunk["metadata"]["text"])), key=lambda t: (df[t], t))
+        if len(tokens) >= 3:
+            queries.append((" ".join(tokens[:3]), chunk["id"]))
+    return queries
+
+
+def score(rankings):
+    recall = statistics.mean(1.0 if target in ids[:5] else 0.0 for ids, target in rankings)
+    mrr = statistics.mean(
+        1.0 / (ids.index(target) + 1) if target in ids else 0.0 for ids, target in rankings
+    )
+    return recall, mrr
+
+
+async def main(args):
+    rng = random.Random(0)
+    chunks = load_chunks()
+    queries = make_queries(chunks, args.queries, rng)
+    print(f"{len(chunks)} chunks, {len(queries)} queries, embeddings={args.embeddings}")
+
+    with tempfile.TemporaryDirectory() as root:
+        lexical = LexicalIndex(root)
+        lexical.add("bench", chunks)
+        dense = InMemoryVectorStore()
+        vectors = await embed_all([c["metadata"]["text"] for c in chunks], args.embeddings)
+        await dense.upsert(
+            [{**c, "values": v} for c, v in zip(chunks, vectors)], "bench"
+        )
+        query_vectors = await embed_all([q for q, _ in queries], args.embeddings)
+
+        results = {"dense": [], "bm25": [], "hybrid": []}
+        for (query, target), qvec in zip(queries, query_vectors):
+            dense_hits = await dense.query(qvec, 10, "bench")
+            lexical_hits = lexical.search("bench", query, 10)
+            hybrid_hits = reciprocal_rank_fusion([dense_hits, lexical_hits], 10)
+            for name, hits in (("dense", dense_hits), ("bm25", lexical_hits), ("hybrid", hybrid_hits)):
+                results[name].append(([h["id"] for h in hits], target))
+        for name, rankings in results.items():
+            recall, mrr = score(rankings)
+            print(f"{name:<7} recall@5 {recall:.3f}  MRR {mrr:.3f}")
+
+    with tempfile.TemporaryDirectory() as root:
+        lexical = LexicalIndex(root)
+        copies = math.ceil(args.scale / len(chunks))
+        for copy in range(copies):
+            lexical.add(
+                "scale",
+                [{"id": f"{copy}-{c['id']}", "metadata": c["metadata"]} for c in chunks],
+            )
+        rows = len(chunks) * copies
+        timings = []
+        for query, _ in queries:
+            start = time.perf_counter()
+            lexical._namespace("scale").search(query, 10)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            f"bm25 over {rows:,} chunks: p50 {statistics.median(timings):.2f} ms  "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms"
+        )
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--embeddings", choices=("fake", "azure"), default="fake")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scale", type=int, default=100000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+# benchmarks/bench_local_vector_store.py
+"""
+Recall and latency of LocalVectorStore vs. exact brute-force search.
+
+    python -m benchmarks.bench_local_vector_store --sizes 10000,100000,1000000 --dim 256
+
+Vectors are drawn from a Gaussian mixture (documents cluster by topic, like
+real chunk embeddings). For each size the store is bulk-loaded into a temp
+directory and fully compacted (so sizes above LOCAL_VECTOR_IVF_MIN_ROWS get an
+IVF index), then ``--queries`` held-out vectors are searched. recall@k is
+measured against exact NumPy search over the float32 vectors. 1M x 1536
+float32 needs ~6 GB, so the default dimension is lower; pass --dim 1536 on a
+bigger box.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from backend.local_vector_store import LocalVectorStore
+
+
+def mixture(rng, n, dim, centers):
+    labels = rng.integers(0, len(centers), n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(size, dim, queries, top_k, quantization, nprobe, rng):
+    centers = rng.standard_normal((max(16, size // 500), dim), dtype=np.float32)
+    data = mixture(rng, size, dim, centers)
+    probes = mixture(rng, queries, dim, centers)
+
+    with tempfile.TemporaryDirectory() as root:
+        store = LocalVectorStore(root=root, quantization=quantization, nprobe=nprobe)
+        start = time.perf_counter()
+        for offset in range(0, size, 50000):
+            block = data[offset : offset + 50000]
+            store.upsert_sync(
+                [
+                    {"id": str(offset + i), "values": vec, "metadata": {"page": 1}}
+                    for i, vec in enumerate(block)
+                ],
+                "bench",
+            )
+        store.compact_sync("bench", full=True)
+        build = time.perf_counter() - start
+
+        recalls, ann_ms, exact_ms = [], [], []
+        for probe in probes:
+            t0 = time.perf_counter()
+            exact = np.argpartition(-(data @ probe), top_k)[:top_k]
+            exact_ms.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            found = store.query_sync(probe, top_k, "bench")
+            ann_ms.append((time.perf_counter() - t0) * 1000)
+
+            truth = {str(i) for i in exact}
+            recalls.append(len(truth & {m["id"] for m in found}) / top_k)
+
+    print(
+        f"{size:>9,} rows  build {build:7.1f}s  recall@{top_k} {statistics.mean(recalls):.3f}  "
+        f"ann p50 {statistics.median(ann_ms):7.2f} ms p95 {percentile(ann_ms, 0.95):7.2f} ms  "
+        f"brute p50 {statistics.median(exact_ms):7.2f} ms p95 {percentile(exact_ms, 0.95):7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--quantization", default="int8", choices=("none", "float16", "int8"))
+    parser.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim} quantization={args.quantization} nprobe={args.nprobe}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        run(size, args.dim, args.queries, args.top_k, args.quantization, args.nprobe, rng)
+
+
+if __name__ == "__main__":
+    main()
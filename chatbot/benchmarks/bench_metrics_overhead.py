@@ -0,0 +1,116 @@
+# benchmarks/bench_metrics_overhead.py
+"""
+Cost of the pipeline instrumentation (timing spans, histograms, /metrics).
+
+    python -m benchmarks.bench_metrics_overhead --answers 20 --tokens 500
+
+* the cost of one ``span()`` against a bare pair of ``perf_counter`` calls;
+* the process CPU time of streaming whole answers through
+  ``stream_chat_with_documents`` from a local fake Azure OpenAI (running in
+  the same process) that sends tokens back to back, with metrics on and
+  off: the per-delta hot path;
+* the time to render ``/metrics`` once every stage has series.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+
+
+def configure_env(port: int, workdir: str):
+    os.environ.update(
+        {
+            "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{port}",
+            "AZURE_OPENAI_API_KEY": "fake-key",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "fake-chat",
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "fake-embedding",
+            "VECTOR_STORE": "memory",
+            "EMBEDDING_CACHE_PATH": f"{workdir}/embeddings.sqlite3",
+            "LEXICAL_INDEX_DIR": f"{workdir}/lexical",
+            "ANSWER_CACHE_ENABLED": "false",
+        }
+    )
+
+
+def bench_span(iterations: int):
+    from backend.metrics import span
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        time.perf_counter() - t
+    bare = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with span("bench", "user_1"):
+            pass
+    instrumented = (time.perf_counter() - start) / iterations
+    print(f"span(): {instrumented * 1e6:.2f} us  (bare perf_counter pair {bare * 1e6:.2f} us)")
+
+
+async def stream_answers(args, workdir: str):
+    import backend.metrics as metrics
+    from backend.azure_openai_utils import stream_chat_with_documents
+    from backend.pinecone_utils import embed_and_store
+
+    path = os.path.join(workdir, "manual.txt")
+    with open(path, "w") as f:
+        f.write("To turn on the headlights, rotate the light switch to AUTO.\n")
+    await embed_and_store(path, "user_1", filename="manual.txt")
+
+    async def one_answer():
+        start = time.process_time()
+        async for _ in stream_chat_with_documents("How do I turn on the headlights?", "user_1"):
+            pass
+        return time.process_time() - start
+
+    await one_answer()  # warm the client and caches
+    results = {}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            metrics.METRICS_ENABLED = enabled
+            results.setdefault(enabled, []).extend([await one_answer() for _ in range(args.answers)])
+    for enabled in (False, True):
+        label = "metrics on " if enabled else "metrics off"
+        per_token = statistics.median(results[enabled]) / args.tokens * 1e6
+        print(
+            f"{label}: CPU per answer p50={statistics.median(results[enabled]) * 1000:.2f} ms "
+            f"({per_token:.1f} us/token)"
+        )
+
+    start = time.perf_counter()
+    body = metrics.render_metrics()
+    print(f"/metrics render: {(time.perf_counter() - start) * 1000:.2f} ms for {len(body.splitlines())} lines")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8908)
+    parser.add_argument("--answers", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(args.port, workdir)
+        bench_span(args.iterations)
+        fake = start_fake_openai(
+            FakeOpenAIConfig(
+                embed_latency=0, chat_first_token_latency=0, chat_token_interval=0, chat_tokens=args.tokens
+            ),
+            args.port,
+        )
+        try:
+            asyncio.run(stream_answers(args, workdir))
+        finally:
+            fake.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
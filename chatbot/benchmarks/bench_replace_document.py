@@ -0,0 +1,136 @@
+# benchmarks/bench_replace_document.py
+"""
+Replacing a revised manual: delete + re-upload vs. incremental replacement.
+
+    python -m benchmarks.bench_replace_document --pages 500 --edited-pages 1
+
+Builds a ``--pages`` page PDF, ingests it as a stored Document, then edits
+``--edited-pages`` pages (one sentence rewritten on each) and brings the
+document up to date twice, from the same starting point:
+
+* ``delete + upload``: the previous workflow, the document's vectors deleted
+  and the new file ingested as a new Document (unchanged chunks are in the
+  embedding cache, as they would be on the server);
+* ``replace``: ``ingest_document`` on the same Document, which diffs chunk
+  hashes and writes only what changed.
+
+Reports embedding requests to a local fake Azure OpenAI, vectors upserted,
+deleted and metadata-updated (only the chunks a new version drops, marked
+retired before the swap), and wall time.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.bench_coalescing import configure_env
+from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+
+
+def write_pdf(path: str, pages: int, edited: set, revision: str = ""):
+    import fitz
+
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        lines = [
+            f"Page {number}, step {line}: tighten bolt {number}-{line} to {20 + line} Nm and check the seal."
+            for line in range(30)
+        ]
+        if number in edited:
+            lines[12] = f"Page {number}: REVISED ({revision}) torque for bolt {number}-12 is now 45 Nm."
+        page.insert_text((40, 40), "\n".join(lines), fontsize=8)
+    doc.save(path)
+
+
+async def run(args, fake: FakeOpenAIConfig, workdir: str):
+    from sqlalchemy import select
+    from backend.database import SessionLocal, create_tables
+    from backend.models import Document, DocumentChunk
+    from backend.pinecone_utils import delete_vectors, file_hash
+    from backend.routers.ingest import ingest_document
+    from backend.vector_store import InMemoryVectorStore, set_vector_store
+
+    class CountingStore(InMemoryVectorStore):
+        upserted = deleted = updated = 0
+
+        async def upsert(self, vectors, namespace):
+            CountingStore.upserted += len(vectors)
+            await super().upsert(vectors, namespace)
+
+        async def delete(self, ids, namespace):
+            CountingStore.deleted += len(ids)
+            await super().delete(ids, namespace)
+
+        async def update_metadata(self, updates, namespace):
+            CountingStore.updated += len(updates)
+            await super().update_metadata(updates, namespace)
+
+    await create_tables()
+    step = max(1, args.pages // max(1, args.edited_pages))
+    edited = set(range(step // 2, args.pages, step)[: args.edited_pages])
+    v1 = os.path.join(workdir, "v1.pdf")
+    write_pdf(v1, args.pages, set())
+    v1_hash = file_hash(v1)
+
+    async def new_document(path, content_hash):
+        async with SessionLocal() as db:
+            doc = Document(filename="manual.pdf", file_path=path, content_hash=content_hash, owner_id=None)
+            db.add(doc)
+            await db.commit()
+            return doc.id
+
+    for label in ("delete + upload", "replace"):
+        # Each run gets its own revision text, so its edits miss the embedding cache
+        v2 = os.path.join(workdir, f"v2-{label[0]}.pdf")
+        write_pdf(v2, args.pages, edited, label)
+        v2_hash = file_hash(v2)
+        set_vector_store(CountingStore())
+        namespace = f"user_{label[0]}"
+        doc_id = await new_document(v1, v1_hash)
+        await ingest_document(v1, namespace, v1_hash, "manual.pdf", doc_id)
+        CountingStore.upserted = CountingStore.deleted = CountingStore.updated = 0
+        embeds = fake.embed_requests
+
+        start = time.perf_counter()
+        if label == "replace":
+            await ingest_document(v2, namespace, v2_hash, "manual.pdf", doc_id)
+        else:
+            async with SessionLocal() as db:
+                ids = (await db.scalars(select(DocumentChunk.vector_id).where(DocumentChunk.document_id == doc_id))).all()
+                await delete_vectors(ids, namespace)
+                await db.delete(await db.get(Document, doc_id))
+                await db.commit()
+            await ingest_document(v2, namespace, v2_hash, "manual.pdf", await new_document(v2, v2_hash))
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:15s} embedding requests={fake.embed_requests - embeds:3d}  "
+            f"upserted={CountingStore.upserted:6d}  deleted={CountingStore.deleted:6d}  "
+            f"metadata updates={CountingStore.updated:6d}  wall={elapsed:6.2f} s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8912)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--edited-pages", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(args.port, workdir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+        os.environ["ARTIFACT_DIR"] = f"{workdir}/artifacts"
+        # SQLite takes one writer at a time; concurrent chunk registrations deadlock on it
+        os.environ["EMBED_CONCURRENCY"] = "1"
+        config = FakeOpenAIConfig(embed_latency=0.1)
+        fake = start_fake_openai(config, args.port)
+        try:
+            asyncio.run(run(args, config, workdir))
+        finally:
+            fake.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
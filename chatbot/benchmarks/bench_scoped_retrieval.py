@@ -0,0 +1,81 @@
+# benchmarks/bench_scoped_retrieval.py
+"""
+Queries scoped to a few documents as a tenant's document count grows.
+
+    python -m benchmarks.bench_scoped_retrieval --docs 50 200 800 --chunks 50
+
+Fills one namespace with ``--docs`` documents of ``--chunks`` chunks each,
+then times queries filtered to ``--scope`` of them by
+``{"doc_id": {"$in": [...]}}``. ``partitioned`` is that filter as retrieval
+sends it, which scores only the rows of the selected documents.
+``full scan`` is the same filter wrapped in ``$or``, which the partition
+index does not recognise, so every row of the namespace is scored and
+masked as before.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from backend.local_vector_store import LocalVectorStore
+from backend.vector_store import InMemoryVectorStore
+
+
+async def fill(store, docs: int, chunks: int, dim: int, rng):
+    for doc_id in range(docs):
+        values = rng.standard_normal((chunks, dim), dtype=np.float32)
+        await store.upsert(
+            [
+                {"id": f"{doc_id}-{i}", "values": values[i], "metadata": {"doc_id": doc_id, "file": f"{doc_id}.pdf", "text": "..."}}
+                for i in range(chunks)
+            ],
+            "user_1",
+        )
+
+
+async def timed(store, queries, metadata_filter) -> float:
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        await store.query(query, 20, "user_1", filter=metadata_filter)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+async def run(args):
+    rng = np.random.default_rng(0)
+    queries = [rng.standard_normal(args.dim).tolist() for _ in range(args.queries)]
+    for label, make_store in (
+        ("memory", lambda workdir: InMemoryVectorStore()),
+        ("local", lambda workdir: LocalVectorStore(root=workdir)),
+    ):
+        for docs in args.docs:
+            with tempfile.TemporaryDirectory() as workdir:
+                store = make_store(workdir)
+                await fill(store, docs, args.chunks, args.dim, rng)
+                scope = {"doc_id": {"$in": list(range(0, docs, docs // args.scope))[: args.scope]}}
+                partitioned = await timed(store, queries, scope)
+                full_scan = await timed(store, queries, {"$or": [scope]})
+                print(
+                    f"{label:6s} docs={docs:4d} rows={docs * args.chunks:6d}  "
+                    f"partitioned p50={partitioned:6.2f} ms  full scan p50={full_scan:7.2f} ms"
+                )
+                await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--scope", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/bench_sse_stream.py
+"""
+Chat streaming over SSE: writes per answer, time to first render, disconnects.
+
+    python -m benchmarks.bench_sse_stream --answers 10 --tokens 300
+
+Serves the app with uvicorn against a local fake Azure OpenAI, the in-memory
+vector store and SQLite, then streams ``/guest-chat/stream`` answers:
+
+* once with coalescing off (one SSE event per rendered fragment) and once
+  with the configured coalescing window, reporting events and bytes per
+  answer, time to the first rendered HTML and total time;
+* once more closing the connection after the first event, reporting how
+  many model tokens the fake upstream still produced (the rest of the
+  answer would have been generated for nobody without cancellation).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+
+SAMPLE_TEXT = (
+    "To turn on the headlights, rotate the light switch on the left stalk to AUTO.\n\n"
+    "Check the tyre pressure every two weeks. Recommended pressure is 32 psi.\n"
+)
+
+
+def configure_env(port: int, workdir: str):
+    os.environ.update(
+        {
+            "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{port}",
+            "AZURE_OPENAI_API_KEY": "fake-key",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "fake-chat",
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "fake-embedding",
+            "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+            "VECTOR_STORE": "memory",
+            "EMBEDDING_CACHE_PATH": f"{workdir}/embeddings.sqlite3",
+            "LEXICAL_INDEX_DIR": f"{workdir}/lexical",
+            "ANSWER_CACHE_ENABLED": "false",
+            "WARM_UP_ON_STARTUP": "false",
+        }
+    )
+
+
+def start_app(port: int):
+    import uvicorn
+    from backend.main import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def stream_answer(client, url: str, stop_after_first: bool = False) -> dict:
+    start = time.perf_counter()
+    first_html = None
+    events = 0
+    size = 0
+    async with client.stream("POST", url, data={"query": "How do I turn on the headlights?"}) as res:
+        async for line in res.aiter_lines():
+            size += len(line) + 1
+            if line.startswith("data:") and '"html"' in line:
+                events += 1
+                if first_html is None:
+                    first_html = time.perf_counter() - start
+                    if stop_after_first:
+                        break
+            elif line.startswith("event: done"):
+                break
+    return {"events": events, "bytes": size, "first_html": first_html, "total": time.perf_counter() - start}
+
+
+def report(label: str, results: list[dict]):
+    print(
+        f"{label:<22} events/answer={statistics.mean(r['events'] for r in results):6.1f}  "
+        f"bytes/answer={statistics.mean(r['bytes'] for r in results):7.0f}  "
+        f"first render p50={statistics.median(r['first_html'] for r in results) * 1000:6.1f} ms  "
+        f"total p50={statistics.median(r['total'] for r in results) * 1000:7.1f} ms"
+    )
+
+
+async def seed(workdir: str, session: str):
+    from backend.database import create_tables, dispose_engine
+    from backend.openai_client import close_client
+    from backend.pinecone_utils import embed_and_store
+
+    await create_tables()
+
+    path = os.path.join(workdir, "manual.txt")
+    with open(path, "w") as f:
+        f.write(SAMPLE_TEXT)
+    await embed_and_store(path, f"session_{session}", filename="manual.txt")
+    # The shared HTTP and DB pools belong to this event loop; the app opens its own
+    await close_client()
+    await dispose_engine()
+
+
+async def run(args, fake_config: FakeOpenAIConfig, session: str):
+    import httpx
+    import backend.sse as sse
+
+    url = f"http://127.0.0.1:{args.app_port}/guest-chat/stream"
+    async with httpx.AsyncClient(cookies={"guest_session": session}, timeout=60) as client:
+        configured = sse.SSE_COALESCE_MS
+        for label, coalesce_ms in (("per fragment", 0.0), (f"coalesced {configured:.0f} ms", configured)):
+            sse.SSE_COALESCE_MS = coalesce_ms
+            results = [await stream_answer(client, url) for _ in range(args.answers)]
+            report(label, results)
+        sse.SSE_COALESCE_MS = configured
+
+        before = fake_config.chat_chunks_sent
+        await stream_answer(client, url, stop_after_first=True)
+        # Long enough for an uncancelled upstream to finish the whole answer
+        await asyncio.sleep(fake_config.chat_token_interval * fake_config.chat_tokens + 1)
+        produced = fake_config.chat_chunks_sent - before
+        print(f"disconnect after first event: upstream produced {produced}/{fake_config.chat_tokens} tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8905)
+    parser.add_argument("--app-port", type=int, default=8906)
+    parser.add_argument("--answers", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(args.port, workdir)
+        fake_config = FakeOpenAIConfig(
+            embed_latency=0.01,
+            chat_first_token_latency=0.2,
+            chat_token_interval=args.token_interval,
+            chat_tokens=args.tokens,
+        )
+        fake = start_fake_openai(fake_config, args.port)
+        asyncio.run(seed(workdir, "bench"))
+        app = start_app(args.app_port)
+        try:
+            asyncio.run(run(args, fake_config, "bench"))
+        finally:
+            app.should_exit = True
+            fake.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
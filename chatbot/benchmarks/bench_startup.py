@@ -0,0 +1,111 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of a worker: import time, lifespan startup and time to ready.
+
+    python -m benchmarks.bench_startup --runs 5 [--max-import-ms 1500]
+
+Each run is a fresh interpreter with SQLite, the in-memory vector store and
+placeholder Azure credentials pointing at a closed local port, so nothing
+touches the network and no real credentials are needed (suitable for CI).
+Reports the median of each phase and which heavy libraries were already
+loaded after ``import backend.main``; with ``--max-import-ms`` the script
+exits non-zero when the median import time exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("openai", "httpx", "pinecone", "fitz", "langchain", "aiomysql", "aiosqlite", "jinja2")
+
+PROBE = r"""
+import json, sys, time
+from fastapi.testclient import TestClient  # harness only, not part of the app's cost
+
+start = time.perf_counter()
+import backend.main
+imported = time.perf_counter()
+loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+with TestClient(backend.main.app) as client:
+    started = time.perf_counter()
+    while client.get("/ready").status_code != 200:
+        if time.perf_counter() - started > 30:
+            raise SystemExit("not ready after 30s: " + client.get("/ready").text)
+        time.sleep(0.005)
+    ready = time.perf_counter()
+    client.get("/")
+    first_page = time.perf_counter()
+
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (started - imported) * 1000,
+    "ready_ms": (ready - start) * 1000,
+    "first_page_ms": (first_page - ready) * 1000,
+    "loaded_after_import": loaded,
+}))
+"""
+
+
+def probe_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        {
+            "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+            "VECTOR_STORE": "memory",
+            "EMBEDDING_CACHE_PATH": f"{workdir}/embeddings.sqlite3",
+            "LEXICAL_INDEX_DIR": f"{workdir}/lexical",
+            "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:9",
+            "AZURE_OPENAI_API_KEY": "placeholder",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "chat",
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "embedding",
+            "PINECONE_API_KEY": "",
+        }
+    )
+    return env
+
+
+def run_once(workdir: str) -> dict:
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + PROBE
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=probe_env(workdir),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise SystemExit(f"startup probe failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # The app expects its tables; create them once outside the timed runs
+        subprocess.run(
+            [sys.executable, "-m", "backend.init_db"],
+            env=probe_env(workdir),
+            check=True,
+        )
+        results = [run_once(workdir) for _ in range(args.runs)]
+
+    for phase in ("import_ms", "startup_ms", "ready_ms", "first_page_ms"):
+        values = [r[phase] for r in results]
+        print(f"{phase:<14} median={statistics.median(values):8.1f}  min={min(values):8.1f}  max={max(values):8.1f}")
+    print("heavy modules loaded by import:", ", ".join(results[-1]["loaded_after_import"]) or "none")
+
+    median_import = statistics.median(r["import_ms"] for r in results)
+    if args.max_import_ms is not None and median_import > args.max_import_ms:
+        print(f"import time {median_import:.0f} ms exceeds budget {args.max_import_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
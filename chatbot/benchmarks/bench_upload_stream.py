@@ -0,0 +1,124 @@
+# benchmarks/bench_upload_stream.py
+"""
+Large uploads: streamed to disk vs. spooled by the form parser and copied.
+
+    python -m benchmarks.bench_upload_stream --size-mb 64 --rounds 3
+
+Serves two endpoints from one local uvicorn server: ``streamed`` goes
+through ``backend.uploads.receive_form_file`` (body parsed as it arrives,
+written in UPLOAD_CHUNK_SIZE blocks through aiofiles and hashed on the way),
+``spooled`` is the previous path (``UploadFile`` spooled to a temporary
+file by the form parser, then copied and hashed with blocking reads inside
+the handler). While each upload runs, a client pings ``/ping`` every 10 ms;
+the ping latency shows how long the event loop was blocked.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+
+def create_app():
+    from fastapi import FastAPI, Request
+    from backend.uploads import receive_form_file
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    @app.post("/streamed")
+    async def streamed(request: Request):
+        _, file_path, content_hash, size = await receive_form_file(request, 1 << 40, "too large")
+        os.remove(file_path)
+        return {"hash": content_hash, "size": size}
+
+    @app.post("/spooled")
+    async def spooled(request: Request):
+        form = await request.form()
+        upload = form["file"]
+        digest = hashlib.sha256()
+        path = os.path.join("uploads", ".spooled.part")
+        with open(path, "wb") as f:
+            while block := upload.file.read(1024 * 1024):
+                digest.update(block)
+                f.write(block)
+        size = os.path.getsize(path)
+        os.remove(path)
+        await form.close()
+        return {"hash": digest.hexdigest(), "size": size}
+
+    return app
+
+
+def start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def one_upload(client, path: str, body: bytes) -> tuple[float, list[float]]:
+    pings = []
+    done = asyncio.Event()
+
+    async def pinger():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/ping")
+            pings.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(pinger())
+    start = time.perf_counter()
+    response = await client.post(path, files={"file": ("manual.pdf", body, "application/pdf")})
+    elapsed = time.perf_counter() - start
+    done.set()
+    await task
+    assert response.json()["hash"] == hashlib.sha256(body).hexdigest()
+    return elapsed, pings
+
+
+async def run(args):
+    body = os.urandom(args.size_mb * 1024 * 1024)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=300) as client:
+        for path in ("/spooled", "/streamed"):
+            times, pings = [], []
+            for _ in range(args.rounds):
+                elapsed, round_pings = await one_upload(client, path, body)
+                times.append(elapsed)
+                pings.extend(round_pings)
+            print(
+                f"{path[1:]:9s} {args.size_mb / statistics.median(times):7.1f} MB/s  "
+                f"ping p50={statistics.median(pings) * 1000:.1f} ms max={max(pings) * 1000:.1f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8909)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs("uploads")
+        server = start_server(args.port)
+        try:
+            asyncio.run(run(args))
+        finally:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/fake_openai.py
+"""
+Local stand-in for the Azure OpenAI embeddings / chat completions API.
+
+Run it standalone with ``python -m benchmarks.fake_openai --port 8901`` or start
+it in-process with ``start_fake_openai()``. Latencies are configurable so the
+benchmarks can model a slow upstream without spending real quota.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+EMBED_DIM = 1536
+
+
+class FakeOpenAIConfig:
+    def __init__(
+        self,
+        embed_latency: float = 0.2,
+        chat_first_token_latency: float = 0.3,
+        chat_token_interval: float = 0.02,
+        chat_tokens: int = 60,
+        dim: int = EMBED_DIM,
+    ):
+        self.embed_latency = embed_latency
+        self.chat_first_token_latency = chat_first_token_latency
+        self.chat_token_interval = chat_token_interval
+        self.chat_tokens = chat_tokens
+        self.dim = dim
+        self.chat_chunks_sent = 0
+        self.embed_requests = 0
+        self.chat_requests = 0
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> list[float]:
+    """Deterministic unit-length pseudo-embedding for ``text``."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    vec = np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    return (vec / np.linalg.norm(vec)).round(6).tolist()
+
+
+def create_app(config: FakeOpenAIConfig) -> Starlette:
+    async def embeddings(request: Request):
+        config.embed_requests += 1
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(config.embed_latency)
+        data = [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(t, config.dim)}
+            for i, t in enumerate(inputs)
+        ]
+        tokens = sum(len(t) // 4 + 1 for t in inputs)
+        return JSONResponse(
+            {
+                "object": "list",
+                "data": data,
+                "model": request.path_params["deployment"],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        )
+
+    async def chat_completions(request: Request):
+        config.chat_requests += 1
+        body = await request.json()
+        model = request.path_params["deployment"]
+        words = [f"word{i}" for i in range(config.chat_tokens)]
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(
+                config.chat_first_token_latency
+                + config.chat_token_interval * config.chat_tokens
+            )
+            return JSONResponse(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": " ".join(words)},
+                        }
+                    ],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+                }
+            )
+
+        async def stream():
+            await asyncio.sleep(config.chat_first_token_latency)
+            for i, word in enumerate(words):
+                # Like the real service, stop generating once the caller hangs up
+                if await request.is_disconnected():
+                    return
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                config.chat_chunks_sent += 1
+                if i + 1 < len(words):
+                    await asyncio.sleep(config.chat_token_interval)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return Starlette(
+        routes=[
+            Route("/openai/deployments/{deployment}/embeddings", embeddings, methods=["POST"]),
+            Route("/openai/deployments/{deployment}/chat/completions", chat_completions, methods=["POST"]),
+        ]
+    )
+
+
+def start_fake_openai(config: FakeOpenAIConfig, port: int = 8901) -> uvicorn.Server:
+    """Start the fake server on a background thread and wait until it listens."""
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--embed-latency", type=float, default=0.2)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=60)
+    args = parser.parse_args()
+    config = FakeOpenAIConfig(
+        embed_latency=args.embed_latency,
+        chat_first_token_latency=args.first_token_latency,
+        chat_token_interval=args.token_interval,
+        chat_tokens=args.tokens,
+    )
+    uvicorn.run(create_app(config), host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,486 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test against local stand-ins for Azure OpenAI and Pinecone.
+
+    python -m benchmarks.load_test --duration 30 --chat-concurrency 16 --guest-concurrency 8
+
+Starts the fake OpenAI-compatible server (``benchmarks.fake_openai``) and the
+app (uvicorn, SQLite, the in-memory vector store) as separate processes in a
+scratch directory, so no quota or production index is touched. Setup signs
+up ``--users`` accounts, uploads one document per account and per guest
+worker, and waits for ingestion. The load phase then runs, concurrently:
+
+* ``upload``:       POST /upload of a fresh document as a logged-in user,
+                    plus ``ingest``, the time until that upload's job is done;
+* ``chat_stream``:  POST /chat/stream as a logged-in user, read to ``done``;
+* ``guest_stream``: POST /guest-chat/stream in a guest session, read to ``done``.
+
+Per scenario it reports throughput, p50/p95/p99 latency, time to first byte
+(response headers) and time to the first rendered answer fragment, plus the
+app's resident memory. Each run is saved as JSON under ``--results-dir`` and
+compared with the previous run of the same configuration; with
+``--fail-on-regression`` the exit status is 1 when a p95 latency or the
+throughput of any scenario got worse by more than ``--regression-threshold``.
+"""
+import argparse
+import asyncio
+import glob
+import http.cookiejar
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RESULTS_DIR = os.path.join(CHATBOT_DIR, "benchmarks", "results")
+
+QUESTIONS = (
+    "How do I turn on the headlights?",
+    "What is the recommended tyre pressure?",
+    "How often should the oil be changed?",
+    "Where is the spare wheel stored?",
+    "What does the engine warning light mean?",
+)
+VOCABULARY = (
+    "engine brake tyre pressure headlights switch warning light oil filter coolant battery "
+    "wiper fuse panel seat belt airbag steering wheel mirror gear clutch service interval "
+    "check replace inspect rotate press hold release turn adjust every months kilometres"
+).split()
+
+
+def synthetic_document(seed: int, size_kb: int) -> bytes:
+    """A unique manual-like text document of about ``size_kb`` KB."""
+    rng = random.Random(seed)
+    paragraphs, size = [f"Manual {seed}\n"], 0
+    while size < size_kb * 1024:
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20)))
+        paragraph = sentence.capitalize() + ". " + rng.choice(QUESTIONS) + "\n"
+        paragraphs.append(paragraph)
+        size += len(paragraph)
+    return "\n".join(paragraphs).encode()
+
+
+def cookieless_jar() -> http.cookiejar.CookieJar:
+    # Sessions are passed explicitly per request, so workers can share a client
+    return http.cookiejar.CookieJar(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: dict[str, list[dict]] = {}
+        self.errors: dict[str, int] = {}
+
+    def add(self, scenario: str, **sample):
+        self.samples.setdefault(scenario, []).append(sample)
+
+    def error(self, scenario: str):
+        self.errors[scenario] = self.errors.get(scenario, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        out = {}
+        for scenario in sorted(set(self.samples) | set(self.errors)):
+            rows = self.samples.get(scenario, [])
+            stats = {
+                "requests": len(rows),
+                "errors": self.errors.get(scenario, 0),
+                "throughput": len(rows) / elapsed,
+            }
+            for field in ("latency", "ttfb", "first_html"):
+                values = [r[field] * 1000 for r in rows if r.get(field) is not None]
+                if values:
+                    stats[field] = {
+                        "p50": percentile(values, 50),
+                        "p95": percentile(values, 95),
+                        "p99": percentile(values, 99),
+                    }
+            out[scenario] = stats
+        return out
+
+
+class MemorySampler:
+    """Resident memory of a process from /proc (Linux), sampled periodically."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.samples: list[int] = []
+
+    def rss_kb(self, field: str = "VmRSS") -> int | None:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith(field + ":"):
+                        return int(line.split()[1])
+        except OSError:
+            return None
+        return None
+
+    async def run(self, stop: asyncio.Event, interval: float = 0.25):
+        while not stop.is_set():
+            rss = self.rss_kb()
+            if rss is not None:
+                self.samples.append(rss)
+            await asyncio.sleep(interval)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {}
+        peak = self.rss_kb("VmHWM")
+        return {
+            "start_mb": self.samples[0] / 1024,
+            "end_mb": self.samples[-1] / 1024,
+            "peak_mb": (peak or max(self.samples)) / 1024,
+        }
+
+
+class LoadTest:
+    def __init__(self, args, base: str):
+        self.args = args
+        self.base = base
+        self.recorder = Recorder()
+        self.user_sessions: list[str] = []
+        self.guest_sessions: list[str] = []
+        self.doc_seed = 0
+
+    def next_document(self) -> tuple[str, bytes]:
+        self.doc_seed += 1
+        return f"manual_{self.doc_seed}.txt", synthetic_document(self.doc_seed, self.args.doc_kb)
+
+    async def wait_for_job(self, client, job_id: str, cookies: str, timeout: float = 120) -> bool:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            response = await client.get(f"/ingest-jobs/{job_id}", headers={"Cookie": cookies})
+            if response.status_code == 200 and response.json()["status"] in ("done", "failed"):
+                return response.json()["status"] == "done"
+            await asyncio.sleep(0.1)
+        return False
+
+    # ------------------------------------------------------------------ setup
+
+    async def setup(self, client):
+        for i in range(self.args.users):
+            form = {"username": f"load{i}", "email": f"load{i}@example.com", "password": "password"}
+            await client.post("/signup", data=form, follow_redirects=False)
+            response = await client.post(
+                "/login", data={"email": form["email"], "password": "password"}, follow_redirects=False
+            )
+            self.user_sessions.append(response.cookies["session"])
+
+        jobs = []
+        for session in self.user_sessions:
+            job_id = await self.upload(client, f"session={session}")
+            jobs.append(self.wait_for_job(client, job_id, f"session={session}"))
+        for _ in range(self.args.guest_concurrency):
+            name, body = self.next_document()
+            response = await client.post(
+                "/upload-guest", files={"file": (name, body, "text/plain")}, follow_redirects=False
+            )
+            session = response.cookies["guest_session"]
+            self.guest_sessions.append(session)
+            job_id = response.headers["location"].split("job=")[1]
+            jobs.append(self.wait_for_job(client, job_id, f"guest_session={session}"))
+        if not all(await asyncio.gather(*jobs)):
+            raise SystemExit("setup ingestion failed")
+
+    async def upload(self, client, cookies: str) -> str:
+        name, body = self.next_document()
+        response = await client.post(
+            "/upload",
+            files={"file": (name, body, "text/plain")},
+            headers={"Cookie": cookies},
+            follow_redirects=False,
+        )
+        location = response.headers.get("location", "")
+        if response.status_code != 302 or "job=" not in location:
+            raise RuntimeError(f"upload failed: {response.status_code} {location}")
+        return location.split("job=")[1]
+
+    # -------------------------------------------------------------- scenarios
+
+    async def stream_answer(self, client, scenario: str, path: str, cookies: str):
+        start = time.perf_counter()
+        ttfb = first_html = None
+        done = False
+        data = {"query": random.choice(QUESTIONS)}
+        async with client.stream("POST", path, data=data, headers={"Cookie": cookies}) as response:
+            ttfb = time.perf_counter() - start
+            if response.status_code != 200:
+                raise RuntimeError(f"{path}: {response.status_code}")
+            async for line in response.aiter_lines():
+                if first_html is None and line.startswith("data:") and '"html"' in line:
+                    first_html = time.perf_counter() - start
+                elif line.startswith("event: error"):
+                    raise RuntimeError(f"{path}: error event")
+                elif line.startswith("event: done"):
+                    done = True
+                    break
+        if not done:
+            raise RuntimeError(f"{path}: stream ended without done")
+        self.recorder.add(scenario, latency=time.perf_counter() - start, ttfb=ttfb, first_html=first_html)
+
+    async def chat_worker(self, client, deadline: float):
+        while time.perf_counter() < deadline:
+            cookies = f"session={random.choice(self.user_sessions)}"
+            await self.run_scenario("chat_stream", self.stream_answer(client, "chat_stream", "/chat/stream", cookies))
+
+    async def guest_worker(self, client, session: str, deadline: float):
+        cookies = f"guest_session={session}"
+        while time.perf_counter() < deadline:
+            await self.run_scenario(
+                "guest_stream", self.stream_answer(client, "guest_stream", "/guest-chat/stream", cookies)
+            )
+
+    async def upload_worker(self, client, deadline: float):
+        while time.perf_counter() < deadline:
+            cookies = f"session={random.choice(self.user_sessions)}"
+
+            async def one_upload():
+                start = time.perf_counter()
+                job_id = await self.upload(client, cookies)
+                self.recorder.add("upload", latency=time.perf_counter() - start)
+                if await self.wait_for_job(client, job_id, cookies):
+                    self.recorder.add("ingest", latency=time.perf_counter() - start)
+                else:
+                    self.recorder.error("ingest")
+
+            await self.run_scenario("upload", one_upload())
+
+    async def run_scenario(self, scenario: str, coro):
+        try:
+            await coro
+        except Exception as e:
+            self.recorder.error(scenario)
+            if self.args.verbose:
+                print(f"[{scenario}] {e}")
+
+    async def run(self, app_pid: int) -> dict:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+        async with httpx.AsyncClient(
+            base_url=self.base, timeout=120, limits=limits, cookies=cookieless_jar()
+        ) as client:
+            await self.setup(client)
+
+            memory = MemorySampler(app_pid)
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(memory.run(stop))
+            deadline = time.perf_counter() + self.args.duration
+            start = time.perf_counter()
+            workers = (
+                [self.chat_worker(client, deadline) for _ in range(self.args.chat_concurrency)]
+                + [self.guest_worker(client, s, deadline) for s in self.guest_sessions]
+                + [self.upload_worker(client, deadline) for _ in range(self.args.upload_concurrency)]
+            )
+            await asyncio.gather(*workers)
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await sampler
+
+        return {"elapsed_s": elapsed, "scenarios": self.recorder.summary(elapsed), "memory": memory.summary()}
+
+
+# ---------------------------------------------------------------- processes
+
+
+def app_env(workdir: str, fake_port: int, args) -> dict:
+    env = dict(os.environ)
+    env.update(
+        {
+            "PYTHONPATH": CHATBOT_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+            "TEMPLATES_DIR": os.path.join(CHATBOT_DIR, "frontend", "templates"),
+            "DATABASE_URL": f"sqlite:///{workdir}/load.db",
+            "VECTOR_STORE": "memory",
+            "EMBEDDING_CACHE_PATH": f"{workdir}/embeddings.sqlite3",
+            "LEXICAL_INDEX_DIR": f"{workdir}/lexical",
+            "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{fake_port}",
+            "AZURE_OPENAI_API_KEY": "fake-key",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "fake-chat",
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "fake-embedding",
+            "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+            "ADMISSION_ENABLED": "true" if args.admission_rate else "false",
+            "ADMISSION_RATE": str(args.admission_rate),
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    return env
+
+
+async def wait_until_ready(base: str, process: subprocess.Popen, timeout: float = 60):
+    async with httpx.AsyncClient() as client:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"{base} exited with status {process.returncode}")
+            try:
+                if (await client.get(f"{base}/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise SystemExit(f"{base} not ready after {timeout}s")
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=CHATBOT_DIR, capture_output=True, text=True
+        )
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+# ------------------------------------------------------------------ results
+
+
+def config_of(args) -> dict:
+    keys = (
+        "duration", "users", "chat_concurrency", "guest_concurrency", "upload_concurrency",
+        "doc_kb", "embed_latency", "first_token_latency", "token_interval", "tokens", "answer_cache",
+        "admission_rate",
+    )
+    return {k: getattr(args, k) for k in keys}
+
+
+def previous_result(results_dir: str, config: dict) -> dict | None:
+    for path in sorted(glob.glob(os.path.join(results_dir, "load_test-*.json")), reverse=True):
+        with open(path) as f:
+            result = json.load(f)
+        if result.get("config") == config:
+            result["path"] = path
+            return result
+    return None
+
+
+def print_report(result: dict):
+    print(f"\n{'scenario':<13} {'req':>5} {'err':>4} {'req/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttfb p95':>9} {'first html p95':>15}")
+    for scenario, s in result["scenarios"].items():
+        latency = s.get("latency", {})
+        print(
+            f"{scenario:<13} {s['requests']:>5} {s['errors']:>4} {s['throughput']:>7.2f} "
+            f"{latency.get('p50', float('nan')):>8.1f} {latency.get('p95', float('nan')):>8.1f} "
+            f"{latency.get('p99', float('nan')):>8.1f} "
+            f"{s.get('ttfb', {}).get('p95', float('nan')):>9.1f} "
+            f"{s.get('first_html', {}).get('p95', float('nan')):>15.1f}"
+        )
+    memory = result["memory"]
+    if memory:
+        print(f"app memory: start {memory['start_mb']:.0f} MB, end {memory['end_mb']:.0f} MB, "
+              f"peak {memory['peak_mb']:.0f} MB")
+
+
+def compare(result: dict, previous: dict, threshold: float) -> list[str]:
+    """Print the change against ``previous``; returns the regressions beyond ``threshold``."""
+    print(f"\nvs. {os.path.basename(previous['path'])} ({previous.get('revision') or 'unknown revision'}):")
+    regressions = []
+    for scenario, s in result["scenarios"].items():
+        before = previous["scenarios"].get(scenario)
+        if not before:
+            continue
+        changes = []
+        if before["throughput"]:
+            change = s["throughput"] / before["throughput"] - 1
+            changes.append(f"req/s {change:+.1%}")
+            if change < -threshold:
+                regressions.append(f"{scenario} throughput {change:+.1%}")
+        for field in ("latency", "first_html"):
+            now, then = s.get(field, {}).get("p95"), before.get(field, {}).get("p95")
+            if now is not None and then:
+                change = now / then - 1
+                changes.append(f"{field} p95 {change:+.1%}")
+                if change > threshold:
+                    regressions.append(f"{scenario} {field} p95 {change:+.1%}")
+        print(f"  {scenario:<13} " + ", ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--chat-concurrency", type=int, default=16)
+    parser.add_argument("--guest-concurrency", type=int, default=8)
+    parser.add_argument("--upload-concurrency", type=int, default=2)
+    parser.add_argument("--doc-kb", type=int, default=32)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=150)
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument(
+        "--admission-rate", type=float, default=0, help="answers admitted per second (0: admission control off)"
+    )
+    parser.add_argument("--port", type=int, default=8920)
+    parser.add_argument("--fake-port", type=int, default=8921)
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--regression-threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory() as workdir:
+        env = app_env(workdir, args.fake_port, args)
+        subprocess.run([sys.executable, "-m", "backend.init_db"], cwd=workdir, env=env, check=True)
+        fake = subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+                "--embed-latency", str(args.embed_latency),
+                "--first-token-latency", str(args.first_token_latency),
+                "--token-interval", str(args.token_interval),
+                "--tokens", str(args.tokens),
+            ],
+            cwd=workdir,
+            env=env,
+        )
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=workdir,
+            env=env,
+        )
+        try:
+            asyncio.run(wait_until_ready(base, app))
+            outcome = asyncio.run(LoadTest(args, base).run(app.pid))
+        finally:
+            for process in (app, fake):
+                process.terminate()
+                process.wait()
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "config": config_of(args),
+        **outcome,
+    }
+    print_report(result)
+
+    previous = previous_result(args.results_dir, result["config"])
+    regressions = compare(result, previous, args.regression_threshold) if previous else []
+    if not args.no_save:
+        os.makedirs(args.results_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(args.results_dir, f"load_test-{stamp}.json")
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nsaved {path}")
+    if regressions:
+        print("regressions: " + "; ".join(regressions))
+        if args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
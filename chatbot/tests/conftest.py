@@ -0,0 +1,36 @@
+import asyncio
+import os
+import tempfile
+import pytest
+
+# Configuration is read at import time: point everything at a scratch directory
+# (SQLite database, in-memory vector store) before the backend is imported.
+_workdir = tempfile.mkdtemp(prefix="chatmate-tests-")
+os.environ.update(
+    {
+        "DATABASE_URL": f"sqlite:///{_workdir}/test.db",
+        "VECTOR_STORE": "memory",
+        "LEXICAL_INDEX_DIR": f"{_workdir}/lexical",
+        "EMBEDDING_CACHE_PATH": f"{_workdir}/embeddings.sqlite3",
+        "ARTIFACT_DIR": f"{_workdir}/artifacts",
+        "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:9",
+        "AZURE_OPENAI_API_KEY": "test-key",
+    }
+)
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Run a coroutine on one event loop shared by the session (the DB pool is bound to it)."""
+    from backend.database import create_tables, dispose_engine
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(create_tables())
+    yield loop.run_until_complete
+    loop.run_until_complete(dispose_engine())
+    loop.close()
+
+
+@pytest.fixture
+def workdir():
+    return _workdir
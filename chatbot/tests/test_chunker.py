@@ -0,0 +1,38 @@
+from backend.chunker import chunk_pages
+
+
+def test_short_chunk_is_not_repeated_as_overlap():
+    paragraph = " ".join(f"Sentence {i} explains the maintenance step in detail." for i in range(80))
+    chunks = list(chunk_pages([(1, "Short intro line here.\n\n" + paragraph)]))
+    keys = [(page, offset) for page, offset, _ in chunks]
+    assert len(keys) == len(set(keys))
+    assert chunks[0][2] == "Short intro line here."
+    assert not chunks[1][2].startswith("Short intro")
+
+
+def test_offsets_strictly_increase_within_a_page():
+    text = "\n\n".join(f"Part {i}. Check the seal. Tighten bolt {i}." * (i % 7 + 1) for i in range(200))
+    offsets = [offset for _, offset, _ in chunk_pages([(1, text)], max_tokens=64, overlap_tokens=16)]
+    assert offsets == sorted(set(offsets))
+
+
+def test_block_boundaries_do_not_change_chunks():
+    text = "Intro.\n\n" + " ".join(f"Step {i} tightens bolt {i} to spec." for i in range(400)) + "\n\nOutro."
+    whole = list(chunk_pages([(1, text)], max_tokens=64, overlap_tokens=16))
+    blocks = [(1, text[i : i + 37]) for i in range(0, len(text), 37)]
+    assert list(chunk_pages(blocks, max_tokens=64, overlap_tokens=16)) == whole
+
+
+def test_paragraph_without_breaks_is_passed_on_as_it_arrives():
+    held = []
+
+    def blocks():
+        for i in range(2000):
+            yield 1, f"Line {i} of an endless log without blank lines. "
+            held.append(i)
+
+    chunks = chunk_pages(blocks(), max_tokens=64, overlap_tokens=16)
+    next(chunks)
+    # The first chunk is out long before the input ends
+    assert len(held) < 50
+    assert sum(1 for _ in chunks) > 100
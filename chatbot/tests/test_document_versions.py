@@ -0,0 +1,66 @@
+import hashlib
+import os
+import backend.pinecone_utils as pinecone_utils
+import backend.routers.ingest as ingest
+from backend.chunker import chunk_pages
+from backend.database import SessionLocal
+from backend.document_versions import document_states, visible_matches
+from backend.models import Document
+from backend.vector_store import InMemoryVectorStore, set_vector_store
+
+
+def fake_vector(text):
+    return list(hashlib.sha256(text.encode()).digest()[:16])
+
+
+def write(workdir, name, paragraphs):
+    path = os.path.join(workdir, name)
+    with open(path, "w") as f:
+        f.write("\n\n".join(paragraphs))
+    return path
+
+
+def texts(path):
+    with open(path) as f:
+        return {text for _, _, text in chunk_pages([(1, f.read())])}
+
+
+def test_new_version_replaces_the_old_one_in_one_step(run, workdir, monkeypatch):
+    async def fake_embeddings(chunks):
+        return [fake_vector(c) for c in chunks]
+
+    monkeypatch.setattr(pinecone_utils, "embed_text_cached", fake_embeddings)
+    store = InMemoryVectorStore()
+    set_vector_store(store)
+    paragraphs = [f"Step {i}: check the oil level and tighten bolt {i}. " * 8 for i in range(60)]
+    v1 = write(workdir, "manual-v1.txt", paragraphs)
+    paragraphs[30] = "Step 30: the coolant is now replaced every 5000 km. " * 8
+    v2 = write(workdir, "manual-v2.txt", paragraphs)
+
+    async def visible():
+        matches = await store.query(fake_vector("oil"), 1000, "user_7")
+        states = await document_states({m["metadata"]["doc_id"] for m in matches})
+        return {m["metadata"]["text"] for m in visible_matches(matches, states)}
+
+    seen = {}
+    swap_version = ingest.swap_version
+
+    async def observed_swap(*args):
+        seen["before"] = await visible()
+        await swap_version(*args)
+        seen["after"] = await visible()
+
+    monkeypatch.setattr(ingest, "swap_version", observed_swap)
+
+    async def scenario():
+        async with SessionLocal() as db:
+            doc = Document(filename="manual.txt", file_path=v1, owner_id=7, content_hash=pinecone_utils.file_hash(v1))
+            db.add(doc)
+            await db.commit()
+        await ingest.ingest_document(v1, "user_7", doc.content_hash, "manual.txt", doc.id)
+        await ingest.ingest_document(v2, "user_7", pinecone_utils.file_hash(v2), "manual.txt", doc.id)
+        return await visible()
+
+    final = run(scenario())
+    assert seen["before"] == texts(v1)
+    assert seen["after"] == final == texts(v2)
@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import hashlib
+import os
+import pytest
+import backend.pinecone_utils as pinecone_utils
+from backend.vector_store import InMemoryVectorStore, set_vector_store
+
+
+def fake_vector(text):
+    return list(hashlib.sha256(text.encode()).digest()[:16])
+
+
+def small_batches(size):
+    return functools.partial(pinecone_utils.batch_by_tokens, max_inputs=size)
+
+
+def write_manual(workdir, name, paragraphs):
+    path = os.path.join(workdir, name)
+    with open(path, "w") as f:
+        f.write("\n\n".join(f"Step {i}: check the oil level and tighten bolt {i}. " * 8 for i in range(paragraphs)))
+    return path
+
+
+def test_failed_batch_fails_the_whole_ingestion(run, workdir, monkeypatch):
+    calls = 0
+
+    async def flaky_embeddings(chunks):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("embedding service down")
+        await asyncio.sleep(0)
+        return [fake_vector(c) for c in chunks]
+
+    monkeypatch.setattr(pinecone_utils, "batch_by_tokens", small_batches(4))
+    monkeypatch.setattr(pinecone_utils, "embed_text_cached", flaky_embeddings)
+    set_vector_store(InMemoryVectorStore())
+    path = write_manual(workdir, "flaky.txt", 200)
+
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        run(pinecone_utils.embed_and_store(path, "flaky", filename="flaky.txt"))
+    assert calls < 50
+
+
+def test_batches_in_flight_stay_within_the_limit(run, workdir, monkeypatch):
+    active = peak = 0
+    store = InMemoryVectorStore()
+    upsert = store.upsert
+
+    async def slow_upsert(vectors, namespace):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.05)
+        await upsert(vectors, namespace)
+        active -= 1
+
+    async def fast_embeddings(chunks):
+        return [fake_vector(c) for c in chunks]
+
+    store.upsert = slow_upsert
+    monkeypatch.setattr(pinecone_utils, "batch_by_tokens", small_batches(2))
+    monkeypatch.setattr(pinecone_utils, "embed_text_cached", fast_embeddings)
+    set_vector_store(store)
+    path = write_manual(workdir, "bounded.txt", 60)
+
+    run(pinecone_utils.embed_and_store(path, "bounded", filename="bounded.txt"))
+    assert 2 <= peak <= pinecone_utils.EMBED_CONCURRENCY, peak
+    assert len(store._namespaces["bounded"].ids) > 20
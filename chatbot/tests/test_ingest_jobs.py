@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from backend.database import SessionLocal
+from backend.ingest_jobs import IngestQueue
+from backend.models import Document, DocumentChunk, IngestJob
+from backend.vector_store import InMemoryVectorStore, set_vector_store
+
+
+async def create_job(queue, path="manual.txt", document_id=None, owner_key="user_1"):
+    async with SessionLocal() as db:
+        return await queue.create_job(db, path, os.path.basename(path), owner_key, owner_key, document_id)
+
+
+async def job_row(job_id):
+    async with SessionLocal() as db:
+        return await db.get(IngestJob, job_id)
+
+
+async def wait_for(job_id, timeout=10):
+    for _ in range(int(timeout / 0.02)):
+        job = await job_row(job_id)
+        if job.status in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_known_to_several_processes_runs_once(run):
+    ran = []
+
+    async def ingest(job, on_stage, on_progress):
+        ran.append(job["file_path"])
+        await asyncio.sleep(0.05)
+
+    async def scenario():
+        # Two queues stand in for two app processes sharing the database
+        queues = [IngestQueue(ingest, workers=2) for _ in range(2)]
+        job = await create_job(queues[0], "once.txt")
+        for queue in queues:
+            queue.start()  # both find the queued job on start
+        await queues[0].submit(job.id, job.owner_key)
+        try:
+            return await wait_for(job.id)
+        finally:
+            for queue in queues:
+                await queue.stop()
+
+    job = run(scenario())
+    assert job.status == "done"
+    assert ran == ["once.txt"]
+
+
+def test_expired_lease_is_taken_over_and_live_lease_is_not(run):
+    ran = []
+
+    async def ingest(job, on_stage, on_progress):
+        ran.append(job["file_path"])
+
+    async def scenario():
+        queue = IngestQueue(ingest, workers=1)
+        abandoned = await create_job(queue, "abandoned.txt")
+        live = await create_job(queue, "live.txt")
+        now = datetime.utcnow()
+        async with SessionLocal() as db:
+            for job_id, lease in ((abandoned.id, now - timedelta(seconds=1)), (live.id, now + timedelta(minutes=5))):
+                await db.execute(
+                    update(IngestJob)
+                    .where(IngestJob.id == job_id)
+                    .values(status="running", claimed_by="elsewhere", lease_expires_at=lease)
+                )
+            await db.commit()
+        queue.start()
+        try:
+            await wait_for(abandoned.id)
+            await asyncio.sleep(0.1)
+            return await job_row(live.id)
+        finally:
+            await queue.stop()
+
+    live = run(scenario())
+    assert ran == ["abandoned.txt"]
+    assert live.status == "running" and live.claimed_by == "elsewhere"
+
+
+def test_upload_is_ingested_into_the_vector_store(run, workdir, monkeypatch):
+    import backend.pinecone_utils as pinecone_utils
+
+    async def fake_embeddings(chunks):
+        return [list(hashlib.sha256(c.encode()).digest()[:16]) for c in chunks]
+
+    monkeypatch.setattr(pinecone_utils, "embed_text_cached", fake_embeddings)
+    store = InMemoryVectorStore()
+    set_vector_store(store)
+    path = os.path.join(workdir, "engine.txt")
+    with open(path, "w") as f:
+        f.write("\n\n".join(f"Step {i}: check the oil level and tighten bolt {i}." for i in range(300)))
+
+    async def scenario():
+        async with SessionLocal() as db:
+            doc = Document(filename="engine.txt", file_path=path, owner_id=None)
+            db.add(doc)
+            await db.commit()
+        queue = IngestQueue(workers=1)
+        job = await create_job(queue, path, doc.id, owner_key="user_9")
+        queue.start()
+        await queue.submit(job.id, job.owner_key)
+        try:
+            job = await wait_for(job.id)
+        finally:
+            await queue.stop()
+        async with SessionLocal() as db:
+            registered = set(
+                (await db.scalars(select(DocumentChunk.vector_id).where(DocumentChunk.document_id == doc.id))).all()
+            )
+        return doc.id, job, registered
+
+    doc_id, job, registered = run(scenario())
+    assert job.status == "done", job.error
+    namespace = store._namespaces["user_9"]
+    assert job.chunks_done == len(namespace.ids) > 1
+    assert set(namespace.ids) == registered
+    assert {m["doc_id"] for m in namespace.metadata} == {doc_id}
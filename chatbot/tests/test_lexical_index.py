@@ -0,0 +1,41 @@
+import threading
+from backend import lexical_index as lexical
+from backend.lexical_index import LexicalIndex
+
+
+def chunks(doc_id, count, word):
+    return [
+        {"id": f"{doc_id}-{i}", "metadata": {"doc_id": doc_id, "text": f"{word} step {i} of document {doc_id}"}}
+        for i in range(count)
+    ]
+
+
+def test_log_is_compacted_once_deleted_chunks_outnumber_live_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical, "LEXICAL_COMPACT_MIN_DEAD", 10)
+    index = LexicalIndex(root=str(tmp_path))
+    index.add("ns", chunks(1, 5, "torque") + chunks(2, 20, "coolant"))
+    log = tmp_path / "ns" / "log.jsonl"
+    index.update_metadata("ns", {f"1-{i}": {"page": 2} for i in range(5)})
+    index.delete("ns", [f"2-{i}" for i in range(20)])
+
+    assert len(log.read_bytes().splitlines()) == 5
+    assert not index.search("ns", "coolant", 10)
+    hits = index.search("ns", "torque", 10)
+    assert sorted(h["id"] for h in hits) == [f"1-{i}" for i in range(5)]
+    assert all(h["metadata"]["page"] == 2 for h in hits)
+    # The rewritten log loads back the same
+    assert sorted(h["id"] for h in LexicalIndex(root=str(tmp_path)).search("ns", "torque", 10)) == sorted(
+        h["id"] for h in hits
+    )
+
+
+def test_namespaces_do_not_wait_for_each_other(tmp_path):
+    index = LexicalIndex(root=str(tmp_path))
+    index.add("busy", chunks(1, 3, "torque"))
+    index.add("other", chunks(2, 3, "coolant"))
+    done = threading.Event()
+    with index._namespace("busy"):
+        thread = threading.Thread(target=lambda: (index.search("other", "coolant", 5), done.set()))
+        thread.start()
+        assert done.wait(5)
+    thread.join()
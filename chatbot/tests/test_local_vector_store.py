@@ -0,0 +1,97 @@
+import os
+import numpy as np
+from backend.local_vector_store import LocalVectorStore
+
+
+def vectors(prefix, count, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": f"{prefix}{i}", "values": rng.random(dim).tolist(), "metadata": {"doc_id": 1, "text": f"{prefix}{i}"}}
+        for i in range(count)
+    ]
+
+
+def test_leftover_segment_from_a_crash_does_not_block_upserts(tmp_path):
+    store = LocalVectorStore(root=str(tmp_path))
+    store.upsert_sync(vectors("a", 3), "ns")
+    # A segment written but never committed to the manifest, and a half-written one
+    next_seq = store._namespace("ns").next_seq
+    os.makedirs(tmp_path / "ns" / f"seg_{next_seq + 1:08d}")
+    os.makedirs(tmp_path / "ns" / f"seg_{next_seq + 2:08d}.tmp")
+
+    store = LocalVectorStore(root=str(tmp_path))
+    store.upsert_sync(vectors("b", 3, seed=1), "ns")
+    ids = {m["id"] for m in store.query_sync(np.ones(8).tolist(), 10, "ns")}
+    assert ids == {"a0", "a1", "a2", "b0", "b1", "b2"}
+    assert sorted(os.listdir(tmp_path / "ns")) == ["manifest.json"] + [s.name for s in store._namespace("ns").segments]
+
+
+def test_query_keeps_segments_merged_away_while_it_runs(tmp_path):
+    store = LocalVectorStore(root=str(tmp_path))
+    for i in range(3):
+        store.upsert_sync(vectors(f"s{i}-", 4, seed=i), "ns")
+    old = list(store._namespace("ns").segments)
+    query_segments = store._query_segments
+
+    def compact_then_query(*args):
+        store.compact_sync("ns", full=True)
+        assert all(os.path.exists(s.path) for s in old)
+        return query_segments(*args)
+
+    store._query_segments = compact_then_query
+    results = store.query_sync(np.ones(8).tolist(), 12, "ns")
+    assert len(results) == 12 and all(r["metadata"]["text"] == r["id"] for r in results)
+    assert not any(os.path.exists(s.path) for s in old)
+
+
+def test_crash_before_the_manifest_commit_keeps_the_old_rows(tmp_path):
+    store = LocalVectorStore(root=str(tmp_path))
+    store.upsert_sync(vectors("a", 3), "ns")
+
+    def crash():
+        raise OSError("disk full")
+
+    store._namespace("ns").save_manifest = crash
+    try:
+        store.upsert_sync(vectors("a", 2, seed=1), "ns")
+    except OSError:
+        pass
+
+    store = LocalVectorStore(root=str(tmp_path))
+    assert len(store.query_sync(np.ones(8).tolist(), 10, "ns")) == 3
+
+
+def test_rows_overwritten_before_a_crash_resolve_to_the_newest(tmp_path):
+    store = LocalVectorStore(root=str(tmp_path))
+    store.upsert_sync(vectors("a", 3), "ns")
+    # Crash after the manifest commit, before the old rows were marked deleted
+    ns = store._namespace("ns")
+    ns.mark_dead = lambda locations: None
+    newer = vectors("a", 2, seed=1)
+    for v in newer:
+        v["metadata"]["text"] = "new"
+    store.upsert_sync(newer, "ns")
+
+    store = LocalVectorStore(root=str(tmp_path))
+    results = store.query_sync(np.ones(8).tolist(), 10, "ns")
+    assert sorted((r["id"], r["metadata"]["text"]) for r in results) == [("a0", "new"), ("a1", "new"), ("a2", "a2")]
+
+
+def test_metadata_update_keeps_rows_written_meanwhile(tmp_path):
+    store = LocalVectorStore(root=str(tmp_path))
+    store.upsert_sync(vectors("a", 2), "ns")
+
+    upsert_during_rewrite = vectors("a", 1, seed=1)
+    upsert_during_rewrite[0]["metadata"]["text"] = "upserted"
+    original = store._release
+
+    def release(segments):
+        original(segments)
+        # The rewrite runs outside the lock, so writes can interleave with it
+        store.upsert_sync(upsert_during_rewrite, "ns")
+
+    store._release = release
+    store.update_metadata_sync({"a0": {"text": "updated"}, "a1": {"text": "updated"}}, "ns")
+    store._release = original
+    results = store.query_sync(np.ones(8).tolist(), 10, "ns")
+    assert sorted((r["id"], r["metadata"]["text"]) for r in results) == [("a0", "upserted"), ("a1", "updated")]
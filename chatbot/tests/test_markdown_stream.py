@@ -0,0 +1,33 @@
+import random
+from backend.markdown_stream import StreamingMarkdownRenderer, render_markdown
+
+PIECES = [
+    "## H2", "# Title", "- item", "* star", "1. one", "2) two", "   - nested", "**bold**", "*it*",
+    "`code`", "```", "```python", "see https://example.com/x?a=1.", "plain text", "**a *b* c**",
+    "**x *y** z*", "*p **q*", "a * b", "2 * 3 ** 4", "<tag>&", "#", "-", "1.", "  ", "\n", "\n\n",
+]
+
+
+def render_split(parts):
+    renderer = StreamingMarkdownRenderer()
+    return "".join(renderer.feed(part) for part in parts) + renderer.finish()
+
+
+def test_output_does_not_depend_on_how_deltas_are_split():
+    rng = random.Random(15)
+    for _ in range(3000):
+        text = "".join(rng.choice(PIECES) + rng.choice(["", " ", "\n"]) for _ in range(rng.randint(1, 12)))
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 8)))) if len(text) > 1 else []
+        parts = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        assert render_split(parts) == render_markdown(text), parts
+
+
+def test_space_after_a_block_marker_is_not_rendered():
+    assert render_split(["##", " ", " H2"]) == render_markdown("##  H2") == '<div class="heading">H2</div>'
+    assert render_split(["- ", " item"]) == "<ul><li>item</li></ul>"
+
+
+def test_inline_tags_close_innermost_first():
+    assert render_markdown("**a *b** c*") == "<p><strong>a <em>b</em></strong><em> c</em></p>"
+    assert render_markdown("**x *y") == "<p><strong>x <em>y</em></strong></p>"
+    assert render_markdown("**bold *and em***") == "<p><strong>bold <em>and em</em></strong></p>"
@@ -0,0 +1,21 @@
+from backend.retrieval_cache import MemoryCache, RetrievalCache
+
+
+def test_namespace_write_makes_cached_matches_unreachable(run):
+    cache = RetrievalCache(MemoryCache())
+
+    async def scenario():
+        vector = [0.1, 0.2, 0.3]
+        await cache.set_embedding("model", "How do I  reset it?", vector)
+        embedded = await cache.get_embedding("model", "how do i reset it")
+        key = await cache.matches_key("user_1", vector, None, 8)
+        await cache.set_matches(key, [{"id": "a"}])
+        cached = await cache.get_matches(await cache.matches_key("user_1", vector, None, 8))
+        await cache.invalidate_namespace("user_1")
+        stale = await cache.get_matches(await cache.matches_key("user_1", vector, None, 8))
+        return embedded, cached, stale
+
+    embedded, cached, stale = run(scenario())
+    assert embedded == [0.1, 0.2, 0.3]
+    assert cached == [{"id": "a"}]
+    assert stale is None
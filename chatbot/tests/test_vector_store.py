@@ -0,0 +1,27 @@
+import pytest
+from backend.vector_store import InMemoryVectorStore, VectorStore
+
+
+def test_incomplete_store_fails_at_construction():
+    class NoDelete(VectorStore):
+        async def upsert(self, vectors, namespace): ...
+        async def query(self, vector, top_k, namespace, filter=None, include_values=False): ...
+        async def update_metadata(self, updates, namespace): ...
+        async def delete_namespace(self, namespace): ...
+
+    with pytest.raises(TypeError, match="delete"):
+        NoDelete()
+
+
+def test_scoped_query_only_returns_the_selected_documents(run):
+    store = InMemoryVectorStore()
+
+    async def scenario():
+        await store.upsert(
+            [{"id": f"{doc}-{i}", "values": [1.0, i, doc], "metadata": {"doc_id": doc}} for doc in (1, 2, 3) for i in range(4)],
+            "ns",
+        )
+        await store.update_metadata({"2-0": {"doc_id": 3}}, "ns")
+        return await store.query([1.0, 0.0, 0.0], 20, "ns", filter={"doc_id": {"$in": [3]}})
+
+    assert {m["id"] for m in run(scenario())} == {"2-0", "3-0", "3-1", "3-2", "3-3"}